@@ -0,0 +1,29 @@
+"""
+compares transcripts word by word.
+"""
+from re import findall
+from typing import List
+
+
+def words(text: str) -> List[str]:
+    # case and punctuation differ between models without changing what was understood
+    return findall(r"\w+", text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    substitutions, deletions and insertions needed to turn the reference into the hypothesis,
+    relative to the number of reference words.
+    """
+    expected, actual = words(reference), words(hypothesis)
+    previous = list(range(len(actual) + 1))
+    for row, expected_word in enumerate(expected, 1):
+        current = [row]
+        for column, actual_word in enumerate(actual, 1):
+            current.append(min(
+                previous[column] + 1,
+                current[column - 1] + 1,
+                previous[column - 1] + (expected_word != actual_word),
+            ))
+        previous = current
+    return previous[-1] / max(1, len(expected))
@@ -0,0 +1,53 @@
+"""
+compares the throughput of batched inference against transcribing the short recordings one by one.
+
+    python -m benchmarks.bench_batch ./recordings [model] [batch size]
+"""
+from os import listdir
+from os.path import join, splitext
+from sys import argv
+from time import perf_counter
+
+from src.processor.Whisper import Whisper
+
+
+def short_recordings(folder: str, whisper: Whisper, media_files=(".webm", ".mp3", ".wav", ".m4a")) -> list:
+    recordings = []
+    for file in sorted(listdir(folder)):
+        if splitext(file)[1] in media_files:
+            audio = whisper.load_audio(join(folder, file))
+            if whisper.can_batch(audio):
+                recordings.append(audio)
+    return recordings
+
+
+def main() -> None:
+    folder = argv[1] if len(argv) > 1 else "./recordings"
+    model = argv[2] if len(argv) > 2 else "tiny"
+    batch_size = int(argv[3]) if len(argv) > 3 else 8
+    whisper = Whisper("de", model)
+    whisper.init_model()
+    recordings = short_recordings(folder, whisper)
+    if not recordings:
+        print(f"no recordings of at most 30 seconds found in '{folder}'")
+        return
+    whisper.transcribe_raw(recordings[0])  # warm up
+
+    start = perf_counter()
+    for audio in recordings:
+        whisper.transcribe_raw(audio)
+    sequential = perf_counter() - start
+
+    start = perf_counter()
+    for index in range(0, len(recordings), batch_size):
+        whisper.infer_batch(recordings[index:index + batch_size])
+    batched = perf_counter() - start
+
+    files = len(recordings)
+    print(f"{files} recordings, model {model}")
+    print(f"  sequential: {files * 60 / sequential:7.1f} files/minute")
+    print(f"  batch of {batch_size:>2}: {files * 60 / batched:7.1f} files/minute, speedup {sequential / batched:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
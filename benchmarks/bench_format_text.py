@@ -0,0 +1,66 @@
+"""
+compares the compiled action keyword engine against the former re.sub loop.
+
+    python -m benchmarks.bench_format_text
+"""
+from re import sub, IGNORECASE, search, DOTALL
+from sys import argv
+from timeit import repeat
+
+argv[1:] = []  # Config parses the script arguments
+
+from src.Config import Config
+from src.ActionKeywords import ActionKeywords
+from src.abstracts.AudioTextProcessor import AudioTextProcessor
+from benchmarks.synthetic import spoken_script
+
+
+class BenchmarkProcessor(AudioTextProcessor):
+    def transcribe(self, audio_file: str):
+        pass
+
+    def init_model(self) -> None:
+        pass
+
+
+def legacy_format_text(processor: AudioTextProcessor, text: str, words: dict, audio_file_name: str) -> str:
+    for word, format in words.items():
+        text = sub(word, format, text, flags=IGNORECASE)
+    text = sub(r'Hashtag ([^,\.]*)[,.]?', lambda m: '#' + ''.join(w.capitalize() for w in m.group(1).split()), text)
+    match = search(r"#TAGS---(.*?)---TAGS#", text, DOTALL)
+    tags = processor.get_tags_str_from_match(match.group(1)) if match else ""
+    text = text.replace(match.group(0), "") if match else text
+    link_audio = processor.has_audiofile_keyword(text, audio_file_name)
+    audiolog = processor.get_audiofile_keyword_for_properties(link_audio)
+    text = processor.remove_audiofile_keyword(text)
+    return processor.create_properties_header([tags, audiolog], link_audio) + text
+
+
+def plain_text(size: int) -> str:
+    filler = "Heute war ein ruhiger Tag und ich habe viel über neue Ideen nachgedacht. "
+    return (filler * (size // len(filler) + 1))[:size]
+
+
+def main() -> None:
+    processor = BenchmarkProcessor()
+    words = dict(Config.ACTION_KEYWORDS)
+    engine = ActionKeywords(words)
+    script = spoken_script()
+    cases = {
+        "test talk": script,
+        "test talk x100": " ".join([script] * 100),
+        "plain 1MB": plain_text(1_000_000),
+    }
+    for name, text in cases.items():
+        expected = legacy_format_text(processor, text, words, "audio.webm")
+        result = processor.format_text(text, engine, "audio.webm")
+        assert result == expected, f"output differs for '{name}'"
+        number = 3 if len(text) > 100_000 else 50
+        legacy = min(repeat(lambda: legacy_format_text(processor, text, words, "audio.webm"), number=number, repeat=3))
+        compiled = min(repeat(lambda: processor.format_text(text, engine, "audio.webm"), number=number, repeat=3))
+        print(f"{name:>16}: legacy {legacy / number * 1000:9.3f} ms, "
+              f"compiled {compiled / number * 1000:9.3f} ms, speedup {legacy / compiled:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
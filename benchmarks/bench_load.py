@@ -0,0 +1,83 @@
+"""
+cold start of a model: loading whisper's checkpoint against mapping the prepared model. the model gets random
+weights of the real size, so nothing needs to be downloaded. every load runs in a new process and is followed by
+one encoder and decoder pass, which reads every weight, so pages a memory map did not read yet are paid for too.
+whisper's checkpoint gets hashed first, like whisper.load_model does with every model it finds downloaded.
+
+    python -m benchmarks.bench_load [model] [runs]
+"""
+from hashlib import sha256
+from json import dumps, loads
+from os.path import getsize, join
+from statistics import median
+from subprocess import run
+from sys import argv, executable
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from benchmarks.bench_shared_model import RandomWhisper
+from benchmarks.bench_models import ROOT
+
+
+def write_checkpoints(model: str, folder: str) -> tuple:
+    """
+    whisper's checkpoints hold float16 weights, the prepared model float32 ones.
+    """
+    import torch
+    from src.processor.Whisper import save_prepared_model
+    whisper = RandomWhisper("de", model)
+    whisper.init_model()
+    checkpoint, prepared = join(folder, f"{model}.pt"), join(folder, f"{model}.prepared.pt")
+    state = {name: tensor.half() for name, tensor in whisper.active_model.state_dict().items()}
+    torch.save({"dims": vars(whisper.active_model.dims), "model_state_dict": state}, checkpoint)
+    save_prepared_model(whisper.active_model, prepared, {"file": f"{model}.pt"})
+    return checkpoint, prepared
+
+
+def load(kind: str, path: str) -> dict:
+    """
+    runs in the process of the measurement.
+    """
+    import torch
+    start = perf_counter()
+    if kind == "whisper":
+        from whisper import load_model
+        with open(path, "rb") as f:
+            sha256(f.read()).hexdigest()
+        model = load_model(path, device="cpu")
+    else:
+        from src.processor.Whisper import map_prepared_model
+        model = map_prepared_model(path)
+    load_seconds = perf_counter() - start
+    with torch.no_grad():
+        features = model.embed_audio(torch.zeros(1, 80, 3000))
+        model.logits(torch.tensor([[50258, 50261]]), features)
+    from src.Metrics import peak_rss_mb
+    return {"load": load_seconds, "first_pass": perf_counter() - start - load_seconds, "peak_rss_mb": peak_rss_mb()}
+
+
+def measure(kind: str, path: str, runs: int) -> dict:
+    results = []
+    for _ in range(runs):
+        result = run([executable, "-m", "benchmarks.bench_load", "--load", kind, path],
+                     capture_output=True, text=True, check=True, cwd=ROOT)
+        results.append(loads(result.stdout.strip().splitlines()[-1]))
+    return {key: median(result[key] for result in results) for key in results[0]}
+
+
+def main(model: str = "small", runs: int = 3) -> None:
+    with TemporaryDirectory() as folder:
+        checkpoint, prepared = write_checkpoints(model, folder)
+        print(f"{model}: checkpoint {getsize(checkpoint) / 1024 ** 2:.0f} MB, "
+              f"prepared {getsize(prepared) / 1024 ** 2:.0f} MB, median of {runs} runs")
+        for kind, path in [("whisper", checkpoint), ("prepared", prepared)]:
+            result = measure(kind, path, runs)
+            print(f"{kind}: load {result['load']:.3f} s, first pass {result['first_pass']:.3f} s, "
+                  f"peak rss {result['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    if argv[1:2] == ["--load"]:
+        print(dumps(load(argv[2], argv[3])))
+    else:
+        main(*argv[1:2], *[int(runs) for runs in argv[2:3]])
@@ -0,0 +1,161 @@
+"""
+transcribes recordings with every combination of model size, decoding preset and thread count and reports
+load time, real time factor, peak memory and the word error rate against reference transcripts.
+record yourself reading Test-Talk-Script_de.md, the bundled script and its note are the default references.
+recordings with own references have them next to them, {name}.script.md with what was said and {name}.result.md
+with the expected note. every cell runs in its own process, models that are not downloaded yet get skipped.
+
+    python -m benchmarks.bench_models ./recordings/test-talk.m4a --models tiny,base,small \\
+        --decoding fast,balanced --threads 2,4 --output models.json
+"""
+from argparse import ArgumentParser, SUPPRESS
+from itertools import product
+from json import dump, dumps, loads
+from os.path import basename, dirname, exists, join, splitext
+from re import DOTALL, sub
+from subprocess import run
+from sys import executable
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from benchmarks.accuracy import word_error_rate
+
+ROOT = dirname(dirname(__file__))
+SCRIPT = join(ROOT, "Test-Talk-Script_de.md")
+RESULT = join(ROOT, "Test-Talk-Result_de.md")
+COLUMNS = [
+    "model", "decoding", "threads", "recording", "status", "load_seconds", "audio_seconds", "inference_seconds",
+    "real_time_factor", "fallbacks", "peak_rss_mb", "wer_raw", "wer_formatted",
+]
+
+
+def is_downloaded(model: str, root: str = None) -> bool:
+    """
+    whisper only downloads a model that is missing from its cache folder, so a cell with a downloaded model
+    runs offline.
+    """
+    from whisper import _MODELS
+    from src.processor.Whisper import model_root
+    return model in _MODELS and exists(join(root or model_root(), basename(_MODELS[model])))
+
+
+def references(recording: str) -> Tuple[str, str]:
+    """
+    the spoken and the formatted reference of the recording.
+    """
+    name = splitext(recording)[0]
+    script, result = f"{name}.script.md", f"{name}.result.md"
+    if not exists(script) or not exists(result):
+        script, result = SCRIPT, RESULT
+    with open(script) as f, open(result) as g:
+        return spoken_text(f.read()), note_body(g.read())
+
+
+def spoken_text(script: str) -> str:
+    # the keywords in backticks get spoken too, only the markup around them is not
+    return sub(r"[`\"]", " ", script)
+
+
+def note_body(note: str) -> str:
+    """
+    the note without its properties and the link to the recording, their file names differ between recordings.
+    """
+    note = sub(r"\A---\n.*?\n---\n", "", note, flags=DOTALL)
+    return sub(r"!\[\[[^\]]*\]\]", "", note)
+
+
+def run_cell(model: str, decoding: str, threads: int, recordings: List[str]) -> List[dict]:
+    """
+    runs in the process of the cell: loads the model once and transcribes every recording with it.
+    """
+    from src.ActionKeywords import ActionKeywords
+    from src.Config import Config
+    from src.Decoding import DecodingSettings
+    from src.Metrics import peak_rss_mb
+    from src.processor.Whisper import Whisper
+    whisper = Whisper(
+        "de", model, decoding=DecodingSettings(decoding), action_keywords=ActionKeywords(Config.ACTION_KEYWORDS)
+    )
+    whisper.set_threads(threads)
+    start = perf_counter()
+    whisper.init_model()
+    load_seconds = perf_counter() - start
+    if whisper.active_model is None:
+        raise RuntimeError(f"model {model} could not be loaded")
+    rows = []
+    for recording in recordings:
+        audio = whisper.load_audio(recording)
+        audio_seconds = len(audio) / 16000
+        start = perf_counter()
+        transcript = whisper.transcribe_raw(audio)
+        inference = perf_counter() - start
+        note = whisper.format_transcript(transcript, recording)
+        spoken, formatted = references(recording)
+        rows.append({
+            "recording": recording,
+            "status": "done",
+            "load_seconds": round(load_seconds, 3),
+            "audio_seconds": round(audio_seconds, 3),
+            "inference_seconds": round(inference, 3),
+            "real_time_factor": round(inference / audio_seconds, 4) if audio_seconds else None,
+            "fallbacks": transcript["fallbacks"],
+            "wer_raw": round(word_error_rate(spoken, transcript["text"]), 4),
+            "wer_formatted": round(word_error_rate(formatted, note_body(note)), 4),
+        })
+    peak = round(peak_rss_mb(), 1)
+    return [{**row, "peak_rss_mb": peak} for row in rows]
+
+
+def measure_cell(model: str, decoding: str, threads: int, recordings: List[str]) -> List[dict]:
+    cell = {"model": model, "decoding": decoding, "threads": threads}
+    if not is_downloaded(model):
+        return [{**cell, "recording": recording, "status": "skipped: model not downloaded"} for recording in recordings]
+    # a process of its own, so the peak memory and the load time belong to this cell alone
+    result = run(
+        [executable, "-m", "benchmarks.bench_models", "--cell", model, decoding, str(threads), *recordings],
+        capture_output=True, text=True, cwd=ROOT,
+    )
+    if result.returncode:
+        error = (result.stderr.strip().splitlines() or ["no output"])[-1]
+        return [{**cell, "recording": recording, "status": f"failed: {error}"} for recording in recordings]
+    return [{**cell, **row} for row in loads(result.stdout.strip().splitlines()[-1])]
+
+
+def format_row(row: dict) -> str:
+    values = [row.get(column) for column in COLUMNS]
+    return "\t".join("" if value is None else str(value) for value in values)
+
+
+def parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = ArgumentParser(description="model size, decoding preset and thread count matrix")
+    parser.add_argument("recordings", nargs="+")
+    parser.add_argument("--models", default="tiny,base,small,medium")
+    parser.add_argument("--decoding", default="fast,balanced,accurate")
+    parser.add_argument("--threads", default="4")
+    parser.add_argument("--output", help="json file for the rows")
+    parser.add_argument("--cell", nargs=3, metavar=("MODEL", "DECODING", "THREADS"), help=SUPPRESS)
+    args = parser.parse_args(args)
+    if args.cell:
+        model, decoding, threads = args.cell
+        print(dumps(run_cell(model, decoding, int(threads), args.recordings)))
+        return
+    rows = []
+    # tab separated, so the table can be pasted into a spreadsheet as it is printed
+    print("\t".join(COLUMNS))
+    for model, decoding, threads in product(parse_list(args.models), parse_list(args.decoding),
+                                            [int(threads) for threads in parse_list(args.threads)]):
+        for row in measure_cell(model, decoding, threads, args.recordings):
+            rows.append(row)
+            print(format_row(row), flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            dump({"columns": COLUMNS, "rows": rows}, f, indent=2)
+        print(f"results saved to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
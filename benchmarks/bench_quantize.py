@@ -0,0 +1,43 @@
+"""
+transcribes a recording with the float and the int8 quantized model and compares speed and transcript.
+record yourself reading Test-Talk-Script_de.md to compare on the bundled test talk.
+
+    python -m benchmarks.bench_quantize ./recordings/test-talk.m4a [model]
+"""
+from sys import argv
+from time import perf_counter
+
+from src.processor.Whisper import Whisper
+from benchmarks.accuracy import word_error_rate
+
+
+def transcribe(whisper: Whisper, audio) -> tuple:
+    whisper.init_model()
+    start = perf_counter()
+    transcript = whisper.transcribe_raw(audio)
+    return perf_counter() - start, transcript["text"]
+
+
+def main() -> None:
+    if len(argv) < 2:
+        raise SystemExit(__doc__)
+    recording = argv[1]
+    model = argv[2] if len(argv) > 2 else "medium"
+    float_model = Whisper("de", model)
+    int8_model = Whisper("de", model, quantize=1)
+    audio = float_model.load_audio(recording)
+    seconds = len(audio) / 16000
+
+    float_time, float_text = transcribe(float_model, audio)
+    int8_time, int8_text = transcribe(int8_model, audio)
+
+    print(f"{recording}: {seconds:.0f} seconds of audio, model {model}")
+    print(f"  float32: {float_time:7.1f} s, real time factor {float_time / seconds:.3f}")
+    print(f"  int8:    {int8_time:7.1f} s, real time factor {int8_time / seconds:.3f}, "
+          f"speedup {float_time / int8_time:.2f}x")
+    print(f"  word error rate of int8 against float32: {word_error_rate(float_text, int8_text):.2%}")
+    print(f"\nfloat32:\n{float_text.strip()}\n\nint8:\n{int8_text.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+measures the memory of the worker pool with and without a shared model. the model gets random weights of the
+real size, so nothing needs to be downloaded. every worker runs the encoder and one decoder step once,
+so all weights get read, like during a transcription.
+
+    python -m benchmarks.bench_shared_model [model] [workers]
+"""
+from sys import argv
+
+from src.processor.Whisper import Whisper
+from src.WorkerPool import WorkerPool
+
+# the dimensions of the released whisper models
+DIMENSIONS = {
+    "tiny": dict(n_audio_state=384, n_audio_head=6, n_audio_layer=4, n_text_state=384, n_text_head=6, n_text_layer=4),
+    "base": dict(n_audio_state=512, n_audio_head=8, n_audio_layer=6, n_text_state=512, n_text_head=8, n_text_layer=6),
+    "small": dict(n_audio_state=768, n_audio_head=12, n_audio_layer=12, n_text_state=768, n_text_head=12,
+                  n_text_layer=12),
+    "medium": dict(n_audio_state=1024, n_audio_head=16, n_audio_layer=24, n_text_state=1024, n_text_head=16,
+                   n_text_layer=24),
+}
+
+
+class RandomWhisper(Whisper):
+    """
+    a whisper processor whose model has random weights, transcribing runs one forward pass on silence.
+    """
+
+    def init_model(self) -> None:
+        from torch import manual_seed
+        from torch.nn.init import normal_
+        from whisper.model import Whisper as WhisperModel, ModelDimensions
+        manual_seed(0)
+        dims = ModelDimensions(n_mels=80, n_audio_ctx=1500, n_vocab=51865, n_text_ctx=448, **DIMENSIONS[self.model])
+        self.active_model = WhisperModel(dims).eval()
+        for parameter in self.active_model.parameters():
+            normal_(parameter, std=0.02)
+
+    def transcribe(self, audio_file: str, map_function=map) -> str:
+        from torch import no_grad, tensor, zeros
+        with no_grad():
+            features = self.active_model.embed_audio(zeros(1, 80, 3000))
+            self.active_model.logits(tensor([[50258, 50261]]), features)
+        return ""
+
+
+def measure(model: str, workers: int, share_model: bool) -> dict:
+    with WorkerPool(RandomWhisper("de", model), workers, threads=1, share_model=share_model) as pool:
+        jobs = [(f"{index}.wav", f"{index}.md") for index in range(workers * 2)]
+        for _, _, _, exception in pool.imap_unordered(jobs):
+            if exception:
+                raise exception
+        return pool.memory()
+
+
+def main() -> None:
+    model = argv[1] if len(argv) > 1 else "base"
+    max_workers = int(argv[2]) if len(argv) > 2 else 3
+    print(f"model {model}, memory in MB")
+    print(f"{'workers':>7} {'shared':>6} {'worker rss':>10} {'worker pss':>10} {'total pss':>9}")
+    for workers in range(1, max_workers + 1):
+        for share_model in [False, True]:
+            memory = measure(model, workers, share_model)
+            worker_memory = list(memory.values())[1:]
+            print(f"{workers:7d} {'yes' if share_model else 'no':>6} "
+                  f"{sum(m['rss_mb'] for m in worker_memory) / len(worker_memory):10.0f} "
+                  f"{sum(m['pss_mb'] for m in worker_memory) / len(worker_memory):10.0f} "
+                  f"{sum(m['pss_mb'] for m in memory.values()):9.0f}")
+
+
+if __name__ == "__main__":
+    main()
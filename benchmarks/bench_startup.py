@@ -0,0 +1,52 @@
+"""
+measures a run that finds nothing to transcribe and checks it never imports torch or whisper.
+
+    python -m benchmarks.bench_startup
+"""
+from resource import getrusage, RUSAGE_CHILDREN
+from statistics import median
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import List, Tuple
+
+HEAVY_MODULES = ["torch", "whisper"]
+
+
+def imported_modules(stderr: str) -> List[str]:
+    # -X importtime lines look like "import time:   self [us] | cumulative | module"
+    return [line.split("|")[-1].strip() for line in stderr.splitlines() if line.startswith("import time:")]
+
+
+def run_main(folder: str) -> Tuple[float, List[str]]:
+    start = perf_counter()
+    result = run(
+        [executable, "-X", "importtime", "main.py", "--kwargs", f"PATH={folder}", "CACHE=", "MANIFEST="],
+        capture_output=True, text=True, check=True,
+    )
+    return perf_counter() - start, imported_modules(result.stderr)
+
+
+def time_import(module: str) -> float:
+    start = perf_counter()
+    run([executable, "-c", f"import {module}"], check=True)
+    return perf_counter() - start
+
+
+def main(runs: int = 5) -> None:
+    with TemporaryDirectory() as folder:
+        durations = []
+        modules = []
+        for _ in range(runs):
+            duration, modules = run_main(folder)
+            durations.append(duration)
+    heavy = [module for module in modules if module.split(".")[0] in HEAVY_MODULES]
+    print(f"nothing to do: {median(durations):.3f} s median of {runs} runs, "
+          f"peak rss {getrusage(RUSAGE_CHILDREN).ru_maxrss / 1024:.0f} MB")
+    print(f"import whisper alone: {time_import('whisper'):.3f} s")
+    assert not heavy, f"the nothing to do path imported {', '.join(heavy)}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+offline benchmark suite for formatting, planning and the conversion pipeline, no model needed.
+
+    python -m benchmarks.suite run --output before.json
+    python -m benchmarks.suite run --output after.json
+    python -m benchmarks.suite compare before.json after.json --threshold 0.2
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+from json import dump, load
+from platform import platform, python_version
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, Dict
+
+from src.Config import Config
+from src.ActionKeywords import ActionKeywords
+from src.Converter import ObsidianSpeechToTextConverter
+from benchmarks.synthetic import (
+    StubProcessor, synthetic_config, synthetic_transcript, synthetic_tree, MEDIA_FILES, SOURCE_STRING_FORMAT, TARGET_STRING_FORMAT
+)
+
+TRANSCRIPT_SIZES = {"1KB": 1_000, "10KB": 10_000, "100KB": 100_000, "1MB": 1_000_000, "10MB": 10_000_000}
+
+
+def measure(function: Callable, min_time: float = 0.5, max_runs: int = 50) -> dict:
+    """
+    runs the function until min_time is spent (at least 3 times) and keeps the fastest run.
+    """
+    timings = []
+    while len(timings) < 3 or (sum(timings) < min_time and len(timings) < max_runs):
+        start = perf_counter()
+        function()
+        timings.append(perf_counter() - start)
+    return {"seconds": min(timings), "runs": len(timings)}
+
+
+def converter_for(folder: str, processor: StubProcessor, **overrides) -> ObsidianSpeechToTextConverter:
+    config = synthetic_config(folder, processor, **{"overwrite_existing": 1, **overrides})
+    return ObsidianSpeechToTextConverter(config)
+
+
+def bench_format_text(results: dict, quick: bool) -> None:
+    engine = ActionKeywords(Config.ACTION_KEYWORDS)
+    processor = StubProcessor()
+    for name, size in TRANSCRIPT_SIZES.items():
+        if quick and size > 1_000_000:
+            continue
+        text = synthetic_transcript(size)
+        results[f"format_text/{name}"] = measure(lambda: processor.format_text(text, engine, "audio.webm"))
+
+
+def bench_markdown_file_name(results: dict, names: int = 10_000) -> None:
+    converter = converter_for(".", StubProcessor())
+    sources = [f"Recording 2020{month:02d}{day:02d}{index % 24:02d}{index % 60:02d}00"
+               for index, (month, day) in enumerate((1 + i % 12, 1 + i % 28) for i in range(names))]
+    results[f"get_markdown_file_name/{names}"] = measure(
+        lambda: [converter.get_markdown_file_name(source, "/vault") for source in sources]
+    )
+
+
+def bench_pipeline(results: dict, quick: bool) -> None:
+    files = 1000 if quick else 5000
+    with TemporaryDirectory() as folder:
+        synthetic_tree(folder, files)
+        converter = converter_for(folder, StubProcessor(), overwrite_existing=0)
+        results[f"plan/{files} files"] = measure(converter.plan)
+
+    for files, latency in [(200 if quick else 1000, 0.0), (100 if quick else 200, 0.005)]:
+        with TemporaryDirectory() as folder:
+            synthetic_tree(folder, files)
+            processor = StubProcessor(latency, action_keywords=ActionKeywords(Config.ACTION_KEYWORDS))
+            result = measure(converter_for(folder, processor).convert, min_time=0, max_runs=3)
+            recordings = len(converter_for(folder, processor).plan())
+            # everything not spent in the fake model is overhead of the pipeline
+            result["overhead_per_file"] = (result["seconds"] - recordings * latency) / max(1, recordings)
+            results[f"convert/{files} files, {latency * 1000:g} ms latency"] = result
+
+
+def run(output: str, quick: bool) -> Dict[str, dict]:
+    results = {}
+    bench_format_text(results, quick)
+    bench_markdown_file_name(results)
+    bench_pipeline(results, quick)
+    for name, result in results.items():
+        print(f"{name:>40}: {result['seconds'] * 1000:10.3f} ms ({result['runs']} runs)")
+    report = {
+        "meta": {"created": datetime.now().isoformat(), "python": python_version(), "platform": platform()},
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            dump(report, f, indent=2)
+        print(f"results saved to '{output}'")
+    return results
+
+
+def compare(baseline: str, current: str, threshold: float) -> bool:
+    """
+    prints the change of every benchmark in both files, True if one got slower by more than threshold.
+    """
+    with open(baseline) as f:
+        before = load(f)["results"]
+    with open(current) as f:
+        after = load(f)["results"]
+    regressed = False
+    for name in [name for name in before if name in after]:
+        ratio = after[name]["seconds"] / max(before[name]["seconds"], 1e-12)
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:>40}: {before[name]['seconds'] * 1000:10.3f} ms -> "
+              f"{after[name]['seconds'] * 1000:10.3f} ms ({ratio:5.2f}x){flag}")
+    for name in sorted(before.keys() ^ after.keys()):
+        print(f"{name:>40}: only in {'the baseline' if name in before else 'the current run'}")
+    return regressed
+
+
+def main() -> None:
+    parser = ArgumentParser(description="offline benchmarks of the formatting and conversion pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--output", default="", help="json file for the results")
+    run_parser.add_argument("--quick", action="store_true", help="smaller inputs, skips the 10MB transcript")
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 means 20%%")
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args.output, args.quick)
+    elif compare(args.baseline, args.current, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
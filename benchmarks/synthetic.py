@@ -0,0 +1,123 @@
+"""
+offline inputs for the benchmarks: transcripts seeded from the test talk, directory trees of fake recordings,
+a processor that only pretends to transcribe and the config to run it with.
+"""
+from datetime import datetime, timedelta
+from os import makedirs
+from os.path import join
+from random import Random
+from time import sleep
+from types import SimpleNamespace
+from typing import List
+
+from src.abstracts.AudioTextProcessor import AudioTextProcessor
+from src.Metrics import Metrics
+from src.Scheduler import Scheduler
+from src.Governor import ResourceGovernor
+from src.Discovery import Discovery
+
+SOURCE_STRING_FORMAT = "Recording %Y%m%d%H%M%S"
+TARGET_STRING_FORMAT = "%Y-%m-%d-%H-%M.md"
+MEDIA_FILES = [".webm", ".mp3", ".wav", ".m4a"]
+FILLER_SENTENCES = [
+    "Heute war ein ruhiger Tag und ich habe viel über neue Ideen nachgedacht.",
+    "Morgen muss ich unbedingt noch die Unterlagen für das Meeting vorbereiten.",
+    "Die Katze hat schon wieder den ganzen Nachmittag auf der Fensterbank geschlafen.",
+    "Ich sollte mir angewöhnen, meine Gedanken öfter direkt aufzunehmen.",
+    "Das Wetter war besser als erwartet, also bin ich noch eine Runde spazieren gegangen.",
+    "Beim Einkaufen habe ich gemerkt, dass die Liste wieder unvollständig war.",
+]
+
+
+def spoken_lines(path: str = "Test-Talk-Script_de.md") -> List[str]:
+    """
+    the lines of the test talk script as whisper would transcribe them, without the markdown quoting.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [line.replace("`", "").replace('"', "").strip() for line in f if line.strip()]
+
+
+def spoken_script(path: str = "Test-Talk-Script_de.md") -> str:
+    return " ".join(spoken_lines(path))
+
+
+def synthetic_transcript(size: int, seed: int = 0, keyword_share: float = 0.3) -> str:
+    """
+    a transcript of *size* characters where keyword_share of the sentences come from the test talk,
+    the rest is filler without any action keyword.
+    """
+    random = Random(seed)
+    lines = spoken_lines()
+    sentences = []
+    length = 0
+    while length < size:
+        sentence = random.choice(lines) if random.random() < keyword_share else random.choice(FILLER_SENTENCES)
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)[:size]
+
+
+def synthetic_tree(root: str, files: int, seed: int = 0, folders: int = 20, depth: int = 3) -> List[str]:
+    """
+    spreads *files* empty recordings over nested folders. every tenth recording already has its note
+    and every twentieth file is something else, like obsidian creates them.
+    """
+    random = Random(seed)
+    paths = [root]
+    for index in range(folders):
+        parent = random.choice([path for path in paths if path.count("/") - root.count("/") < depth])
+        paths.append(join(parent, f"folder {index}"))
+    for path in paths:
+        makedirs(path, exist_ok=True)
+
+    start = datetime(2020, 1, 1)
+    recordings = []
+    for index in range(files):
+        folder = random.choice(paths)
+        if index % 20 == 19:
+            open(join(folder, f"attachment {index}.png"), "w").close()
+            continue
+        recorded = start + timedelta(minutes=index)
+        audio_file = join(folder, recorded.strftime(SOURCE_STRING_FORMAT) + random.choice(MEDIA_FILES))
+        open(audio_file, "w").close()
+        if index % 10 == 9:
+            open(join(folder, recorded.strftime(TARGET_STRING_FORMAT)), "w").close()
+        recordings.append(audio_file)
+    return recordings
+
+
+class StubProcessor(AudioTextProcessor):
+    """
+    sleeps *latency* seconds instead of running a model and formats a synthetic transcript,
+    so the benchmarks measure everything around the model.
+    """
+
+    def __init__(self, latency: float = 0.0, transcript_size: int = 2000, action_keywords: dict = None):
+        self.latency = latency
+        self.transcript = synthetic_transcript(transcript_size)
+        self.actions = action_keywords or {}
+
+    def transcribe(self, audio_file: str, map_function=map) -> str:
+        if self.latency:
+            sleep(self.latency)
+        return self.format_text(self.transcript, self.actions, audio_file)
+
+    def init_model(self) -> None:
+        pass
+
+
+def synthetic_config(folder: str, processor: AudioTextProcessor, **overrides) -> SimpleNamespace:
+    """
+    the attributes of Config the converter reads, with every optional feature off.
+    """
+    config = SimpleNamespace(
+        path=folder, overwrite_existing=0, media_files=MEDIA_FILES, source_string=SOURCE_STRING_FORMAT,
+        target_string=TARGET_STRING_FORMAT, mode="convert", workers=1, threads=0, share_model=0, manifest=None,
+        leases=None, watch_interval=10, watch_debounce=2, serve_address="127.0.0.1:0", serve_queue=16,
+        serve_concurrency=1, chunk_seconds=0, prefetch=0, batch_size=1, metrics=Metrics(), scheduler=Scheduler(),
+        governor=ResourceGovernor(), discovery=Discovery(overrides.get("media_files", MEDIA_FILES)),
+        converter=processor,
+    )
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return config
@@ -6,4 +6,4 @@ if __name__ == "__main__":
     basicConfig(level=INFO)
     config = Config()
     obsidian_converter = ObsidianSpeechToTextConverter(config)
-    obsidian_converter.convert()
+    obsidian_converter.run()
@@ -0,0 +1,208 @@
+from re import compile, escape, IGNORECASE, Pattern
+from typing import List, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse
+    from re._casefix import _EXTRA_CASES
+except ImportError:  # python < 3.11
+    import sre_parse
+    from sre_compile import _ignorecase_fixes as _EXTRA_CASES
+
+# the widest stretch a match may reach in front of its trigger literal before the rule falls back to a plain scan
+MAX_REACH = 32
+
+# lowercase characters re treats as equal to another lowercase character (i.e. "ſ" and "s"), lowered texts
+# containing them skip the literal prefilter and are processed by plain re.sub calls
+CASE_SPECIALS = compile("[%s]" % escape("".join(
+    chr(char) for char, cases in _EXTRA_CASES.items() if char > min(cases)
+)))
+
+
+def required_literals(pattern: str) -> Optional[Tuple[Set[str], int]]:
+    """
+    returns a set of lowercase literals where at least one has to occur in any text the pattern matches,
+    together with the maximum distance a match can start in front of that literal.
+    returns None if no such set can be derived (i.e. the pattern consists of char classes only).
+    """
+    try:
+        parsed = sre_parse.parse(pattern, IGNORECASE)
+    except Exception:
+        return None
+    found = _sequence_literals(parsed.state, list(parsed))
+    if not found:
+        return None
+    literals, reach = found
+    lowered = {literal.lower() for literal in literals}
+    if any(len(literal) != len(literal.lower()) or CASE_SPECIALS.search(literal.lower()) for literal in literals):
+        return None
+    return lowered, reach
+
+
+def _width(state, items: list) -> int:
+    return sre_parse.SubPattern(state, items).getwidth()[1]
+
+
+def _sequence_literals(state, items: list) -> Optional[Tuple[Set[str], int]]:
+    candidates = []
+    run = []
+    run_reach = 0
+    reach = 0
+    for item in items:
+        op, av = item
+        if op is sre_parse.LITERAL:
+            if not run:
+                run_reach = reach
+            run.append(chr(av))
+            reach += 1
+            continue
+        if run:
+            candidates.append(({"".join(run)}, run_reach))
+            run = []
+        inner = None
+        if op is sre_parse.SUBPATTERN:
+            inner = _sequence_literals(state, list(av[-1]))
+        elif op is sre_parse.BRANCH:
+            branches = [_sequence_literals(state, list(branch)) for branch in av[1]]
+            if all(branches):
+                inner = set().union(*[literals for literals, _ in branches]), max(r for _, r in branches)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            inner = _sequence_literals(state, list(av[2]))
+        if inner:
+            candidates.append((inner[0], reach + inner[1]))
+        reach += _width(state, [item])
+    if run:
+        candidates.append(({"".join(run)}, run_reach))
+    candidates = [(literals, reach) for literals, reach in candidates if all(literals)]
+    if not candidates:
+        return None
+    # prefer a literal close to the start of the match, then the rarest one (longest shortest literal)
+    return max(candidates, key=lambda c: (c[1] <= MAX_REACH, min(len(literal) for literal in c[0]), -c[1]))
+
+
+def sub_tracked(pattern: Pattern, replacement, text: str, cuts: List[Optional[int]]) -> Tuple[str, List[Optional[int]]]:
+    """
+    pattern.sub(replacement, text) that also maps the cut positions into the new text.
+    a cut some match reaches across becomes None, a cut at the edge of a match stays valid.
+    """
+    order = sorted((cut, index) for index, cut in enumerate(cuts) if cut is not None)
+    mapped: List[Optional[int]] = [None] * len(cuts)
+    pieces = []
+    pos = 0
+    shift = 0
+    next_cut = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        while next_cut < len(order) and order[next_cut][0] <= start:
+            mapped[order[next_cut][1]] = order[next_cut][0] + shift
+            next_cut += 1
+        while next_cut < len(order) and order[next_cut][0] < end:
+            next_cut += 1
+        new = match.expand(replacement) if isinstance(replacement, str) else replacement(match)
+        pieces.append(text[pos:start])
+        pieces.append(new)
+        shift += len(new) - (end - start)
+        pos = end
+    for cut, index in order[next_cut:]:
+        mapped[index] = cut + shift
+    if not pieces:
+        return text, mapped
+    pieces.append(text[pos:])
+    return "".join(pieces), mapped
+
+
+class ActionKeywords(dict):
+    """
+    the action keyword map (regex => replacement), compiled once.
+
+    rules are still applied one after another in their configured order, as later rules
+    may rely on the output of earlier ones, so the output is identical to a loop of re.sub calls.
+    the speedup comes from compiling all patterns up front, skipping every rule whose trigger
+    literals never occur in the text, and only trying to match next to those literals.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rules: List[Tuple[Pattern, str, Optional[Tuple[Set[str], int]]]] = [
+            (compile(word, IGNORECASE), format, required_literals(word)) for word, format in self.items()
+        ]
+
+    def apply(self, text: str) -> str:
+        lowered = self.lower(text)
+        for pattern, format, literals in self.rules:
+            if literals is None or lowered is None:
+                text = pattern.sub(format, text)
+                lowered = self.lower(text)
+                continue
+            positions = self.find_literals(lowered, literals[0])
+            if not positions:
+                continue
+            if literals[1] > MAX_REACH:
+                new_text = pattern.sub(format, text)
+            else:
+                new_text = self.sub_at(pattern, format, text, positions, literals[1])
+            if new_text != text:
+                text = new_text
+                lowered = self.lower(text)
+        return text
+
+    def apply_tracked(self, text: str, cuts: List[Optional[int]]) -> Tuple[str, List[Optional[int]]]:
+        """
+        apply() that maps the cut positions through every rule, see sub_tracked. a cut that survives all
+        rules splits the text where formatting both parts on their own gives the same result.
+        """
+        lowered = self.lower(text)
+        for pattern, format, literals in self.rules:
+            if literals is not None and lowered is not None and \
+                    not any(literal in lowered for literal in literals[0]):
+                continue
+            new_text, cuts = sub_tracked(pattern, format, text, cuts)
+            if new_text != text:
+                text = new_text
+                lowered = self.lower(text)
+        return text, cuts
+
+    @staticmethod
+    def lower(text: str) -> Optional[str]:
+        """
+        lowercase copy of the text with the same character positions, None if that is not possible.
+        """
+        lowered = text.lower()
+        if len(lowered) != len(text) or CASE_SPECIALS.search(lowered):
+            return None
+        return lowered
+
+    @staticmethod
+    def find_literals(lowered: str, literals: Set[str]) -> List[int]:
+        positions = []
+        for literal in literals:
+            position = lowered.find(literal)
+            while position != -1:
+                positions.append(position)
+                position = lowered.find(literal, position + 1)
+        return sorted(positions)
+
+    @staticmethod
+    def sub_at(pattern: Pattern, format: str, text: str, positions: List[int], reach: int) -> str:
+        """
+        same result as pattern.sub(format, text), but only tries to match at the positions
+        a match can start at: up to *reach* characters in front of a literal occurrence.
+        """
+        pieces = []
+        pos = 0
+        tried = -1
+        for literal_position in positions:
+            start = max(pos, tried + 1, literal_position - reach)
+            while start <= literal_position:
+                tried = start
+                match = pattern.match(text, start)
+                if match and match.end() > start:
+                    pieces.append(text[pos:start])
+                    pieces.append(match.expand(format))
+                    pos = match.end()
+                    start = pos
+                else:
+                    start += 1
+        if not pieces:
+            return text
+        pieces.append(text[pos:])
+        return "".join(pieces)
@@ -0,0 +1,77 @@
+from logging import info
+from os import makedirs, remove, replace, scandir, utime, getpid
+from os.path import join
+from typing import Callable, Optional
+from src.Chunker import SAMPLE_RATE
+from src.TranscriptCache import file_hash
+import numpy as np
+
+
+class AudioCache:
+    """
+    folder of decoded recordings as 16 kHz mono float32 .npy files, keyed by the content hash of the source.
+    a cached recording is memory mapped instead of decoded by ffmpeg again, nothing gets copied until it is written to.
+    once the folder grows beyond max_bytes, the entries used longest ago are removed.
+    """
+
+    def __init__(self, folder: str, max_bytes: int, sample_rate: int = SAMPLE_RATE):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+
+    def get_path(self, content_hash: str) -> str:
+        return join(self.folder, f"{content_hash}-{self.sample_rate}.npy")
+
+    def get(self, audio_file: str, content_hash: str = None) -> Optional[np.ndarray]:
+        path = self.get_path(content_hash or file_hash(audio_file))
+        try:
+            # copy on write, whisper and the voice activity pre-pass only read it
+            audio = np.load(path, mmap_mode="c")
+            # the modification time is the last use, access times are often not updated
+            utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        info(f"Found decoded audio for '{audio_file}'")
+        return audio
+
+    def put(self, audio_file: str, audio: np.ndarray, content_hash: str = None) -> None:
+        path = self.get_path(content_hash or file_hash(audio_file))
+        makedirs(self.folder, exist_ok=True)
+        # workers may decode the same recording, every one writes its own file and the last one wins
+        temp_file = f"{path}.{getpid()}.tmp"
+        np.save(temp_file, np.asarray(audio, dtype=np.float32))
+        # np.save appends .npy to names without it
+        replace(f"{temp_file}.npy", path)
+        self.evict()
+
+    def load(self, audio_file: str, decode: Callable[[str], np.ndarray], content_hash: str = None) -> np.ndarray:
+        """
+        the cached audio of the recording, decode() only runs for recordings that are not cached yet.
+        """
+        content_hash = content_hash or file_hash(audio_file)
+        audio = self.get(audio_file, content_hash)
+        if audio is None:
+            audio = decode(audio_file)
+            self.put(audio_file, audio, content_hash)
+        return audio
+
+    def evict(self) -> None:
+        """
+        removes the entries used longest ago until the folder fits into max_bytes.
+        """
+        entries = []
+        for entry in scandir(self.folder):
+            if entry.name.endswith(".npy") and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                # open memory maps of other processes stay valid
+                remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            info(f"Removed '{path}' from the audio cache")
@@ -0,0 +1,91 @@
+from typing import List, NamedTuple
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+SMOOTHING_SECONDS = 0.3
+
+
+class AudioChunk(NamedTuple):
+    # all positions are in seconds of the source recording
+    offset: float
+    own_start: float
+    own_end: float
+    audio: np.ndarray
+
+
+def frame_energy(audio: np.ndarray, frame: int) -> np.ndarray:
+    frames = len(audio) // frame
+    return np.sqrt(np.mean(np.square(audio[:frames * frame].reshape(frames, frame), dtype=np.float32), axis=1))
+
+
+def find_chunk_bounds(audio: np.ndarray, max_seconds: float, sample_rate: int = SAMPLE_RATE) -> List[tuple]:
+    """
+    splits the audio into (start, end) sample ranges of at most max_seconds,
+    cutting at the quietest stretch within the last quarter of every chunk.
+    """
+    max_length = int(max_seconds * sample_rate)
+    if len(audio) <= max_length:
+        return [(0, len(audio))]
+
+    frame = int(FRAME_SECONDS * sample_rate)
+    energy = frame_energy(audio, frame)
+    smoothing = max(1, int(SMOOTHING_SECONDS / FRAME_SECONDS))
+    energy = np.convolve(energy, np.ones(smoothing) / smoothing, mode="same")
+    search = max(frame, max_length // 4)
+
+    bounds = []
+    start = 0
+    while len(audio) - start > max_length:
+        first_frame = (start + max_length - search) // frame
+        last_frame = max(first_frame + 1, (start + max_length) // frame)
+        quietest = first_frame + int(np.argmin(energy[first_frame:last_frame]))
+        cut = min(quietest * frame + frame // 2, start + max_length)
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, len(audio)))
+    return bounds
+
+
+def split_audio(audio: np.ndarray, max_seconds: float, overlap_seconds: float = 1.0,
+                sample_rate: int = SAMPLE_RATE) -> List[AudioChunk]:
+    """
+    chunks overlap their neighbours by overlap_seconds, so words at the cut are heard in full by both.
+    every chunk only owns the range between its cuts, see stitch_segments.
+    """
+    overlap = int(overlap_seconds * sample_rate)
+    chunks = []
+    for start, end in find_chunk_bounds(audio, max_seconds, sample_rate):
+        offset = max(0, start - overlap)
+        chunks.append(AudioChunk(
+            offset / sample_rate, start / sample_rate, end / sample_rate, audio[offset:min(len(audio), end + overlap)]
+        ))
+    return chunks
+
+
+def stitch_segments(chunks: List[AudioChunk], results: List[dict]) -> dict:
+    """
+    joins the chunk transcripts in order. segments get shifted to the time of the source recording and a segment
+    is kept by the chunk owning its midpoint, so segments in the overlap are neither dropped nor duplicated.
+    """
+    segments = []
+    for index, (chunk, result) in enumerate(zip(chunks, results)):
+        segments += own_segments(chunk, result, index == len(chunks) - 1)
+    return {
+        "text": "".join(segment["text"] for segment in segments), "segments": segments,
+        "fallbacks": sum(result.get("fallbacks", 0) for result in results),
+    }
+
+
+def own_segments(chunk: AudioChunk, result: dict, is_last: bool) -> List[dict]:
+    """
+    the segments of one chunk transcript the chunk owns, shifted to the time of the source recording.
+    """
+    segments = []
+    for segment in result.get("segments", []):
+        start = chunk.offset + segment["start"]
+        end = chunk.offset + segment["end"]
+        middle = (start + end) / 2
+        if chunk.own_start <= middle and (middle < chunk.own_end or is_last):
+            segments.append({**segment, "start": start, "end": end})
+    return segments
@@ -1,7 +1,17 @@
 from argparse import ArgumentParser
-from os import getenv
+from os import getenv, cpu_count
 from logging import info
-from src.processor.Whisper import Whisper
+from src.ActionKeywords import ActionKeywords
+from src.TranscriptCache import TranscriptCache
+from src.AudioCache import AudioCache
+from src.Manifest import Manifest
+from src.Lease import Leases, DEFAULT_LEASE_SECONDS
+from src.Metrics import Metrics
+from src.Scheduler import Scheduler
+from src.Governor import ResourceGovernor
+from src.Discovery import Discovery, DEFAULT_EXCLUDE
+from src.VoiceActivity import VoiceActivityFilter
+from src.Decoding import DecodingSettings, DEFAULT_PRESET
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,6 +23,43 @@ class Config:
     DEFAULT_LOCAL_PATH = "./recordings"
     DEFAULT_USE_KEYWORDS = 1
     DEFAULT_OVERWRITE = 0
+    DEFAULT_QUANTIZE = 0
+    DEFAULT_DECODING = DEFAULT_PRESET
+    DEFAULT_MODEL_TIERS = ""
+    DEFAULT_TIME_BUDGET = 0
+    DEFAULT_ESCALATE_LOGPROB = ""
+    DEFAULT_WORKERS = 1
+    DEFAULT_THREADS = 0
+    DEFAULT_SHARE_MODEL = 0
+    DEFAULT_MAX_THREADS = 0
+    DEFAULT_MAX_RSS = 0
+    DEFAULT_MAX_LOAD = 0
+    DEFAULT_MODE = "convert"
+    DEFAULT_CACHE = "./models/transcripts.sqlite"
+    DOCKER_CACHE = "/root/.cache/whisper/transcripts.sqlite"
+    DEFAULT_AUDIO_CACHE = ""
+    DEFAULT_AUDIO_CACHE_SIZE = 2048
+    DEFAULT_MANIFEST = ""
+    DEFAULT_LEASES = ""
+    DEFAULT_LEASE_SECONDS = DEFAULT_LEASE_SECONDS
+    DEFAULT_PREFETCH = 0
+    DEFAULT_BATCH_SIZE = 1
+    DEFAULT_CHUNK_SECONDS = 0
+    DEFAULT_CHUNK_OVERLAP = 1.0
+    DEFAULT_VAD = 0
+    DEFAULT_VAD_THRESHOLD = -45.0
+    DEFAULT_VAD_MIN_SILENCE = 1.0
+    DEFAULT_WATCH_INTERVAL = 10
+    DEFAULT_WATCH_DEBOUNCE = 2
+    DEFAULT_SERVE_ADDRESS = "127.0.0.1:8765"
+    DEFAULT_SERVE_QUEUE = 16
+    DEFAULT_SERVE_CONCURRENCY = 1
+    DEFAULT_METRICS = ""
+    DEFAULT_INCLUDE = ""
+    DEFAULT_EXCLUDE = ",".join(DEFAULT_EXCLUDE)
+    DEFAULT_SCHEDULE = "fifo"
+    DEFAULT_METRICS_PROMETHEUS = ""
+    MODES = ["convert", "reformat", "plan", "watch", "serve", "prepare"]
     MEDIA_FILES = ",".join(['.webm', '.mp3', '.wav', '.m4a'])
     SOURCE_STRING_FORMAT = "Recording %Y%m%d%H%M%S"
     TARGET_STRING_FORMAT = "%Y-%m-%d-%H-%M.md"
@@ -86,8 +133,14 @@ class Config:
     def __init__(self) -> None:
         self.script_args = self.get_script_args()
         self.use_docker = int(getenv("RUNS_ON_DOCKER", default="0"))
+        self.mode = self.get_mode()
         self.language = self.get_language()
         self.model_size = self.get_model_size()
+        self.quantize = self.get_quantize()
+        self.decoding = self.get_decoding()
+        self.model_tiers = self.get_model_tiers()
+        self.time_budget = self.get_time_budget()
+        self.escalate_logprob = self.get_escalate_logprob()
         self.path = self.get_path()
         info(f"input_folder has been configured to '{self.path}'")
         self.action_keywords = self.get_action_keywords()
@@ -95,6 +148,28 @@ class Config:
         self.source_string = self.get_source_string_format()
         self.target_string = self.get_target_string_format()
         self.media_files = self.get_media_files()
+        self.workers = self.get_workers()
+        self.threads = self.get_threads()
+        self.share_model = self.get_share_model()
+        self.serve_concurrency = self.get_serve_concurrency()
+        self.governor = self.get_governor()
+        self.apply_governor()
+        self.cache_path = self.get_cache_path()
+        self.audio_cache = self.get_audio_cache()
+        self.prefetch = self.get_prefetch()
+        self.batch_size = self.get_batch_size()
+        self.chunk_seconds = self.get_chunk_seconds()
+        self.chunk_overlap = self.get_chunk_overlap()
+        self.vad = self.get_vad()
+        self.manifest = self.get_manifest()
+        self.leases = self.get_leases()
+        self.watch_interval = self.get_watch_interval()
+        self.watch_debounce = self.get_watch_debounce()
+        self.serve_address = self.get_serve_address()
+        self.serve_queue = self.get_serve_queue()
+        self.metrics = self.get_metrics()
+        self.scheduler = self.get_scheduler()
+        self.discovery = self.get_discovery()
         self.converter = self.get_converter()
 
     @staticmethod
@@ -112,6 +187,13 @@ class Config:
             kwargs[k] = v
         return kwargs
 
+    def get_mode(self) -> str:
+        ENV_DEFAULT_MODE = getenv("OSTTC_MODE", default=self.DEFAULT_MODE)
+        mode = self.script_args.get("MODE", ENV_DEFAULT_MODE)
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid mode. Valid options are: {', '.join(self.MODES)}")
+        return mode
+
     def get_language(self) -> str:
         ENV_DEFAULT_LANGUAGE = getenv('OSTTC_LANGUAGE', default=self.DEFAULT_LANGUAGE)
         return self.script_args.get("LANGUAGE", ENV_DEFAULT_LANGUAGE)
@@ -120,6 +202,65 @@ class Config:
         ENV_DEFAULT_MODEL_SIZ = getenv("OSTTC_MODEL_SIZE", default=self.DEFAULT_MODEL_SIZ)
         return self.script_args.get("MODEL_SIZE", ENV_DEFAULT_MODEL_SIZ)
 
+    def get_quantize(self) -> int:
+        """
+        1 runs an int8 quantized copy of the model on the cpu, quantized once and cached next to the model.
+        """
+        ENV_DEFAULT_QUANTIZE = getenv("OSTTC_QUANTIZE", default=self.DEFAULT_QUANTIZE)
+        return int(self.script_args.get("QUANTIZE", ENV_DEFAULT_QUANTIZE))
+
+    def get_decoding(self) -> DecodingSettings:
+        """
+        DECODING picks a preset: fast (greedy, no temperature fallback), balanced (the whisper defaults)
+        or accurate (beam search). BEAM_SIZE, BEST_OF, TEMPERATURES and CONDITION_ON_PREVIOUS_TEXT replace
+        single options of the preset, empty keeps the one of the preset.
+        """
+        ENV_DEFAULT_DECODING = getenv("OSTTC_DECODING", default=self.DEFAULT_DECODING)
+        ENV_DEFAULT_BEAM_SIZE = getenv("OSTTC_BEAM_SIZE", default="")
+        ENV_DEFAULT_BEST_OF = getenv("OSTTC_BEST_OF", default="")
+        ENV_DEFAULT_TEMPERATURES = getenv("OSTTC_TEMPERATURES", default="")
+        ENV_DEFAULT_CONDITION = getenv("OSTTC_CONDITION_ON_PREVIOUS_TEXT", default="")
+        beam_size = self.script_args.get("BEAM_SIZE", ENV_DEFAULT_BEAM_SIZE)
+        best_of = self.script_args.get("BEST_OF", ENV_DEFAULT_BEST_OF)
+        temperatures = self.script_args.get("TEMPERATURES", ENV_DEFAULT_TEMPERATURES)
+        condition = self.script_args.get("CONDITION_ON_PREVIOUS_TEXT", ENV_DEFAULT_CONDITION)
+        decoding = DecodingSettings(
+            self.script_args.get("DECODING", ENV_DEFAULT_DECODING),
+            beam_size=int(beam_size) if beam_size else None,
+            best_of=int(best_of) if best_of else None,
+            temperature=[float(value) for value in temperatures.split(",")] if temperatures else None,
+            condition_on_previous_text=bool(int(condition)) if condition else None,
+        )
+        info(f"Decoding with preset {decoding}")
+        return decoding
+
+    def get_model_tiers(self) -> list:
+        """
+        "60:base,600:small,medium" transcribes recordings up to 60 seconds with base, up to 10 minutes with small
+        and everything longer with medium. empty uses MODEL_SIZE for every recording.
+        """
+        ENV_DEFAULT_MODEL_TIERS = getenv("OSTTC_MODEL_TIERS", default=self.DEFAULT_MODEL_TIERS)
+        tiers = []
+        for tier in filter(None, self.script_args.get("MODEL_TIERS", ENV_DEFAULT_MODEL_TIERS).split(",")):
+            max_seconds, _, model = tier.strip().rpartition(":")
+            tiers.append((float(max_seconds) if max_seconds else None, model))
+        return sorted(tiers, key=lambda tier: float("inf") if tier[0] is None else tier[0])
+
+    def get_time_budget(self) -> float:
+        """
+        seconds a run may take with MODEL_TIERS, smaller tiers get picked when a larger one would overrun it.
+        """
+        ENV_DEFAULT_TIME_BUDGET = getenv("OSTTC_TIME_BUDGET", default=self.DEFAULT_TIME_BUDGET)
+        return float(self.script_args.get("TIME_BUDGET", ENV_DEFAULT_TIME_BUDGET))
+
+    def get_escalate_logprob(self):
+        """
+        with MODEL_TIERS, transcripts with a lower average log probability get transcribed again by the next tier.
+        """
+        ENV_DEFAULT_ESCALATE_LOGPROB = getenv("OSTTC_ESCALATE_LOGPROB", default=self.DEFAULT_ESCALATE_LOGPROB)
+        threshold = self.script_args.get("ESCALATE_LOGPROB", ENV_DEFAULT_ESCALATE_LOGPROB)
+        return float(threshold) if threshold != "" else None
+
     def get_path(self) -> str:
         ENV_DEFAULT_LOCAL_PATH = getenv("OSTTC_LOCAL_PATH", default=self.DEFAULT_LOCAL_PATH)
         return "/data" if self.use_docker else self.script_args.get("PATH", ENV_DEFAULT_LOCAL_PATH)
@@ -127,7 +268,7 @@ class Config:
     def get_action_keywords(self) -> dict:
         ENV_DEFAULT_USE_KEYWORDS = int(getenv('OSTTC_KEYWORDS', default=self.DEFAULT_USE_KEYWORDS))
         empty_word_map = False if int(self.script_args.get("KEYWORDS", ENV_DEFAULT_USE_KEYWORDS)) else True
-        return {} if empty_word_map else self.ACTION_KEYWORDS
+        return {} if empty_word_map else ActionKeywords(self.ACTION_KEYWORDS)
 
     def get_overwrite_existing(self) -> int:
         ENV_DEFAULT_OVERWRITE = getenv("OSTTC_OVERWRITE", default=self.DEFAULT_OVERWRITE)
@@ -145,5 +286,239 @@ class Config:
         ENV_DEFAULT_MEDIA_FILES = getenv("OSTTC_MEDIA_FILES", default=self.MEDIA_FILES)
         return self.script_args.get("MEDIA_FILES", ENV_DEFAULT_MEDIA_FILES).split(',')
 
+    def get_workers(self) -> int:
+        ENV_DEFAULT_WORKERS = getenv("OSTTC_WORKERS", default=self.DEFAULT_WORKERS)
+        return max(1, int(self.script_args.get("WORKERS", ENV_DEFAULT_WORKERS)))
+
+    def get_threads(self, workers: int = None) -> int:
+        """
+        torch threads per worker, 0 keeps the torch default for a single worker
+        and splits the available cores evenly between multiple workers.
+        """
+        ENV_DEFAULT_THREADS = getenv("OSTTC_THREADS", default=self.DEFAULT_THREADS)
+        threads = int(self.script_args.get("THREADS", ENV_DEFAULT_THREADS))
+        workers = workers or self.get_workers()
+        if threads > 0 or workers == 1:
+            return max(0, threads)
+        return max(1, (cpu_count() or 1) // workers)
+
+    def get_share_model(self) -> int:
+        """
+        1 loads the model once before the workers are forked, so they share its weights instead of loading their own.
+        """
+        ENV_DEFAULT_SHARE_MODEL = getenv("OSTTC_SHARE_MODEL", default=self.DEFAULT_SHARE_MODEL)
+        return int(self.script_args.get("SHARE_MODEL", ENV_DEFAULT_SHARE_MODEL))
+
+    def get_prefetch(self) -> int:
+        """
+        number of recordings decoded ahead of inference, 0 decodes every recording when it is transcribed.
+        """
+        ENV_DEFAULT_PREFETCH = getenv("OSTTC_PREFETCH", default=self.DEFAULT_PREFETCH)
+        return max(0, int(self.script_args.get("PREFETCH", ENV_DEFAULT_PREFETCH)))
+
+    def get_batch_size(self) -> int:
+        """
+        number of short recordings transcribed together in one batch, 1 transcribes one recording at a time.
+        """
+        ENV_DEFAULT_BATCH_SIZE = getenv("OSTTC_BATCH_SIZE", default=self.DEFAULT_BATCH_SIZE)
+        return max(1, int(self.script_args.get("BATCH_SIZE", ENV_DEFAULT_BATCH_SIZE)))
+
+    def get_chunk_seconds(self) -> float:
+        """
+        recordings longer than this get split at silences and transcribed in parallel chunks, 0 disables chunking.
+        """
+        ENV_DEFAULT_CHUNK_SECONDS = getenv("OSTTC_CHUNK_SECONDS", default=self.DEFAULT_CHUNK_SECONDS)
+        return float(self.script_args.get("CHUNK_SECONDS", ENV_DEFAULT_CHUNK_SECONDS))
+
+    def get_chunk_overlap(self) -> float:
+        ENV_DEFAULT_CHUNK_OVERLAP = getenv("OSTTC_CHUNK_OVERLAP", default=self.DEFAULT_CHUNK_OVERLAP)
+        return float(self.script_args.get("CHUNK_OVERLAP", ENV_DEFAULT_CHUNK_OVERLAP))
+
+    def get_vad(self):
+        """
+        the voice activity pre-pass cutting silences longer than VAD_MIN_SILENCE seconds below VAD_THRESHOLD dBFS
+        out of the decoded audio, None when VAD is off.
+        """
+        ENV_DEFAULT_VAD = getenv("OSTTC_VAD", default=self.DEFAULT_VAD)
+        ENV_DEFAULT_VAD_THRESHOLD = getenv("OSTTC_VAD_THRESHOLD", default=self.DEFAULT_VAD_THRESHOLD)
+        ENV_DEFAULT_VAD_MIN_SILENCE = getenv("OSTTC_VAD_MIN_SILENCE", default=self.DEFAULT_VAD_MIN_SILENCE)
+        if not int(self.script_args.get("VAD", ENV_DEFAULT_VAD)):
+            return None
+        return VoiceActivityFilter(
+            float(self.script_args.get("VAD_THRESHOLD", ENV_DEFAULT_VAD_THRESHOLD)),
+            float(self.script_args.get("VAD_MIN_SILENCE", ENV_DEFAULT_VAD_MIN_SILENCE)),
+        )
+
+    def get_governor(self) -> ResourceGovernor:
+        """
+        limits for shared machines: MAX_THREADS caps the torch threads of all workers together, MAX_RSS in MB
+        takes away workers and then picks smaller models, no new file gets started while the 1 minute load
+        average is above MAX_LOAD. 0 disables a limit.
+        """
+        ENV_DEFAULT_MAX_THREADS = getenv("OSTTC_MAX_THREADS", default=self.DEFAULT_MAX_THREADS)
+        ENV_DEFAULT_MAX_RSS = getenv("OSTTC_MAX_RSS", default=self.DEFAULT_MAX_RSS)
+        ENV_DEFAULT_MAX_LOAD = getenv("OSTTC_MAX_LOAD", default=self.DEFAULT_MAX_LOAD)
+        return ResourceGovernor(
+            max(0, int(self.script_args.get("MAX_THREADS", ENV_DEFAULT_MAX_THREADS))),
+            max(0.0, float(self.script_args.get("MAX_RSS", ENV_DEFAULT_MAX_RSS))),
+            max(0.0, float(self.script_args.get("MAX_LOAD", ENV_DEFAULT_MAX_LOAD))),
+        )
+
+    def apply_governor(self) -> None:
+        """
+        fits the workers, or the concurrency of serve mode, the threads and the models into the limits of
+        the governor. tiers that end up with the same model get merged, so it is loaded once.
+        """
+        tiers = self.model_tiers or [(None, self.model_size)]
+        processes = self.serve_concurrency if self.mode == "serve" else self.workers
+        models, workers = self.governor.fit_memory(
+            [model for _, model in tiers], processes, bool(self.quantize), bool(self.share_model)
+        )
+        if workers != processes:
+            self.threads = self.get_threads(workers)
+        workers, self.threads = self.governor.fit_threads(workers, self.threads)
+        if self.mode == "serve":
+            self.serve_concurrency = workers
+        else:
+            self.workers = workers
+        if not self.model_tiers:
+            self.model_size = models[0]
+            return
+        merged = []
+        for (max_seconds, _), model in zip(tiers, models):
+            if merged and merged[-1][1] == model:
+                merged.pop()
+            merged.append((max_seconds, model))
+        self.model_tiers = merged
+
+    def get_cache_path(self) -> str:
+        """
+        sqlite file for raw transcripts, an empty value disables the cache.
+        """
+        ENV_DEFAULT_CACHE = getenv("OSTTC_CACHE", default=self.DOCKER_CACHE if self.use_docker else self.DEFAULT_CACHE)
+        return self.script_args.get("CACHE", ENV_DEFAULT_CACHE)
+
+    def get_transcript_cache(self):
+        return TranscriptCache(self.cache_path) if self.cache_path else None
+
+    def get_audio_cache(self):
+        """
+        folder for decoded recordings, reruns skip ffmpeg. AUDIO_CACHE_SIZE is its budget in MB,
+        the entries used longest ago are removed beyond it. an empty value disables the cache.
+        """
+        ENV_DEFAULT_AUDIO_CACHE = getenv("OSTTC_AUDIO_CACHE", default=self.DEFAULT_AUDIO_CACHE)
+        ENV_DEFAULT_AUDIO_CACHE_SIZE = getenv("OSTTC_AUDIO_CACHE_SIZE", default=self.DEFAULT_AUDIO_CACHE_SIZE)
+        folder = self.script_args.get("AUDIO_CACHE", ENV_DEFAULT_AUDIO_CACHE)
+        if not folder:
+            return None
+        size_mb = float(self.script_args.get("AUDIO_CACHE_SIZE", ENV_DEFAULT_AUDIO_CACHE_SIZE))
+        return AudioCache(folder, int(size_mb * 1024 ** 2))
+
+    def get_manifest(self):
+        """
+        sqlite file tracking the state of every media file, an empty value disables the manifest.
+        """
+        ENV_DEFAULT_MANIFEST = getenv("OSTTC_MANIFEST", default=self.DEFAULT_MANIFEST)
+        manifest_path = self.script_args.get("MANIFEST", ENV_DEFAULT_MANIFEST)
+        return Manifest(manifest_path) if manifest_path else None
+
+    def get_leases(self):
+        """
+        folder for the leases of instances sharing LOCAL_PATH, every recording gets transcribed by the instance
+        holding its lease. leases not renewed for LEASE_SECONDS get taken over. an empty value disables leases.
+        """
+        ENV_DEFAULT_LEASES = getenv("OSTTC_LEASES", default=self.DEFAULT_LEASES)
+        ENV_DEFAULT_LEASE_SECONDS = getenv("OSTTC_LEASE_SECONDS", default=self.DEFAULT_LEASE_SECONDS)
+        folder = self.script_args.get("LEASES", ENV_DEFAULT_LEASES)
+        if not folder:
+            return None
+        return Leases(folder, self.path, float(self.script_args.get("LEASE_SECONDS", ENV_DEFAULT_LEASE_SECONDS)))
+
+    def get_watch_interval(self) -> float:
+        ENV_DEFAULT_WATCH_INTERVAL = getenv("OSTTC_WATCH_INTERVAL", default=self.DEFAULT_WATCH_INTERVAL)
+        return float(self.script_args.get("WATCH_INTERVAL", ENV_DEFAULT_WATCH_INTERVAL))
+
+    def get_watch_debounce(self) -> float:
+        ENV_DEFAULT_WATCH_DEBOUNCE = getenv("OSTTC_WATCH_DEBOUNCE", default=self.DEFAULT_WATCH_DEBOUNCE)
+        return float(self.script_args.get("WATCH_DEBOUNCE", ENV_DEFAULT_WATCH_DEBOUNCE))
+
+    def get_serve_address(self) -> str:
+        """
+        host:port the service listens on in serve mode, unix:/path/to.sock listens on a unix socket instead.
+        """
+        ENV_DEFAULT_SERVE_ADDRESS = getenv("OSTTC_SERVE_ADDRESS", default=self.DEFAULT_SERVE_ADDRESS)
+        return self.script_args.get("SERVE_ADDRESS", ENV_DEFAULT_SERVE_ADDRESS)
+
+    def get_serve_queue(self) -> int:
+        """
+        jobs waiting in serve mode, further submissions are rejected until there is room again.
+        """
+        ENV_DEFAULT_SERVE_QUEUE = getenv("OSTTC_SERVE_QUEUE", default=self.DEFAULT_SERVE_QUEUE)
+        return max(1, int(self.script_args.get("SERVE_QUEUE", ENV_DEFAULT_SERVE_QUEUE)))
+
+    def get_serve_concurrency(self) -> int:
+        """
+        jobs transcribed at the same time in serve mode, more than one run in worker processes.
+        """
+        ENV_DEFAULT_SERVE_CONCURRENCY = getenv("OSTTC_SERVE_CONCURRENCY", default=self.DEFAULT_SERVE_CONCURRENCY)
+        return max(1, int(self.script_args.get("SERVE_CONCURRENCY", ENV_DEFAULT_SERVE_CONCURRENCY)))
+
+    def get_metrics(self) -> Metrics:
+        """
+        stage timings are always collected and summarized at the end of a run, the files are optional:
+        METRICS appends one json line per file, METRICS_PROMETHEUS is a textfile for the node exporter.
+        """
+        ENV_DEFAULT_METRICS = getenv("OSTTC_METRICS", default=self.DEFAULT_METRICS)
+        ENV_DEFAULT_METRICS_PROMETHEUS = getenv("OSTTC_METRICS_PROMETHEUS", default=self.DEFAULT_METRICS_PROMETHEUS)
+        return Metrics(
+            self.script_args.get("METRICS", ENV_DEFAULT_METRICS),
+            self.script_args.get("METRICS_PROMETHEUS", ENV_DEFAULT_METRICS_PROMETHEUS),
+            self.decoding.name,
+        )
+
+    def get_scheduler(self) -> Scheduler:
+        """
+        the order pending files get transcribed in: fifo, longest, newest or shortest first.
+        """
+        ENV_DEFAULT_SCHEDULE = getenv("OSTTC_SCHEDULE", default=self.DEFAULT_SCHEDULE)
+        return Scheduler(self.script_args.get("SCHEDULE", ENV_DEFAULT_SCHEDULE))
+
+    def get_discovery(self) -> Discovery:
+        """
+        comma separated globs for the files to transcribe: INCLUDE limits the files, EXCLUDE skips files
+        and folders, excluded folders are not entered at all. both match names and paths relative to LOCAL_PATH.
+        """
+        ENV_DEFAULT_INCLUDE = getenv("OSTTC_INCLUDE", default=self.DEFAULT_INCLUDE)
+        ENV_DEFAULT_EXCLUDE = getenv("OSTTC_EXCLUDE", default=self.DEFAULT_EXCLUDE)
+        include = self.script_args.get("INCLUDE", ENV_DEFAULT_INCLUDE)
+        exclude = self.script_args.get("EXCLUDE", ENV_DEFAULT_EXCLUDE)
+        return Discovery(
+            self.media_files,
+            [pattern.strip() for pattern in include.split(",") if pattern.strip()],
+            [pattern.strip() for pattern in exclude.split(",") if pattern.strip()],
+        )
+
     def get_converter(self):
-        return Whisper(self.language, self.model_size, action_keywords=self.action_keywords)
+        # imported here, so runs without anything to transcribe never import the backend
+        options = dict(
+            action_keywords=self.action_keywords,
+            transcript_cache=self.get_transcript_cache(),
+            chunk_seconds=self.chunk_seconds,
+            chunk_overlap=self.chunk_overlap,
+            quantize=self.quantize,
+            vad=self.vad,
+            audio_cache=self.audio_cache,
+            decoding=self.decoding,
+        )
+        if self.model_tiers:
+            from src.processor.TieredWhisper import TieredWhisper
+            return TieredWhisper(
+                self.language,
+                self.model_tiers,
+                time_budget=self.time_budget,
+                escalate_logprob=self.escalate_logprob,
+                share_model=self.share_model,
+                **options,
+            )
+        from src.processor.Whisper import Whisper
+        return Whisper(self.language, self.model_size, **options)
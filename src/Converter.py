@@ -1,8 +1,21 @@
 from src.Config import Config
+from src.WorkerPool import WorkerPool, submit_bounded
+from src.Manifest import ManifestEntry, STATUS_PENDING, STATUS_IN_PROGRESS, STATUS_DONE, STATUS_FAILED, STATUS_SILENT
+from src.Watcher import Debouncer, create_watcher, install_stop_handlers
+from src.Pipeline import prefetch, BackgroundWorker
+from src.NoteWriter import NoteWriter
+from src.VoiceActivity import SilentRecording
+from src.Service import TranscriptionService, create_server
 from datetime import datetime
 from logging import info, error, warning
-from os import walk
-from os.path import join, splitext, basename, exists
+from os import stat
+from os.path import join, split, splitext, basename, exists
+from contextlib import nullcontext
+from threading import Event, Thread
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 
 class ObsidianSpeechToTextConverter:
@@ -12,6 +25,30 @@ class ObsidianSpeechToTextConverter:
         self.media_files = config.media_files
         self.source_string_format = config.source_string
         self.target_string_format = config.target_string
+        self.mode = config.mode
+        self.workers = config.workers
+        self.threads = config.threads
+        self.share_model = config.share_model
+        self.manifest = config.manifest
+        self.watch_interval = config.watch_interval
+        self.watch_debounce = config.watch_debounce
+        self.serve_address = config.serve_address
+        self.serve_queue = config.serve_queue
+        self.serve_concurrency = config.serve_concurrency
+        self.chunk_seconds = config.chunk_seconds
+        self.prefetch = config.prefetch
+        self.batch_size = config.batch_size
+        self.metrics = config.metrics
+        self.scheduler = config.scheduler
+        self.discovery = config.discovery
+        self.governor = config.governor
+        self.leases = config.leases
+        # recordings skipped by the last discovery because their note exists
+        self.existing_notes = 0
+        # jobs started by the last conversion
+        self.started = 0
+        # recordings started but not done, failed or skipped yet
+        self.unfinished = set()
 
         self.active_model = config.converter
 
@@ -28,35 +65,486 @@ class ObsidianSpeechToTextConverter:
 
         return join(root, out_filename)
 
+    def get_pending_files(self, overwrite_existing: bool = False) -> Iterator[Tuple[str, str]]:
+        # the manifest tracks conversions, reformatting every note must not touch it
+        manifest = None if overwrite_existing else self.manifest
+        known = manifest.load() if manifest else {}
+        updates = []
+        self.existing_notes = 0
+        for audio_file in self.discovery.walk(self.input_folder):
+            root, file = split(audio_file)
+            if manifest:
+                stat_result = stat(audio_file)
+                entry = known.get(audio_file)
+                if entry and entry.status in [STATUS_DONE, STATUS_FAILED, STATUS_SILENT] and not self.overwrite_existing and \
+                        entry.is_unchanged(stat_result.st_size, stat_result.st_mtime):
+                    continue
+
+            out_file = self.get_markdown_file_name(splitext(file)[0], root)
+
+            if exists(out_file) and not (self.overwrite_existing or overwrite_existing):
+                self.existing_notes += 1
+                if manifest:
+                    updates.append(
+                        ManifestEntry(audio_file, stat_result.st_size, stat_result.st_mtime, out_file, STATUS_DONE)
+                    )
+                continue
+
+            if manifest:
+                updates.append(
+                    ManifestEntry(audio_file, stat_result.st_size, stat_result.st_mtime, out_file, STATUS_PENDING)
+                )
+                # the file may get started before discovery is done, its entry has to exist by then
+                manifest.update(updates)
+                updates = []
+            yield audio_file, out_file
+        if manifest:
+            manifest.update(updates)
+
+    def discover(self) -> Iterator[Tuple[str, str]]:
+        """
+        get_pending_files() that measures the time spent finding the files, even while they are transcribed
+        as they are found, and reports the skipped files once it is done.
+        """
+        files = 0
+        duration = 0.0
+        jobs = self.get_pending_files()
+        while True:
+            start = perf_counter()
+            job = next(jobs, None)
+            duration += perf_counter() - start
+            if job is None:
+                break
+            files += 1
+            yield job
+        self.metrics.add("discovery", duration)
+        self.discovery.report()
+        if self.existing_notes:
+            info(f"Skipped {self.existing_notes} recording(s) that already have a note")
+        info(f"Planned {files} file(s) for transcription in {duration:.3f} seconds")
+
+    def plan(self) -> List[Tuple[str, str]]:
+        return list(self.discover())
+
+    def set_status(self, audio_file: str, status: str, error_message: str = "") -> None:
+        if self.manifest:
+            self.manifest.set_status(audio_file, status, error_message)
+
+    def claim(self, audio_file: str, out_file: str) -> bool:
+        """
+        with leases, true once this instance holds the lease of the recording and its note does not exist yet.
+        """
+        if not self.leases:
+            return True
+        if not self.leases.claim(audio_file):
+            info(f"Skipping: '{basename(audio_file)}' is transcribed by another instance")
+            return False
+        # another instance may have finished it between discovery and the claim
+        if exists(out_file) and not self.overwrite_existing:
+            self.release(audio_file)
+            info(f"Skipping: '{basename(audio_file)}' got transcribed by another instance")
+            return False
+        return True
+
+    def release(self, audio_file: str) -> None:
+        if self.leases:
+            self.leases.release(audio_file)
+
+    def is_exclusive(self) -> bool:
+        # instances sharing a folder write every note once, the first one to finish it wins
+        return bool(self.leases) and not self.overwrite_existing
+
+    def throttle(self, stop: Optional[Event] = None) -> None:
+        """
+        holds the next file back while the machine is busy, see ResourceGovernor.
+        """
+        waited = self.governor.wait(stop)
+        if waited:
+            self.metrics.add("throttled", waited)
+
+    def start_jobs(self, jobs: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        for audio_file, out_file in jobs:
+            self.throttle()
+            if not self.claim(audio_file, out_file):
+                continue
+            self.set_status(audio_file, STATUS_IN_PROGRESS)
+            self.unfinished.add(audio_file)
+            self.started += 1
+            yield audio_file, out_file
+
+    def abandon_unfinished(self) -> None:
+        """
+        puts the recordings an aborted run had started, i.e. decoded ahead or collected for a batch,
+        back to pending and gives up their leases, so the next run or another instance picks them up.
+        """
+        for audio_file in list(self.unfinished):
+            info(f"Leaving '{basename(audio_file)}' for the next run")
+            self.set_status(audio_file, STATUS_PENDING)
+            self.release(audio_file)
+        self.unfinished.clear()
+
+    def run(self) -> None:
+        if self.mode == "reformat":
+            self.reformat()
+        elif self.mode == "watch":
+            self.watch()
+        elif self.mode == "serve":
+            self.serve()
+        elif self.mode == "prepare":
+            self.active_model.prepare()
+            info("Preparing finished")
+        elif self.mode == "plan":
+            for audio_file, out_file in self.plan():
+                info(f"Pending: '{audio_file}' => '{out_file}'")
+        else:
+            self.convert()
+
     def convert(self) -> None:
         if not self.active_model:
             error("Can't convert, no active model found")
             raise Exception("Can't convert, no active model found")
 
-        for root, dirs, files in walk(self.input_folder):
-            for file in files:
-                tmp_filename, file_extension = splitext(basename(file))
-                if file_extension not in self.media_files:
-                    if file_extension not in [".md"] and file not in [".gitignore"]:
-                        info(f"Skipping: '{file}' has no matching file extension ({', '.join(self.media_files)})")
+        if self.scheduler.policy == "fifo":
+            # transcribing starts with the first file found, the rest is found meanwhile
+            jobs = self.scheduler.stream(self.discover())
+        else:
+            jobs = iter(self.scheduler.order(self.plan()))
+        first = next(jobs, None)
+        if first is None:
+            info("Nothing to transcribe")
+            self.metrics.finish()
+            return
+        self.started = 0
+        start = perf_counter()
+        try:
+            self.convert_jobs(chain([first], jobs))
+        finally:
+            if self.leases:
+                self.leases.close()
+            self.metrics.finish()
+        seconds = perf_counter() - start
+        self.report_throughput(self.started, seconds)
+        self.governor.report(self.started, seconds)
+        info("Converting finished")
+
+    def convert_jobs(self, jobs: Iterable[Tuple[str, str]]) -> None:
+        if self.workers > 1:
+            self.convert_parallel(jobs)
+        elif self.batch_size > 1:
+            if self.threads:
+                self.active_model.set_threads(self.threads)
+            self.convert_batched(jobs)
+        elif self.prefetch:
+            if self.threads:
+                self.active_model.set_threads(self.threads)
+            self.convert_pipelined(jobs)
+        else:
+            if self.threads:
+                self.active_model.set_threads(self.threads)
+            for audio_file, out_file in self.start_jobs(jobs):
+                try:
+                    self.convert_file(audio_file, out_file)
+                except Exception as e:
+                    self.fail_file(audio_file, str(e))
+                    raise
+
+    @staticmethod
+    def report_throughput(files: int, seconds: float) -> None:
+        if files:
+            info(f"Converted {files} file(s) in {seconds:.1f} seconds ({files * 60 / max(seconds, 1e-9):.1f} files/minute)")
+
+    def convert_pipelined(self, jobs: Iterable[Tuple[str, str]]) -> None:
+        """
+        decodes the next recordings in a background thread and formats and writes finished transcripts
+        in another one, so the model only waits for the audio of the very first file.
+        """
+        info(f"Prefetching up to {self.prefetch} decoded recordings")
+        decoded = prefetch(self.start_jobs(jobs), lambda job: self.active_model.load_audio(job[0]), self.prefetch)
+        try:
+            with BackgroundWorker(self.write_transcript, self.prefetch, self.fail_write) as writer:
+                for (audio_file, out_file), audio, exception in decoded:
+                    try:
+                        if exception:
+                            raise exception
+                        info(f"Transcribing: '{basename(audio_file)}'")
+                        transcript = self.active_model.get_transcript(audio_file, audio=audio)
+                    except SilentRecording as e:
+                        self.skip_silent(audio_file, e)
+                        continue
+                    except Exception as e:
+                        error(e)
+                        self.fail_file(audio_file, str(e))
+                        raise Exception(f"Error while converting {audio_file} with message: {e}")
+                    writer.put((audio_file, out_file, transcript))
+        finally:
+            decoded.close()
+            self.abandon_unfinished()
+
+    def convert_batched(self, jobs: Iterable[Tuple[str, str]]) -> None:
+        """
+        short recordings get collected into batches of batch_size and share one inference run,
+        longer ones are transcribed on their own as soon as they are decoded.
+        """
+        info(f"Batching up to {self.batch_size} short recordings")
+        decoded = prefetch(self.start_jobs(jobs), lambda job: self.active_model.load_audio(job[0]),
+                           max(self.prefetch, self.batch_size))
+        batch = []
+        try:
+            for (audio_file, out_file), audio, exception in decoded:
+                if isinstance(exception, SilentRecording):
+                    self.skip_silent(audio_file, exception)
                     continue
+                if exception:
+                    self.fail_jobs([(audio_file, out_file)], exception)
+                if self.active_model.can_batch(audio):
+                    batch.append(((audio_file, out_file), audio))
+                    if len(batch) >= self.batch_size:
+                        self.transcribe_jobs(batch)
+                        batch = []
+                else:
+                    self.transcribe_jobs([((audio_file, out_file), audio)])
+            self.transcribe_jobs(batch)
+        finally:
+            decoded.close()
+            self.abandon_unfinished()
+
+    def transcribe_jobs(self, batch: List[Tuple[Tuple[str, str], object]]) -> None:
+        if not batch:
+            return
+        audio_files = [audio_file for (audio_file, _), _ in batch]
+        info(f"Transcribing: {', '.join(repr(basename(audio_file)) for audio_file in audio_files)}")
+        try:
+            if len(batch) == 1:
+                transcripts = [self.active_model.get_transcript(audio_files[0], audio=batch[0][1])]
+            else:
+                transcripts = self.active_model.get_transcripts(audio_files, [audio for _, audio in batch])
+        except Exception as e:
+            self.fail_jobs([job for job, _ in batch], e)
+        for ((audio_file, out_file), _), transcript in zip(batch, transcripts):
+            self.write_transcript((audio_file, out_file, transcript))
+
+    def fail_jobs(self, jobs: List[Tuple[str, str]], exception: Exception) -> None:
+        error(exception)
+        for audio_file, _ in jobs:
+            self.fail_file(audio_file, str(exception))
+        raise Exception(f"Error while converting {jobs[0][0]} with message: {exception}")
+
+    def fail_write(self, job: Tuple[str, str, dict], exception: Exception) -> None:
+        error(f"Failed to write '{job[1]}': {exception}")
+        self.fail_file(job[0], str(exception))
+
+    def write_transcript(self, job: Tuple[str, str, dict]) -> None:
+        audio_file, out_file, transcript = job
+        content = self.active_model.format_transcript(transcript, audio_file)
+        self.finish_file(audio_file, out_file, content)
+
+    def convert_file(self, audio_file: str, out_file: str) -> str:
+        """
+        transcribes one recording into its note and returns its new status. processors that stream notes
+        write it while the transcript comes in, see NoteWriter, for all others it is written once complete.
+        """
+        try:
+            if getattr(self.active_model, "streams_notes", False) is not True:
+                self.finish_file(audio_file, out_file, self.transcribe(audio_file))
+                return STATUS_DONE
+            info(f"Transcribing: '{basename(audio_file)}'")
+            info(f"Saving transcription to: '{out_file}'")
+            with NoteWriter(out_file, self.is_exclusive()) as writer:
+                self.active_model.transcribe_to(audio_file, writer)
+        except SilentRecording as e:
+            self.skip_silent(audio_file, e)
+            return STATUS_SILENT
+        except FileExistsError:
+            warning(f"Keeping '{out_file}', another instance wrote it meanwhile")
+        self.mark_done(audio_file, writer.seconds)
+        return STATUS_DONE
+
+    def finish_file(self, audio_file: str, out_file: str, content: str, stats: dict = None) -> None:
+        """
+        writes the note, records the metrics of the file and marks it done.
+        """
+        start = perf_counter()
+        try:
+            self.create_transcription_file(out_file, content, self.is_exclusive())
+        except FileExistsError:
+            warning(f"Keeping '{out_file}', another instance wrote it meanwhile")
+        self.mark_done(audio_file, perf_counter() - start, stats)
+
+    def mark_done(self, audio_file: str, write_seconds: float, stats: dict = None) -> None:
+        stats = self.active_model.pop_stats(audio_file) if stats is None else stats
+        self.metrics.add_file(audio_file, {**stats, "write": write_seconds})
+        self.set_status(audio_file, STATUS_DONE)
+        self.unfinished.discard(audio_file)
+        self.release(audio_file)
+        self.scheduler.done(audio_file, stats)
+        self.scheduler.report(self.workers)
 
-                out_file = self.get_markdown_file_name(tmp_filename, root)
+    def fail_file(self, audio_file: str, message: str, stats: dict = None) -> None:
+        self.set_status(audio_file, STATUS_FAILED, message)
+        self.unfinished.discard(audio_file)
+        stats = self.active_model.pop_stats(audio_file) if stats is None else stats
+        self.metrics.add_file(audio_file, stats, STATUS_FAILED)
+        self.release(audio_file)
+        self.scheduler.done(audio_file, {})
 
-                if exists(out_file) and not self.overwrite_existing:
-                    info(f"Skipping: '{out_file}' already exists")
+    def skip_silent(self, audio_file: str, exception: SilentRecording, stats: dict = None) -> None:
+        """
+        no note for a recording without speech, the manifest remembers it as silent.
+        """
+        info(f"Skipping: {exception}")
+        self.set_status(audio_file, STATUS_SILENT)
+        self.unfinished.discard(audio_file)
+        stats = self.active_model.pop_stats(audio_file) if stats is None else stats
+        stats = {**stats, "audio_seconds": exception.seconds, "silence_removed": exception.seconds}
+        self.metrics.add_file(audio_file, stats, STATUS_SILENT)
+        self.release(audio_file)
+        self.scheduler.done(audio_file, {})
+
+    def convert_parallel(self, jobs: Iterable[Tuple[str, str]]) -> None:
+        failed = []
+        with WorkerPool(self.active_model, self.workers, self.threads, self.share_model) as pool:
+            if self.chunk_seconds:
+                results = self.transcribe_chunked(pool, jobs)
+            else:
+                results = pool.imap_unordered(self.start_jobs(jobs))
+            for audio_file, out_file, content, exception in results:
+                # chunked recordings got decoded and formatted here, their chunks got transcribed by the workers
+                stats = {**self.active_model.pop_stats(audio_file), **pool.pop_stats(audio_file)}
+                if isinstance(exception, SilentRecording):
+                    self.skip_silent(audio_file, exception, stats)
+                    continue
+                if exception:
+                    error(f"Failed to transcribe '{basename(audio_file)}': {exception}")
+                    self.fail_file(audio_file, str(exception), stats)
+                    failed.append(audio_file)
                     continue
+                self.finish_file(audio_file, out_file, content, stats)
+        if failed:
+            warning(f"{len(failed)} file(s) failed to transcribe: {', '.join(failed)}")
 
-                audio_file = str(join(root, file))
-                content = self.transcribe(audio_file)
-                self.create_transcription_file(out_file, content)
-        info("Converting finished")
+    def transcribe_chunked(self, pool: WorkerPool, jobs: Iterable[Tuple[str, str]]) -> Iterator[tuple]:
+        """
+        decodes, splits and stitches the recordings in threads of this process, while all chunks of
+        all recordings get transcribed by the worker pool. a long recording keeps every worker busy.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as files:
+            # a recording is only started once a thread is free for it, the rest stays unclaimed for other instances
+            results = submit_bounded(
+                lambda audio_file: files.submit(self.active_model.transcribe, audio_file, pool.map),
+                self.start_jobs(jobs), self.workers
+            )
+            for audio_file, out_file, future in results:
+                exception = future.exception()
+                yield audio_file, out_file, None if exception else future.result(), exception
+
+    def watch(self, stop: Optional[Event] = None) -> None:
+        """
+        keeps the model loaded and transcribes new recordings as soon as they are completely written.
+        """
+        if not self.active_model:
+            error("Can't watch, no active model found")
+            raise Exception("Can't watch, no active model found")
+        if stop is None:
+            stop = Event()
+            install_stop_handlers(stop)
+        if self.threads:
+            self.active_model.set_threads(self.threads)
+        self.active_model.init_model()
+
+        debouncer = Debouncer(self.watch_debounce)
+        # failed and silent recordings are only tried again once they changed
+        skipped = {}
+        watcher = create_watcher(self.input_folder, stop)
+        info(f"Watching '{self.input_folder}' for new recordings")
+        try:
+            changed = True
+            while not stop.is_set():
+                unsettled = False
+                for audio_file, out_file in self.get_pending_files() if changed else []:
+                    if stop.is_set():
+                        break
+                    if not debouncer.is_settled(audio_file):
+                        unsettled = True
+                        continue
+                    if skipped.get(audio_file) == debouncer.seen.get(audio_file):
+                        continue
+                    self.throttle(stop)
+                    if stop.is_set() or not self.claim(audio_file, out_file):
+                        continue
+                    self.set_status(audio_file, STATUS_IN_PROGRESS)
+                    try:
+                        if self.convert_file(audio_file, out_file) == STATUS_SILENT:
+                            skipped[audio_file] = debouncer.seen.get(audio_file)
+                    except Exception as e:
+                        error(f"Failed to transcribe '{basename(audio_file)}': {e}")
+                        self.fail_file(audio_file, str(e))
+                        skipped[audio_file] = debouncer.seen.get(audio_file)
+                changed = watcher.wait(self.watch_debounce if unsettled else self.watch_interval) or unsettled
+        finally:
+            watcher.close()
+            if self.leases:
+                self.leases.close()
+            self.metrics.finish()
+        info("Watching stopped")
+
+    def serve(self, stop: Optional[Event] = None, ready: Optional[Event] = None) -> None:
+        """
+        keeps the model loaded and transcribes the jobs submitted to the http service, see TranscriptionService.
+        """
+        if not self.active_model:
+            error("Can't serve, no active model found")
+            raise Exception("Can't serve, no active model found")
+        if stop is None:
+            stop = Event()
+            install_stop_handlers(stop)
+        if self.threads:
+            self.active_model.set_threads(self.threads)
+        concurrency = self.serve_concurrency
+        pool = WorkerPool(self.active_model, concurrency, self.threads, self.share_model) if concurrency > 1 else None
+        with pool or nullcontext():
+            if pool is None:
+                self.active_model.init_model()
+            service = TranscriptionService(self, self.serve_queue, concurrency, pool)
+            server = create_server(self.serve_address, service)
+            self.serve_address = self.serve_address if isinstance(server.server_address, str) else \
+                ":".join(str(part) for part in server.server_address[:2])
+            service.start()
+            thread = Thread(target=server.serve_forever, name="service", daemon=True)
+            thread.start()
+            info(f"Serving on '{self.serve_address}' with {concurrency} concurrent job(s), "
+                 f"up to {self.serve_queue} waiting")
+            if ready:
+                ready.set()
+            try:
+                stop.wait()
+            finally:
+                server.shutdown()
+                server.server_close()
+                service.stop()
+                self.metrics.finish()
+        info("Serving stopped")
+
+    def reformat(self) -> None:
+        """
+        regenerates every markdown note from the cached raw transcripts, no model gets loaded.
+        """
+        for audio_file, out_file in self.get_pending_files(overwrite_existing=True):
+            content = self.active_model.reformat(audio_file)
+            if content is None:
+                warning(f"Skipping: no cached transcript for '{basename(audio_file)}'")
+                continue
+            self.create_transcription_file(out_file, content)
+        info("Reformatting finished")
 
     def transcribe(self, audio_file: str) -> str:
         info(f"Transcribing: '{basename(audio_file)}'")
         return self.active_model.transcribe(audio_file)
 
-    def create_transcription_file(self, out_file: str, content: str) -> None:
+    def create_transcription_file(self, out_file: str, content: str, exclusive: bool = False) -> None:
         info(f"Saving transcription to: '{out_file}'")
+        if exclusive:
+            with NoteWriter(out_file, exclusive=True) as writer:
+                writer.write(content)
+            return
         with open(out_file, "w") as f:
             f.write(content)
\ No newline at end of file
@@ -0,0 +1,83 @@
+from typing import Iterable, List, Optional, Tuple
+
+# the temperatures whisper.transcribe tries one after another until a result passes its thresholds
+DEFAULT_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+PRESETS = {
+    # greedy, no fallback and no prompt from the previous window, which lets repetitions spread
+    "fast": dict(beam_size=None, best_of=None, temperature=(0.0,), condition_on_previous_text=False),
+    # whisper.transcribe's own defaults
+    "balanced": dict(beam_size=None, best_of=None, temperature=DEFAULT_TEMPERATURES, condition_on_previous_text=True),
+    # the defaults of the whisper command line, beam search and five samples per fallback
+    "accurate": dict(beam_size=5, best_of=5, temperature=DEFAULT_TEMPERATURES, condition_on_previous_text=True),
+}
+DEFAULT_PRESET = "balanced"
+
+
+class DecodingSettings:
+    """
+    the decoding options whisper gets: a named preset, options given on their own replace the ones of the preset.
+    """
+
+    def __init__(self, preset: str = DEFAULT_PRESET, beam_size: Optional[int] = None, best_of: Optional[int] = None,
+                 temperature: Optional[Iterable[float]] = None, condition_on_previous_text: Optional[bool] = None):
+        if preset not in PRESETS:
+            raise ValueError(f"Invalid decoding preset. Valid options are: {', '.join(PRESETS)}")
+        self.preset = preset
+        self.overrides = {}
+        # 0 turns beam search or sampling off, like None in whisper
+        if beam_size is not None:
+            self.overrides["beam_size"] = beam_size or None
+        if best_of is not None:
+            self.overrides["best_of"] = best_of or None
+        if temperature is not None:
+            self.overrides["temperature"] = tuple(float(value) for value in temperature)
+        if condition_on_previous_text is not None:
+            self.overrides["condition_on_previous_text"] = bool(condition_on_previous_text)
+        self.overrides = {name: value for name, value in self.overrides.items() if value != PRESETS[preset][name]}
+        self.options = {**PRESETS[preset], **self.overrides}
+
+    @property
+    def name(self) -> str:
+        # the label of the metrics, changed options get marked
+        return f"{self.preset}*" if self.overrides else self.preset
+
+    @property
+    def temperatures(self) -> Tuple[float, ...]:
+        return self.options["temperature"]
+
+    @property
+    def can_fall_back(self) -> bool:
+        return len(self.temperatures) > 1
+
+    def transcribe_options(self) -> dict:
+        """
+        keyword arguments for whisper.transcribe.
+        """
+        return dict(self.options)
+
+    def batch_options(self) -> dict:
+        """
+        keyword arguments for whisper.DecodingOptions of the first, greedy or beam search, try.
+        """
+        return {"beam_size": self.options["beam_size"]}
+
+    def count_fallbacks(self, segments: List[dict]) -> int:
+        """
+        decoding runs whisper repeated at a higher temperature, counted per 30 second window from the temperature
+        its segments were decoded with.
+        """
+        windows = {segment.get("seek"): segment.get("temperature") or 0.0 for segment in segments}
+        return sum(
+            min(range(len(self.temperatures)), key=lambda index: abs(self.temperatures[index] - temperature))
+            for temperature in windows.values() if temperature > 0
+        )
+
+    def get_cache_options(self) -> dict:
+        """
+        the options that differ from the defaults, so transcripts cached before presets existed stay valid.
+        """
+        defaults = PRESETS[DEFAULT_PRESET]
+        return {name: value for name, value in self.options.items() if value != defaults[name]}
+
+    def __str__(self) -> str:
+        return f"{self.name} ({', '.join(f'{name}={value}' for name, value in self.options.items())})"
@@ -0,0 +1,85 @@
+from collections import Counter
+from fnmatch import fnmatch
+from logging import info, warning
+from os import scandir
+from os.path import join, splitext
+from typing import Iterable, Iterator, List
+
+# obsidian's settings, its trash and version control never hold recordings to transcribe
+DEFAULT_EXCLUDE = [".obsidian", ".git", ".trash"]
+# extensions shown in the skip summary, the rest is only counted
+SUMMARY_EXTENSIONS = 5
+
+
+class Discovery:
+    """
+    finds the media files of a folder with scandir. folders matching an exclude pattern are not entered at all,
+    files have to match an include pattern if there are any. patterns are globs matched against the name and
+    the path relative to the folder, i.e. "Attachments", "*.excalidraw.md" or "Archive/2020*".
+    skipped files are counted and reported once instead of logged one by one.
+    """
+
+    def __init__(self, media_files: Iterable[str], include: List[str] = None, exclude: List[str] = None):
+        self.extensions = frozenset(media_files)
+        self.include = list(include or [])
+        self.exclude = list(DEFAULT_EXCLUDE if exclude is None else exclude)
+        # extension => files skipped because it is no media file
+        self.skipped = Counter()
+        self.excluded_files = 0
+        self.excluded_folders = 0
+
+    def matches(self, patterns: List[str], name: str, relative_path: str) -> bool:
+        return any(fnmatch(name, pattern) or fnmatch(relative_path, pattern) for pattern in patterns)
+
+    def walk(self, folder: str) -> Iterator[str]:
+        """
+        yields the media files of the folder and its sub-folders as they are found, top down like os.walk.
+        """
+        self.skipped.clear()
+        self.excluded_files = 0
+        self.excluded_folders = 0
+        folders = [(folder, "")]
+        while folders:
+            path, relative = folders.pop()
+            try:
+                with scandir(path) as iterator:
+                    entries = sorted(iterator, key=lambda entry: entry.name)
+            except OSError as e:
+                warning(f"Can't read '{path}': {e}")
+                continue
+            sub_folders = []
+            for entry in entries:
+                relative_path = f"{relative}{entry.name}"
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if self.matches(self.exclude, entry.name, relative_path):
+                        self.excluded_folders += 1
+                    # like os.walk, linked folders are not followed
+                    elif not entry.is_symlink():
+                        sub_folders.append((entry.path, f"{relative_path}/"))
+                    continue
+                extension = splitext(entry.name)[1]
+                if extension not in self.extensions:
+                    self.skipped[extension] += 1
+                elif self.matches(self.exclude, entry.name, relative_path) or \
+                        (self.include and not self.matches(self.include, entry.name, relative_path)):
+                    self.excluded_files += 1
+                else:
+                    yield join(path, entry.name)
+            folders.extend(reversed(sub_folders))
+
+    def report(self) -> None:
+        skipped = sum(self.skipped.values())
+        if skipped:
+            extensions = ", ".join(
+                f"{extension or 'no extension'} {count}"
+                for extension, count in self.skipped.most_common(SUMMARY_EXTENSIONS)
+            )
+            more = ", ..." if len(self.skipped) > SUMMARY_EXTENSIONS else ""
+            info(f"Skipped {skipped} file(s) without a media extension ({extensions}{more})")
+        if self.excluded_files or self.excluded_folders:
+            info(f"Skipped {self.excluded_files} file(s) and {self.excluded_folders} folder(s) "
+                 f"by include/exclude patterns")
@@ -0,0 +1,135 @@
+from logging import info, warning
+from threading import Event
+from time import perf_counter
+from typing import List, Optional, Tuple
+import os
+
+# the model sizes from small to large, the english only ones end with .en
+MODEL_ORDER = ["tiny", "base", "small", "medium", "large"]
+# peak rss of a process transcribing 30 seconds with the model on the cpu in MB, measured with random weights
+# of the real size, large extrapolated. the int8 ones were measured loading the quantized cache
+MODEL_RSS_MB = {"tiny": 850, "base": 1000, "small": 1800, "medium": 4100, "large": 7500}
+INT8_RSS_MB = {"tiny": 800, "base": 950, "small": 1500, "medium": 3100, "large": 5400}
+# rss of a process with torch and whisper imported, before any model is loaded
+PROCESS_RSS_MB = 560
+# float32 weights in MB, the part of the rss workers sharing the model share
+WEIGHTS_MB = {"tiny": 156, "base": 296, "small": 976, "medium": 3076, "large": 6200}
+# seconds between two looks at the load average while new files are held back
+LOAD_CHECK_SECONDS = 5.0
+
+
+def base_model(model: str) -> str:
+    return model.split(".")[0]
+
+
+def smaller_model(model: str) -> str:
+    """
+    the next smaller model of the same language, tiny stays tiny.
+    """
+    name, dot, language = model.partition(".")
+    return f"{MODEL_ORDER[max(0, MODEL_ORDER.index(name) - 1)]}{dot}{language}"
+
+
+class ResourceGovernor:
+    """
+    keeps a run within the resources of a shared machine. max_threads caps the torch threads of all workers
+    together, max_rss_mb the estimated memory of all of them, which takes away workers first and then
+    picks smaller models. with max_load no new file gets started while the 1 minute load average is above it.
+    0 disables a limit.
+    """
+
+    def __init__(self, max_threads: int = 0, max_rss_mb: float = 0, max_load: float = 0,
+                 interval: float = LOAD_CHECK_SECONDS):
+        self.max_threads = max_threads
+        self.max_rss_mb = max_rss_mb
+        self.max_load = max_load
+        self.interval = interval
+        # seconds new files were held back by the load
+        self.throttled = 0.0
+        self.pauses = 0
+        if max_load and not hasattr(os, "getloadavg"):
+            warning("The load average is not available on this system, MAX_LOAD gets ignored")
+            self.max_load = 0
+
+    @property
+    def is_limited(self) -> bool:
+        return bool(self.max_threads or self.max_rss_mb or self.max_load)
+
+    def estimate_rss_mb(self, models: List[str], quantize: bool = False, workers: int = 1,
+                        share_model: bool = False) -> float:
+        """
+        every process keeps all of its models loaded, workers sharing the model share its weights.
+        """
+        rss = INT8_RSS_MB if quantize else MODEL_RSS_MB
+        # tiers with the same model load it once
+        models = [base_model(model) for model in dict.fromkeys(models)]
+        process = PROCESS_RSS_MB + sum(rss[model] - PROCESS_RSS_MB for model in models)
+        if share_model:
+            weights = sum(WEIGHTS_MB[model] for model in models)
+            return process + (workers - 1) * max(PROCESS_RSS_MB, process - weights)
+        return workers * process
+
+    def fit_memory(self, models: List[str], workers: int, quantize: bool = False,
+                   share_model: bool = False) -> Tuple[List[str], int]:
+        """
+        the models and workers that stay within max_rss_mb, workers are taken away before models get smaller.
+        """
+        if self.max_rss_mb:
+            while workers > 1 and self.estimate_rss_mb(models, quantize, workers, share_model) > self.max_rss_mb:
+                workers -= 1
+            while self.estimate_rss_mb(models, quantize, workers, share_model) > self.max_rss_mb:
+                largest = max(models, key=lambda model: MODEL_ORDER.index(base_model(model)))
+                if base_model(largest) == MODEL_ORDER[0]:
+                    warning(f"Even *{largest}* needs about {self.estimate_rss_mb(models, quantize):.0f} MB, "
+                            f"more than MAX_RSS {self.max_rss_mb:.0f} MB")
+                    break
+                models = [smaller_model(model) if model == largest else model for model in models]
+            info(f"Estimated memory of {workers} worker(s) with {', '.join(models)}: "
+                 f"{self.estimate_rss_mb(models, quantize, workers, share_model):.0f} MB "
+                 f"of MAX_RSS {self.max_rss_mb:.0f} MB")
+        return models, workers
+
+    def fit_threads(self, workers: int, threads: int) -> Tuple[int, int]:
+        """
+        the workers and torch threads per worker within max_threads, 0 threads is the torch default of all cores.
+        """
+        if self.max_threads:
+            workers = min(workers, self.max_threads)
+            threads = min(threads or self.max_threads, max(1, self.max_threads // workers))
+            info(f"Capping inference at {workers} worker(s) with {threads} torch thread(s) each")
+        return workers, threads
+
+    def get_load(self) -> float:
+        return os.getloadavg()[0]
+
+    def wait(self, stop: Optional[Event] = None) -> float:
+        """
+        holds the next file back while the load average is above max_load, returns the seconds it waited.
+        the load average includes the threads of this run, so max_load should be above max_threads.
+        """
+        if not self.max_load:
+            return 0.0
+        load = self.get_load()
+        if load <= self.max_load:
+            return 0.0
+        info(f"Load average {load:.2f} is above {self.max_load}, pausing")
+        start = perf_counter()
+        stop = stop or Event()
+        while load > self.max_load and not stop.wait(self.interval):
+            load = self.get_load()
+        waited = perf_counter() - start
+        info(f"Load average {load:.2f}, resuming after {waited:.1f} seconds")
+        self.throttled += waited
+        self.pauses += 1
+        return waited
+
+    def report(self, files: int, seconds: float) -> None:
+        """
+        the time held back and the throughput of the run, and of the time it was allowed to run.
+        """
+        if not self.is_limited or not files:
+            return
+        running = max(seconds - self.throttled, 1e-9)
+        info(f"Throttled {self.pauses} time(s) for {self.throttled:.1f} of {seconds:.1f} seconds, "
+             f"{files * 60 / max(seconds, 1e-9):.1f} files/minute overall, "
+             f"{files * 60 / running:.1f} files/minute while running")
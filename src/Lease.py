@@ -0,0 +1,184 @@
+from hashlib import sha1
+from json import dumps, loads
+from logging import info, warning
+from os import O_CREAT, O_EXCL, O_WRONLY, close, fstat, getpid, link, makedirs, open as open_file, remove, rename, \
+    stat, utime, write
+from os.path import join, relpath
+from socket import gethostname
+from threading import Event, Lock, Thread
+from time import time
+from typing import Dict, Optional
+from uuid import uuid4
+
+DEFAULT_LEASE_SECONDS = 300
+
+
+class Leases:
+    """
+    lease files in a folder shared by every instance, i.e. on the nfs mount of the vault. an instance only
+    transcribes a recording after it created its lease, which fails while another instance holds it.
+    the holder renews its leases every third of their lifetime, leases of a crashed instance stop being renewed,
+    expire after seconds and get taken over. clocks of the hosts have to be in sync, i.e. by ntp.
+    """
+
+    def __init__(self, folder: str, root: str, seconds: float = DEFAULT_LEASE_SECONDS, owner: str = None):
+        self.folder = folder
+        # the recordings are named relative to it, the mount point may differ between hosts
+        self.root = root
+        self.seconds = seconds
+        self.owner = owner or f"{gethostname()}:{getpid()}:{uuid4().hex[:8]}"
+        # audio file => path of its lease held by this instance
+        self.held: Dict[str, str] = {}
+        self.lock = Lock()
+        self.stopped = Event()
+        self.thread: Optional[Thread] = None
+        self.claimed = 0
+        self.taken_over = 0
+        self.busy = 0
+
+    def get_path(self, audio_file: str) -> str:
+        name = relpath(audio_file, self.root)
+        return join(self.folder, f"{sha1(name.encode()).hexdigest()}.lease")
+
+    def claim(self, audio_file: str) -> bool:
+        """
+        true once this instance holds the lease of the recording, false while another instance holds it.
+        """
+        path = self.get_path(audio_file)
+        makedirs(self.folder, exist_ok=True)
+        taken_over = False
+        if not self.create(path, audio_file):
+            taken_over = self.take_over(path, audio_file)
+            if not taken_over or not self.create(path, audio_file):
+                self.busy += 1
+                return False
+        with self.lock:
+            self.held[audio_file] = path
+        self.claimed += 1
+        self.taken_over += taken_over
+        self.start_heartbeat()
+        return True
+
+    def create(self, path: str, audio_file: str) -> bool:
+        try:
+            # atomic on local file systems and nfs, exactly one instance creates the file
+            fd = open_file(path, O_CREAT | O_EXCL | O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        try:
+            write(fd, dumps({"owner": self.owner, "path": relpath(audio_file, self.root), "acquired": time(),
+                             "seconds": self.seconds}).encode())
+        finally:
+            close(fd)
+        return True
+
+    def read(self, path: str) -> dict:
+        try:
+            with open(path) as f:
+                return loads(f.read())
+        except ValueError:
+            # read right between its creation and the write of its content
+            return {}
+
+    def is_expired(self, path: str) -> bool:
+        """
+        the modification time is the last heartbeat, the lifetime is the one of the holder.
+        """
+        modified = stat(path).st_mtime
+        return time() - modified > self.read(path).get("seconds", self.seconds)
+
+    def take_over(self, path: str, audio_file: str) -> bool:
+        """
+        removes the lease if it expired, true if the recording can be claimed again.
+        """
+        try:
+            if not self.is_expired(path):
+                return False
+            owner = self.read(path).get("owner", "unknown")
+        except FileNotFoundError:
+            # released meanwhile
+            return True
+        # only one of the instances finding it expired moves it away, the others find nothing to move
+        stale_path = f"{path}.{uuid4().hex[:8]}.stale"
+        try:
+            rename(path, stale_path)
+        except FileNotFoundError:
+            return True
+        try:
+            if not self.is_expired(stale_path):
+                # the holder renewed it right before it got moved, it gets it back unless it was claimed meanwhile
+                try:
+                    link(stale_path, path)
+                except FileExistsError:
+                    pass
+                return False
+        finally:
+            remove(stale_path)
+        warning(f"Taking over the expired lease of {owner} on '{audio_file}'")
+        return True
+
+    def release(self, audio_file: str) -> None:
+        with self.lock:
+            path = self.held.pop(audio_file, None)
+        if path is None:
+            return
+        try:
+            if self.read(path).get("owner") == self.owner:
+                remove(path)
+        except FileNotFoundError:
+            pass
+
+    def renew(self) -> None:
+        with self.lock:
+            held = dict(self.held)
+        for audio_file, path in held.items():
+            try:
+                if self.refresh(path):
+                    continue
+            except FileNotFoundError:
+                pass
+            # its note still gets written only once, whoever finishes first writes it
+            warning(f"Lost the lease on '{audio_file}' to another instance")
+            with self.lock:
+                self.held.pop(audio_file, None)
+
+    def refresh(self, path: str) -> bool:
+        """
+        true if the lease at path is still the one of this instance. the owner gets checked and the modification time
+        set on the same open file, a take over in between moves that file away or replaces it, which only gets
+        refreshed if it still is this instance's and counts as lost unless it is still at path afterwards.
+        """
+        with open(path) as f:
+            try:
+                owner = loads(f.read()).get("owner")
+            except ValueError:
+                return False
+            if owner != self.owner:
+                return False
+            utime(f.fileno())
+            return stat(path).st_ino == fstat(f.fileno()).st_ino
+
+    def start_heartbeat(self) -> None:
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = Thread(target=self.heartbeat, name="leases", daemon=True)
+        self.thread.start()
+
+    def heartbeat(self) -> None:
+        while not self.stopped.wait(self.seconds / 3):
+            self.renew()
+
+    def close(self) -> None:
+        """
+        stops renewing and releases every lease still held.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for audio_file in list(self.held):
+            self.release(audio_file)
+        if self.claimed or self.busy:
+            info(f"Leases: claimed {self.claimed} file(s), took over {self.taken_over} expired lease(s), "
+                 f"skipped {self.busy} file(s) leased by other instances")
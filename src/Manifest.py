@@ -0,0 +1,67 @@
+from logging import info
+from time import time
+from typing import Dict, List, NamedTuple
+from src.SqliteStore import SqliteStore
+
+STATUS_PENDING = "pending"
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+# the voice activity pre-pass found no speech, no note was written
+STATUS_SILENT = "silent"
+
+
+class ManifestEntry(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    out_file: str
+    status: str
+
+    def is_unchanged(self, size: int, mtime: float) -> bool:
+        return self.size == size and self.mtime == mtime
+
+
+class Manifest(SqliteStore):
+    """
+    persisted state of every media file seen so far, so a run only has to look at new or changed files
+    and a run that got killed mid-batch picks up the files it did not finish.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        out_file TEXT NOT NULL,
+        status TEXT NOT NULL,
+        error TEXT NOT NULL DEFAULT '',
+        updated REAL NOT NULL
+    )
+    """
+
+    def load(self) -> Dict[str, ManifestEntry]:
+        rows = self.connect().execute("SELECT path, size, mtime, out_file, status FROM files")
+        entries = {row[0]: ManifestEntry(*row) for row in rows}
+        resumed = sum(1 for entry in entries.values() if entry.status == STATUS_IN_PROGRESS)
+        if resumed:
+            info(f"Resuming {resumed} file(s) an earlier run did not finish")
+        return entries
+
+    def update(self, entries: List[ManifestEntry]) -> None:
+        connection = self.connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime, out_file, status, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                [(*entry, time()) for entry in entries]
+            )
+
+    def set_status(self, path: str, status: str, error: str = "") -> None:
+        connection = self.connect()
+        with connection:
+            connection.execute(
+                "UPDATE files SET status = ?, error = ?, updated = ? WHERE path = ?", (status, error, time(), path)
+            )
+
+    def get_status_counts(self) -> Dict[str, int]:
+        rows = self.connect().execute("SELECT status, COUNT(*) FROM files GROUP BY status")
+        return dict(rows.fetchall())
@@ -0,0 +1,193 @@
+from contextlib import contextmanager
+from json import dumps
+from logging import info
+from os import makedirs, replace
+from os.path import dirname, abspath
+from threading import Lock
+from time import perf_counter, time
+from typing import Dict, Iterator, List
+
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:  # windows
+    getrusage = None
+
+STAGES = ["discovery", "model_load", "decode", "vad", "inference", "format", "write"]
+
+
+def peak_rss_mb() -> float:
+    if getrusage is None:
+        return 0.0
+    # linux reports ru_maxrss in KiB
+    return getrusage(RUSAGE_SELF).ru_maxrss / 1024
+
+
+def process_memory_mb(pid="self") -> Dict[str, float]:
+    """
+    rss and pss of a process from /proc/<pid>/smaps_rollup. pss splits every shared page between the processes
+    sharing it, so the pss of all workers adds up to the memory they really use. empty where /proc is missing.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return {}
+    memory = {}
+    for line in lines:
+        name, _, value = line.partition(":")
+        if name in ["Rss", "Pss"]:
+            memory[f"{name.lower()}_mb"] = int(value.split()[0]) / 1024
+    return memory
+
+
+def percentile(values: List[float], share: float) -> float:
+    """
+    linear interpolation between the closest ranks, share 0.95 is the p95.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * share
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Metrics:
+    """
+    collects the durations of every stage of a run and one record per transcribed file.
+    files get appended to a json lines file as they finish, the prometheus textfile is written once at the end.
+    """
+
+    def __init__(self, path: str = "", prometheus_path: str = "", decoding: str = ""):
+        self.path = path
+        self.prometheus_path = prometheus_path
+        # name of the decoding preset of the run, see DecodingSettings
+        self.decoding = decoding
+        self.stages: Dict[str, List[float]] = {}
+        self.files: Dict[str, int] = {}
+        self.audio_seconds = 0.0
+        # seconds of silence the voice activity pre-pass kept from inference
+        self.silence_seconds = 0.0
+        # decoding runs whisper repeated at a higher temperature
+        self.fallbacks = 0
+        self.lock = Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            self.stages.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, perf_counter() - start)
+
+    def add_file(self, audio_file: str, stats: dict, status: str = "done") -> dict:
+        """
+        records the stage timings a processor collected for the file, see AudioTextProcessor.pop_stats.
+        """
+        stats = dict(stats)
+        for stage in STAGES:
+            if stage in stats:
+                self.add(stage, stats[stage])
+        audio_seconds = stats.get("audio_seconds", 0.0)
+        inference = stats.get("inference", 0.0)
+        record = {
+            "time": time(),
+            "file": audio_file,
+            "status": status,
+            **{stage: round(stats[stage], 6) for stage in STAGES if stage in stats},
+            "audio_seconds": round(audio_seconds, 3),
+            "silence_removed": round(stats.get("silence_removed", 0.0), 3),
+            "real_time_factor": round(inference / audio_seconds, 4) if audio_seconds else None,
+            "words": stats.get("words", 0),
+            "fallbacks": stats.get("fallbacks", 0),
+            "words_per_second": round(stats.get("words", 0) / inference, 2) if inference else None,
+            "peak_rss_mb": round(stats.get("peak_rss_mb") or peak_rss_mb(), 1),
+        }
+        if "pss_mb" in stats:
+            record["pss_mb"] = round(stats["pss_mb"], 1)
+        if self.decoding:
+            record["decoding"] = self.decoding
+        with self.lock:
+            self.files[status] = self.files.get(status, 0) + 1
+            self.audio_seconds += audio_seconds
+            self.silence_seconds += stats.get("silence_removed", 0.0)
+            self.fallbacks += stats.get("fallbacks", 0)
+            if self.path:
+                makedirs(dirname(abspath(self.path)), exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(dumps(record) + "\n")
+        return record
+
+    def summary(self) -> Dict[str, dict]:
+        with self.lock:
+            return {
+                stage: {
+                    "count": len(values),
+                    "total": sum(values),
+                    "p50": percentile(values, 0.5),
+                    "p95": percentile(values, 0.95),
+                }
+                for stage, values in self.stages.items()
+            }
+
+    def finish(self) -> None:
+        """
+        logs the p50/p95 of every stage and writes the prometheus textfile.
+        """
+        summary = self.summary()
+        for stage in sorted(summary, key=lambda stage: STAGES.index(stage) if stage in STAGES else len(STAGES)):
+            values = summary[stage]
+            info(f"{stage:>10}: {values['count']:5d}x, total {values['total']:9.3f} s, "
+                 f"p50 {values['p50']:8.3f} s, p95 {values['p95']:8.3f} s")
+        if self.silence_seconds:
+            info(f"Voice activity pre-pass removed {self.silence_seconds:.1f} of {self.audio_seconds:.1f} seconds "
+                 f"of audio, {self.files.get('silent', 0)} recording(s) were silent")
+        if self.decoding:
+            files = sum(self.files.values())
+            info(f"Decoding preset *{self.decoding}* fell back to a higher temperature {self.fallbacks} time(s) "
+                 f"in {files} file(s)")
+        if self.prometheus_path:
+            self.write_prometheus(summary)
+
+    def write_prometheus(self, summary: Dict[str, dict]) -> None:
+        lines = [
+            "# HELP osttc_stage_seconds duration of the stages of the last run",
+            "# TYPE osttc_stage_seconds summary",
+        ]
+        for stage, values in summary.items():
+            lines += [
+                f'osttc_stage_seconds{{stage="{stage}",quantile="0.5"}} {values["p50"]}',
+                f'osttc_stage_seconds{{stage="{stage}",quantile="0.95"}} {values["p95"]}',
+                f'osttc_stage_seconds_sum{{stage="{stage}"}} {values["total"]}',
+                f'osttc_stage_seconds_count{{stage="{stage}"}} {values["count"]}',
+            ]
+        lines += ["# HELP osttc_files files handled in the last run", "# TYPE osttc_files gauge"]
+        lines += [f'osttc_files{{status="{status}"}} {count}' for status, count in self.files.items()]
+        lines += [
+            "# HELP osttc_audio_seconds seconds of audio transcribed in the last run",
+            "# TYPE osttc_audio_seconds gauge",
+            f"osttc_audio_seconds {self.audio_seconds}",
+            "# HELP osttc_silence_removed_seconds seconds of silence removed before inference in the last run",
+            "# TYPE osttc_silence_removed_seconds gauge",
+            f"osttc_silence_removed_seconds {self.silence_seconds}",
+            "# HELP osttc_decoding_fallbacks decoding runs repeated at a higher temperature in the last run",
+            "# TYPE osttc_decoding_fallbacks gauge",
+            f'osttc_decoding_fallbacks{{decoding="{self.decoding}"}} {self.fallbacks}',
+            "# HELP osttc_peak_rss_bytes peak resident memory of the main process",
+            "# TYPE osttc_peak_rss_bytes gauge",
+            f"osttc_peak_rss_bytes {int(peak_rss_mb() * 1024 * 1024)}",
+            "# HELP osttc_last_run_timestamp_seconds end of the last run",
+            "# TYPE osttc_last_run_timestamp_seconds gauge",
+            f"osttc_last_run_timestamp_seconds {time()}",
+        ]
+        # the node exporter may read the file any time, so it gets replaced in one step
+        makedirs(dirname(abspath(self.prometheus_path)), exist_ok=True)
+        temp_path = f"{self.prometheus_path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        replace(temp_path, self.prometheus_path)
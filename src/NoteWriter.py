@@ -0,0 +1,81 @@
+from os import link, remove, replace
+from os.path import exists
+from shutil import copyfileobj
+from time import perf_counter
+from uuid import uuid4
+
+
+class NoteWriter:
+    """
+    writes a note while its transcript comes in. the body gets appended to {out_file}.part, the note only
+    appears under its name once it is complete, with the properties header in front of the body.
+    a note that failed halfway leaves nothing behind.
+    an exclusive writer never replaces an existing note, close() raises FileExistsError instead. its part files
+    have unique names, so instances sharing a folder can not write into each other's.
+    """
+
+    def __init__(self, out_file: str, exclusive: bool = False):
+        self.out_file = out_file
+        self.exclusive = exclusive
+        suffix = f".{uuid4().hex[:8]}" if exclusive else ""
+        self.part_file = f"{out_file}{suffix}.part"
+        self.temp_file = f"{out_file}{suffix}.tmp"
+        self.header = ""
+        # seconds spent writing, reported as the write stage
+        self.seconds = 0.0
+        self.file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self) -> None:
+        self.file = open(self.part_file, "w")
+
+    def write(self, text: str) -> None:
+        if not text:
+            return
+        start = perf_counter()
+        self.file.write(text)
+        # flushed, so the part written so far can be followed on disk
+        self.file.flush()
+        self.seconds += perf_counter() - start
+
+    def close(self) -> None:
+        start = perf_counter()
+        self.file.close()
+        try:
+            if not self.header:
+                self.publish(self.part_file)
+            else:
+                with open(self.temp_file, "w") as f, open(self.part_file) as body:
+                    f.write(self.header)
+                    copyfileobj(body, f)
+                self.publish(self.temp_file)
+        finally:
+            self.remove_files()
+        self.seconds += perf_counter() - start
+
+    def publish(self, path: str) -> None:
+        if self.exclusive:
+            # a hard link fails if the note exists, unlike a rename that replaces it
+            link(path, self.out_file)
+            remove(path)
+        else:
+            replace(path, self.out_file)
+
+    def abort(self) -> None:
+        if self.file:
+            self.file.close()
+        self.remove_files()
+
+    def remove_files(self) -> None:
+        for path in [self.part_file, self.temp_file]:
+            if exists(path):
+                remove(path)
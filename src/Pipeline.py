@@ -0,0 +1,98 @@
+from queue import Queue, Full
+from threading import Event, Thread
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+_DONE = object()
+
+
+def prefetch(items: Iterable, function: Callable, depth: int) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+    """
+    runs function(item) in a background thread ahead of the consumer and yields (item, result, exception)
+    in order. at most *depth* results wait in memory, plus the one being produced.
+    """
+    queue = Queue(maxsize=max(1, depth))
+    stop = Event()
+
+    def put(entry) -> None:
+        while not stop.is_set():
+            try:
+                queue.put(entry, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                try:
+                    put((item, function(item), None))
+                except Exception as e:
+                    put((item, None, e))
+        finally:
+            put(_DONE)
+
+    thread = Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            entry = queue.get()
+            if entry is _DONE:
+                return
+            yield entry
+    finally:
+        stop.set()
+        thread.join()
+
+
+class BackgroundWorker:
+    """
+    runs function(item) for every put item in a background thread, with at most *depth* items waiting.
+    on_error(item, exception) gets called for every item the function failed on, the first exception is raised
+    again by the next put, or on close unless the block already ends with an exception of its own.
+    """
+
+    def __init__(self, function: Callable, depth: int, on_error: Callable[[Any, Exception], None] = None):
+        self.function = function
+        self.on_error = on_error
+        self.queue = Queue(maxsize=max(1, depth))
+        self.exception: Optional[Exception] = None
+        self.thread = Thread(target=self.consume, name="background-worker", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        # the exception in flight came first, the one of the worker must not replace it
+        self.close(raise_exception=exc_type is None)
+
+    def consume(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                return
+            try:
+                self.function(item)
+            except Exception as e:
+                self.exception = self.exception or e
+                if self.on_error:
+                    self.on_error(item, e)
+
+    def put(self, item) -> None:
+        # nothing more gets queued once the function failed, i.e. with a full disk
+        self.raise_exception()
+        self.queue.put(item)
+
+    def raise_exception(self) -> None:
+        if self.exception:
+            exception, self.exception = self.exception, None
+            raise exception
+
+    def close(self, raise_exception: bool = True) -> None:
+        if self.thread.is_alive():
+            self.queue.put(_DONE)
+            self.thread.join()
+        if raise_exception:
+            self.raise_exception()
@@ -0,0 +1,152 @@
+from concurrent.futures import ThreadPoolExecutor
+from logging import info
+from os import stat
+from os.path import splitext
+from shutil import which
+from subprocess import run, DEVNULL
+from threading import Lock
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import wave
+
+POLICIES = ["fifo", "longest", "newest", "shortest"]
+# rough bitrates of voice recordings, used when neither the header nor ffprobe tell the duration
+BYTES_PER_SECOND = {".wav": 32000, ".mp3": 16000, ".m4a": 8000, ".webm": 4000}
+DEFAULT_BYTES_PER_SECOND = 8000
+PROBE_THREADS = 8
+
+
+def probe_duration(audio_file: str) -> float:
+    """
+    the duration in seconds without decoding the audio: wav headers get read directly, other formats get asked
+    from ffprobe, which only reads the container. without ffprobe the duration is estimated from the file size.
+    """
+    extension = splitext(audio_file)[1].lower()
+    if extension == ".wav":
+        try:
+            with wave.open(audio_file, "rb") as f:
+                return f.getnframes() / f.getframerate()
+        except (wave.Error, EOFError, OSError):
+            pass
+    duration = probe_ffprobe(audio_file)
+    if duration is not None:
+        return duration
+    return stat(audio_file).st_size / BYTES_PER_SECOND.get(extension, DEFAULT_BYTES_PER_SECOND)
+
+
+def probe_ffprobe(audio_file: str) -> Optional[float]:
+    if not which("ffprobe"):
+        return None
+    result = run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", audio_file],
+        capture_output=True, text=True, stdin=DEVNULL,
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+class Scheduler:
+    """
+    orders the pending jobs by policy and estimates the remaining time from the real time factor measured so far:
+    - fifo keeps the order the files were found in
+    - longest starts with the longest recordings, so no long one is left over when the other workers are idle
+    - newest starts with the most recent recordings, so today's notes show up first
+    - shortest starts with the shortest recordings, to get as many notes as possible done early
+    """
+
+    def __init__(self, policy: str = "fifo", probe: Callable[[str], float] = probe_duration):
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid schedule. Valid options are: {', '.join(POLICIES)}")
+        self.policy = policy
+        self.probe = probe
+        self.durations: Dict[str, float] = {}
+        self.remaining: Dict[str, float] = {}
+        # files done before their duration was known, see stream
+        self.finished = set()
+        self.audio_seconds = 0.0
+        self.inference_seconds = 0.0
+        self.lock = Lock()
+
+    def order(self, jobs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        if not jobs:
+            return jobs
+        # ffprobe runs in its own process, so probing in threads overlaps the waiting
+        with ThreadPoolExecutor(max_workers=min(PROBE_THREADS, len(jobs))) as executor:
+            durations = list(executor.map(self.probe, [audio_file for audio_file, _ in jobs]))
+        self.durations = {audio_file: duration for (audio_file, _), duration in zip(jobs, durations)}
+        self.remaining = dict(self.durations)
+        if self.policy == "longest":
+            jobs = sorted(jobs, key=lambda job: self.durations[job[0]], reverse=True)
+        elif self.policy == "shortest":
+            jobs = sorted(jobs, key=lambda job: self.durations[job[0]])
+        elif self.policy == "newest":
+            jobs = sorted(jobs, key=lambda job: stat(job[0]).st_mtime, reverse=True)
+        info(f"Scheduled {len(jobs)} file(s) with {sum(durations) / 60:.1f} minutes of audio, policy *{self.policy}*")
+        return list(jobs)
+
+    def stream(self, jobs: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        """
+        fifo without waiting for all jobs: every job is passed on as it is found and gets probed in the background,
+        the ETA covers the jobs probed so far.
+        """
+        with self.lock:
+            self.durations = {}
+            self.remaining = {}
+            self.finished = set()
+        executor = ThreadPoolExecutor(max_workers=PROBE_THREADS, thread_name_prefix="probe")
+        completed = False
+        try:
+            for audio_file, out_file in jobs:
+                executor.submit(self.add_duration, audio_file)
+                yield audio_file, out_file
+            completed = True
+        finally:
+            # a run that stopped early does not wait for the durations of the files it won't transcribe
+            executor.shutdown(wait=completed, cancel_futures=not completed)
+        info(f"Scheduled {len(self.durations)} file(s) with {sum(self.durations.values()) / 60:.1f} minutes of audio, "
+             f"policy *{self.policy}*")
+
+    def add_duration(self, audio_file: str) -> None:
+        try:
+            duration = self.probe(audio_file)
+        except OSError:
+            # removed meanwhile, the transcription reports it
+            return
+        with self.lock:
+            self.durations[audio_file] = duration
+            if audio_file not in self.finished:
+                self.remaining[audio_file] = duration
+
+    def done(self, audio_file: str, stats: dict) -> None:
+        """
+        takes the file off the remaining audio and learns the real time factor from its inference time.
+        """
+        with self.lock:
+            self.finished.add(audio_file)
+            duration = self.remaining.pop(audio_file, None)
+            audio_seconds = stats.get("audio_seconds") or duration
+            if stats.get("inference") and audio_seconds:
+                self.audio_seconds += audio_seconds
+                self.inference_seconds += stats["inference"]
+
+    @property
+    def real_time_factor(self) -> Optional[float]:
+        return self.inference_seconds / self.audio_seconds if self.audio_seconds else None
+
+    def eta(self, workers: int = 1) -> Optional[float]:
+        """
+        seconds until the remaining files are transcribed, None until the first file was measured.
+        """
+        real_time_factor = self.real_time_factor
+        if real_time_factor is None:
+            return None
+        with self.lock:
+            remaining = sum(self.remaining.values())
+        return remaining * real_time_factor / max(1, workers)
+
+    def report(self, workers: int = 1) -> None:
+        eta = self.eta(workers)
+        if eta is not None and self.remaining:
+            info(f"{len(self.remaining)} file(s) left, real time factor {self.real_time_factor:.2f}, "
+                 f"ETA {eta / 60:.1f} minutes")
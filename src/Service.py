@@ -0,0 +1,302 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from logging import info, error
+from os import remove
+from os.path import basename, dirname, exists, join, realpath, sep, splitext
+from queue import Queue, Full
+from socketserver import ThreadingMixIn, UnixStreamServer
+from threading import Lock, Thread
+from time import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from uuid import uuid4
+from src.Manifest import STATUS_IN_PROGRESS, STATUS_SILENT
+from src.VoiceActivity import SilentRecording
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_SILENT = "silent"
+# finished jobs kept for status requests, the oldest ones are forgotten first
+MAX_FINISHED_JOBS = 1000
+MAX_UPLOAD_BYTES = 1024 ** 3
+UPLOAD_BLOCK = 1024 * 1024
+# seconds a client rejected with a full queue is asked to wait
+RETRY_AFTER = 10
+
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    def __init__(self, audio_file: str, out_file: str):
+        self.id = uuid4().hex
+        self.audio_file = audio_file
+        self.out_file = out_file
+        self.status = JOB_QUEUED
+        self.error = ""
+        self.created = time()
+        self.finished: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "status": self.status, "audio_file": self.audio_file, "out_file": self.out_file,
+            "error": self.error, "created": self.created, "finished": self.finished,
+        }
+
+
+class TranscriptionService:
+    """
+    queues transcription jobs for a converter that keeps its model loaded. at most queue_size jobs wait,
+    further submissions are rejected until there is room again. concurrency jobs run at the same time,
+    with more than one the jobs are transcribed by the worker processes of the pool.
+    """
+
+    def __init__(self, converter, queue_size: int = 16, concurrency: int = 1, pool=None):
+        self.converter = converter
+        self.queue = Queue(maxsize=max(1, queue_size))
+        self.concurrency = max(1, concurrency)
+        self.pool = pool
+        self.jobs: Dict[str, Job] = {}
+        self.lock = Lock()
+        self.threads: List[Thread] = []
+
+    def start(self) -> None:
+        for index in range(self.concurrency):
+            thread = Thread(target=self.work, name=f"service-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self) -> None:
+        """
+        lets the running jobs finish, queued jobs are dropped.
+        """
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            if job is not None:
+                self.finish(job, JOB_FAILED, "service stopped")
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def submit(self, audio_file: str) -> Job:
+        """
+        queues a recording inside the input folder, raises ServiceError 429 while the queue is full.
+        """
+        audio_file = self.check_path(audio_file)
+        name, _ = splitext(basename(audio_file))
+        job = Job(audio_file, self.converter.get_markdown_file_name(name, dirname(audio_file)))
+        with self.lock:
+            if any(other.audio_file == audio_file and other.finished is None for other in self.jobs.values()):
+                raise ServiceError(409, f"'{audio_file}' is already queued")
+            try:
+                self.queue.put_nowait(job)
+            except Full:
+                raise ServiceError(429, f"queue is full ({self.queue.maxsize} jobs)")
+            self.jobs[job.id] = job
+        info(f"Queued job {job.id}: '{audio_file}'")
+        return job
+
+    def upload(self, name: str, stream, length: int) -> Job:
+        """
+        stores an uploaded recording in the input folder and queues it, its note ends up next to it.
+        """
+        name = basename(name or "")
+        if splitext(name)[1] not in self.converter.media_files:
+            raise ServiceError(400, f"name needs one of the extensions {', '.join(self.converter.media_files)}")
+        if length > MAX_UPLOAD_BYTES:
+            raise ServiceError(413, f"uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+        if self.queue.full():
+            raise ServiceError(429, f"queue is full ({self.queue.maxsize} jobs)")
+        audio_file = join(self.converter.input_folder, name)
+        if exists(audio_file):
+            raise ServiceError(409, f"'{name}' already exists")
+        with open(audio_file, "wb") as f:
+            remaining = length
+            while remaining > 0:
+                block = stream.read(min(UPLOAD_BLOCK, remaining))
+                if not block:
+                    break
+                f.write(block)
+                remaining -= len(block)
+        try:
+            if remaining > 0:
+                raise ServiceError(400, "upload ended early")
+            return self.submit(audio_file)
+        except ServiceError:
+            remove(audio_file)
+            raise
+
+    def check_path(self, audio_file: str) -> str:
+        folder = realpath(self.converter.input_folder)
+        audio_file = realpath(join(folder, audio_file))
+        if not audio_file.startswith(folder + sep):
+            raise ServiceError(400, "only recordings inside the input folder can be transcribed")
+        if splitext(audio_file)[1] not in self.converter.media_files:
+            raise ServiceError(400, f"path needs one of the extensions {', '.join(self.converter.media_files)}")
+        if not exists(audio_file):
+            raise ServiceError(404, f"'{audio_file}' does not exist")
+        return audio_file
+
+    def get(self, job_id: str) -> Job:
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise ServiceError(404, f"unknown job {job_id}")
+        return job
+
+    def result(self, job_id: str) -> str:
+        job = self.get(job_id)
+        if job.status != JOB_DONE:
+            raise ServiceError(409, f"job {job_id} is {job.status}")
+        with open(job.out_file) as f:
+            return f.read()
+
+    def health(self) -> dict:
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job.status == JOB_RUNNING)
+        return {"queued": self.queue.qsize(), "running": running, "queue_size": self.queue.maxsize,
+                "concurrency": self.concurrency}
+
+    def work(self) -> None:
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            job.status = JOB_RUNNING
+            try:
+                status = self.run(job)
+            except Exception as e:
+                error(f"Job {job.id} failed: {e}")
+                self.converter.fail_file(job.audio_file, str(e))
+                self.finish(job, JOB_FAILED, str(e))
+                continue
+            self.finish(job, status)
+
+    def run(self, job: Job) -> str:
+        info(f"Running job {job.id}: '{job.audio_file}'")
+        self.converter.set_status(job.audio_file, STATUS_IN_PROGRESS)
+        if self.pool is None:
+            return JOB_SILENT if self.converter.convert_file(job.audio_file, job.out_file) == STATUS_SILENT else JOB_DONE
+        try:
+            content, stats = self.pool.submit(job.audio_file).result()
+        except SilentRecording as e:
+            self.converter.skip_silent(job.audio_file, e, {})
+            return JOB_SILENT
+        self.converter.finish_file(job.audio_file, job.out_file, content, stats)
+        return JOB_DONE
+
+    def finish(self, job: Job, status: str, message: str = "") -> None:
+        job.status = status
+        job.error = message
+        job.finished = time()
+        with self.lock:
+            finished = [other for other in self.jobs.values() if other.finished is not None]
+            for other in sorted(finished, key=lambda other: other.finished)[:-MAX_FINISHED_JOBS]:
+                del self.jobs[other.id]
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    POST /jobs                 {"path": "relative/or/absolute.m4a"} queues a recording of the input folder
+    POST /jobs?name=memo.m4a   the body is a recording, stored in the input folder and queued
+    GET  /jobs/<id>            status of a job
+    GET  /jobs/<id>/result     the note of a finished job
+    GET  /health               queue and worker state
+    """
+    server_version = "ObsidianSpeechToText"
+
+    def do_GET(self) -> None:
+        self.handle_request(self.get_response)
+
+    def do_POST(self) -> None:
+        self.handle_request(self.post_response)
+
+    def handle_request(self, respond) -> None:
+        try:
+            status, body = respond(urlparse(self.path))
+        except ServiceError as e:
+            headers = {"Retry-After": str(RETRY_AFTER)} if e.status == 429 else {}
+            self.send(e.status, {"error": str(e)}, headers)
+            return
+        except Exception as e:
+            error(e)
+            self.send(500, {"error": str(e)})
+            return
+        self.send(status, body)
+
+    def get_response(self, url) -> tuple:
+        service: TranscriptionService = self.server.service
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["health"]:
+            return 200, service.health()
+        if len(parts) == 2 and parts[0] == "jobs":
+            return 200, service.get(parts[1]).to_dict()
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+            return 200, service.result(parts[1])
+        raise ServiceError(404, f"unknown path {url.path}")
+
+    def post_response(self, url) -> tuple:
+        service: TranscriptionService = self.server.service
+        if url.path.rstrip("/") != "/jobs":
+            raise ServiceError(404, f"unknown path {url.path}")
+        length = int(self.headers.get("Content-Length", 0))
+        name = parse_qs(url.query).get("name", [""])[0]
+        if name:
+            return 202, service.upload(name, self.rfile, length).to_dict()
+        try:
+            path = loads(self.rfile.read(length) or b"{}").get("path")
+        except (ValueError, AttributeError):
+            raise ServiceError(400, "expected a json object with a path")
+        if not path:
+            raise ServiceError(400, "expected a json object with a path")
+        return 202, service.submit(path).to_dict()
+
+    def send(self, status: int, body, headers: dict = None) -> None:
+        if isinstance(body, str):
+            data, content_type = body.encode(), "text/markdown; charset=utf-8"
+        else:
+            data, content_type = dumps(body).encode(), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # clients of a unix socket have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        info(f"{self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        # a socket file left behind by a killed service
+        if exists(self.server_address):
+            remove(self.server_address)
+        super().server_bind()
+
+
+def create_server(address: str, service: TranscriptionService):
+    """
+    an http server for the service on host:port, or on a unix socket for addresses like unix:/run/osttc.sock.
+    """
+    if address.startswith("unix:"):
+        server = UnixHTTPServer(address[len("unix:"):], ServiceHandler)
+    else:
+        host, _, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), ServiceHandler)
+    server.service = service
+    return server
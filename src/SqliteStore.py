@@ -0,0 +1,42 @@
+from os import getpid, makedirs
+from os.path import dirname, abspath
+from sqlite3 import connect, Connection
+from threading import local
+from typing import Optional
+
+
+class SqliteStore:
+    """
+    lazily connected sqlite file, every process (i.e. pool workers) and thread opens its own connection.
+    """
+    SCHEMA = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = local()
+
+    def __getstate__(self) -> dict:
+        # connections can't be shared with worker processes
+        return {"path": self.path}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"])
+
+    @property
+    def connection(self) -> Optional[Connection]:
+        if getattr(self.local, "pid", None) != getpid():
+            return None
+        return getattr(self.local, "connection", None)
+
+    def connect(self) -> Connection:
+        if self.connection is None:
+            makedirs(dirname(abspath(self.path)), exist_ok=True)
+            self.local.connection = connect(self.path, timeout=30)
+            self.local.connection.execute(self.SCHEMA)
+            self.local.pid = getpid()
+        return self.local.connection
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+        self.local.connection = None
@@ -0,0 +1,97 @@
+from src.ActionKeywords import ActionKeywords, sub_tracked
+from src.abstracts.AudioTextProcessor import TAGS_PATTERN, HASHTAG_PATTERN
+from logging import info
+from typing import List, Optional, Tuple
+
+# characters held back behind a cut, so no action keyword sequence can still reach across it
+MARGIN = 256
+
+
+class StreamingFormatter:
+    """
+    formats a transcript segment by segment into the same note AudioTextProcessor.format_text gives for the
+    whole text. text is held back until a segment boundary is found that no action keyword match, hashtag or
+    tags block reaches across. the tags and the audio link found on the way go into the properties header,
+    which is only complete at the end.
+    """
+
+    def __init__(self, processor, words, audio_file_name: str, margin: int = MARGIN):
+        self.processor = processor
+        self.words = words if not words or isinstance(words, ActionKeywords) else ActionKeywords(words)
+        self.audio_file_name = audio_file_name
+        self.margin = margin
+        self.pending = ""
+        # positions in pending where one segment ended and the next one started
+        self.boundaries: List[int] = []
+        self.tags = ""
+        self.tags_block: Optional[str] = None
+        self.link_audio = ""
+
+    def feed(self, text: str) -> str:
+        """
+        adds the text of the next segment and returns the part of the note body that is final by now.
+        """
+        if not self.pending:
+            # format_text gets the stripped transcript
+            text = text.lstrip()
+        if not text:
+            return ""
+        if self.pending:
+            self.boundaries.append(len(self.pending))
+        self.pending += text
+        cuts = [
+            boundary for boundary in self.boundaries
+            if self.pending[boundary].isspace() and not self.pending[boundary - 1].isspace()
+            and len(self.pending) - boundary >= self.margin
+        ]
+        if not cuts:
+            return ""
+        formatted, positions = self.format_tracked(self.pending, cuts)
+        for cut, position in sorted(zip(cuts, positions), reverse=True):
+            if position is not None and self.is_closed(formatted[:position]):
+                self.pending = self.pending[cut:]
+                self.boundaries = [boundary - cut for boundary in self.boundaries if boundary > cut]
+                return self.finish_body(formatted[:position])
+        return ""
+
+    def finish(self) -> Tuple[str, str]:
+        """
+        returns the properties header and the rest of the note body.
+        """
+        text = self.pending.rstrip()
+        self.pending = ""
+        self.boundaries = []
+        if not self.words:
+            return "", text
+        body = self.finish_body(self.format_tracked(text, [])[0])
+        properties = [self.tags, self.processor.get_audiofile_keyword_for_properties(self.link_audio)]
+        info(properties)
+        return self.processor.create_properties_header(properties, self.link_audio), body
+
+    def format_tracked(self, text: str, cuts: List[int]) -> Tuple[str, List[Optional[int]]]:
+        if not self.words:
+            return text, list(cuts)
+        text, positions = self.words.apply_tracked(text, cuts)
+        return sub_tracked(HASHTAG_PATTERN, self.processor.format_hashtag, text, positions)
+
+    @staticmethod
+    def is_closed(text: str) -> bool:
+        start = text.rfind("#TAGS---")
+        return start < 0 or text.find("---TAGS#", start + len("#TAGS---")) >= 0
+
+    def finish_body(self, text: str) -> str:
+        """
+        the steps of format_text after the keywords and hashtags, remembering what the header needs.
+        """
+        if not self.words:
+            return text
+        if self.tags_block is None:
+            match = TAGS_PATTERN.search(text)
+            if match:
+                self.tags_block = match.group(0)
+                self.tags = self.processor.get_tags_str_from_match(match.group(1))
+        if self.tags_block is not None:
+            text = text.replace(self.tags_block, "")
+        if not self.link_audio:
+            self.link_audio = self.processor.has_audiofile_keyword(text, self.audio_file_name)
+        return self.processor.remove_audiofile_keyword(text)
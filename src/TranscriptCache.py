@@ -0,0 +1,56 @@
+from hashlib import sha256
+from json import dumps, loads
+from logging import info
+from time import time
+from typing import Optional
+from src.SqliteStore import SqliteStore
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    digest = sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TranscriptCache(SqliteStore):
+    """
+    sqlite store of raw transcripts, keyed by the audio content hash and the options that influence
+    the transcription (model, language, decoding settings). re-formatting a note never needs the model again.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS transcripts (
+        key TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        options TEXT NOT NULL,
+        path TEXT NOT NULL,
+        text TEXT NOT NULL,
+        segments TEXT NOT NULL,
+        created REAL NOT NULL
+    )
+    """
+
+    @staticmethod
+    def get_key(content_hash: str, options: dict) -> str:
+        return sha256(f"{content_hash}:{dumps(options, sort_keys=True)}".encode()).hexdigest()
+
+    def get(self, audio_file: str, options: dict, content_hash: str = None) -> Optional[dict]:
+        key = self.get_key(content_hash or file_hash(audio_file), options)
+        row = self.connect().execute("SELECT text, segments FROM transcripts WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        info(f"Found cached transcript for '{audio_file}'")
+        return {"text": row[0], "segments": loads(row[1])}
+
+    def put(self, audio_file: str, options: dict, transcript: dict, content_hash: str = None) -> None:
+        content_hash = content_hash or file_hash(audio_file)
+        connection = self.connect()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.get_key(content_hash, options), content_hash, dumps(options, sort_keys=True), audio_file,
+                    transcript["text"], dumps(transcript.get("segments", [])), time()
+                )
+            )
@@ -0,0 +1,108 @@
+from src.Chunker import frame_energy, FRAME_SECONDS, SAMPLE_RATE
+from typing import List, Tuple
+import numpy as np
+
+# silence kept around every stretch of speech, so quiet onsets and word endings are not cut off
+PADDING_SECONDS = 0.2
+# recordings with less speech than this count as silent
+MIN_SPEECH_SECONDS = 0.3
+
+
+class SilentRecording(Exception):
+    """
+    raised instead of transcribing a recording the voice activity pre-pass found no speech in.
+    """
+
+    def __init__(self, audio_file: str, seconds: float):
+        super().__init__(audio_file, seconds)
+        self.audio_file = audio_file
+        self.seconds = seconds
+
+    def __str__(self) -> str:
+        return f"'{self.audio_file}' is silent ({self.seconds:.1f} seconds)"
+
+
+class TimestampMap:
+    """
+    maps positions in the trimmed audio back to the source recording.
+    every kept stretch starts at trimmed_starts[i] in the trimmed and at source_starts[i] in the source audio.
+    """
+
+    def __init__(self, trimmed_starts: List[float], source_starts: List[float]):
+        self.trimmed_starts = np.asarray(trimmed_starts, dtype=np.float64)
+        self.source_starts = np.asarray(source_starts, dtype=np.float64)
+
+    def to_source(self, seconds: float, is_end: bool = False) -> float:
+        # an end at the border of two stretches belongs to the one before
+        index = int(np.searchsorted(self.trimmed_starts, seconds, side="left" if is_end else "right")) - 1
+        index = min(max(index, 0), len(self.trimmed_starts) - 1)
+        return float(self.source_starts[index] + seconds - self.trimmed_starts[index])
+
+    def restore(self, transcript: dict) -> dict:
+        """
+        the transcript with its segment times in seconds of the source recording.
+        """
+        segments = [
+            {**segment, "start": self.to_source(segment["start"]), "end": self.to_source(segment["end"], True)}
+            for segment in transcript.get("segments", [])
+        ]
+        return {**transcript, "segments": segments}
+
+
+def find_speech(audio: np.ndarray, threshold_db: float, min_silence: float,
+                sample_rate: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """
+    the (start, end) sample ranges to keep: every stretch of frames quieter than threshold_db (dBFS)
+    lasting longer than min_silence seconds is dropped, apart from a little padding at its edges.
+    returns no ranges when there is less than MIN_SPEECH_SECONDS of speech.
+    """
+    frame = int(FRAME_SECONDS * sample_rate)
+    if len(audio) < frame:
+        return []
+    energy = frame_energy(audio, frame)
+    voiced = 20 * np.log10(np.maximum(energy, 1e-10)) > threshold_db
+    if voiced.sum() * FRAME_SECONDS < MIN_SPEECH_SECONDS:
+        return []
+    padding = int(round(PADDING_SECONDS / FRAME_SECONDS))
+    if padding:
+        voiced = np.convolve(voiced, np.ones(2 * padding + 1), mode="same") > 0
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], voiced.astype(np.int8), [0]])))
+    starts, ends = edges[::2], edges[1::2]
+    # gaps up to min_silence stay, including the ones at the beginning and the end
+    min_frames = max(1, int(round(min_silence / FRAME_SECONDS)))
+    long_gaps = starts[1:] - ends[:-1] > min_frames
+    starts = np.concatenate([starts[:1], starts[1:][long_gaps]])
+    ends = np.concatenate([ends[:-1][long_gaps], ends[-1:]])
+    if starts[0] <= min_frames:
+        starts[0] = 0
+    frames = len(voiced)
+    bounds = [(int(start) * frame, int(end) * frame) for start, end in zip(starts, ends)]
+    if frames - ends[-1] <= min_frames:
+        # the samples behind the last complete frame
+        bounds[-1] = (bounds[-1][0], len(audio))
+    return bounds
+
+
+class VoiceActivityFilter:
+    """
+    energy based voice activity pre-pass on the decoded audio: long silences get cut out before inference,
+    recordings without speech are not transcribed at all.
+    """
+
+    def __init__(self, threshold_db: float = -45.0, min_silence: float = 1.0, sample_rate: int = SAMPLE_RATE):
+        self.threshold_db = threshold_db
+        self.min_silence = min_silence
+        self.sample_rate = sample_rate
+
+    def trim(self, audio: np.ndarray, audio_file: str = "") -> Tuple[np.ndarray, TimestampMap]:
+        bounds = find_speech(audio, self.threshold_db, self.min_silence, self.sample_rate)
+        if not bounds:
+            raise SilentRecording(audio_file, len(audio) / self.sample_rate)
+        trimmed_starts = np.cumsum([0] + [end - start for start, end in bounds[:-1]]) / self.sample_rate
+        source_starts = [start / self.sample_rate for start, _ in bounds]
+        if len(bounds) == 1 and bounds[0] == (0, len(audio)):
+            return audio, TimestampMap(trimmed_starts, source_starts)
+        return np.concatenate([audio[start:end] for start, end in bounds]), TimestampMap(trimmed_starts, source_starts)
+
+    def get_cache_options(self) -> str:
+        return f"{self.threshold_db}:{self.min_silence}"
@@ -0,0 +1,158 @@
+from ctypes import CDLL, get_errno
+from errno import ENOENT
+from ctypes.util import find_library
+from logging import info, warning
+from os import read, close, walk, stat, strerror
+from os.path import join
+from select import select
+from signal import signal, SIGTERM, SIGINT
+from struct import unpack_from, calcsize
+from sys import platform
+from threading import Event
+from time import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = "iIII"
+
+
+class PollingWatcher:
+    """
+    fallback watcher, every wait simply ends after the timeout and the caller rescans the folder.
+    """
+
+    def __init__(self, folder: str, stop: Event):
+        self.folder = folder
+        self.stop = stop
+
+    def wait(self, timeout: float) -> bool:
+        self.stop.wait(timeout)
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(PollingWatcher):
+    """
+    linux inotify watcher on the folder and all of its sub-folders, no extra dependency needed.
+    once a new sub-folder can't be watched (i.e. max_user_watches is reached), every wait ends after
+    the timeout with changes like the polling watcher, so the caller rescans.
+    """
+
+    def __init__(self, folder: str, stop: Event):
+        super().__init__(folder, stop)
+        self.libc = CDLL(find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(get_errno(), strerror(get_errno()))
+        self.watches = {}
+        self.polling = False
+        try:
+            for root, dirs, files in walk(folder):
+                self.add_watch(root)
+        except OSError:
+            close(self.fd)
+            raise
+
+    def add_watch(self, path: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, path.encode(), WATCH_MASK)
+        if wd < 0:
+            raise OSError(get_errno(), f"Can't watch '{path}': {strerror(get_errno())}")
+        self.watches[wd] = path
+
+    def wait(self, timeout: float) -> bool:
+        """
+        blocks until something changed in the folder or the timeout passed, returns if there were changes.
+        """
+        deadline = time() + timeout
+        while not self.stop.is_set():
+            # wake up regularly so a stop request is noticed quickly
+            readable, _, _ = select([self.fd], [], [], max(0.0, min(1.0, deadline - time())))
+            if readable:
+                self.read_events()
+                return True
+            if time() >= deadline:
+                return self.polling
+        return False
+
+    def read_events(self) -> None:
+        try:
+            data = read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = unpack_from(EVENT_HEADER, data, offset)
+            offset += calcsize(EVENT_HEADER)
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and wd in self.watches:
+                for root, dirs, files in walk(join(self.watches[wd], name)):
+                    try:
+                        self.add_watch(root)
+                    except OSError as e:
+                        # removed right after it was created, nothing left to watch
+                        if e.errno == ENOENT:
+                            continue
+                        if not self.polling:
+                            warning(f"{e}, falling back to polling")
+                        self.polling = True
+
+    def close(self) -> None:
+        close(self.fd)
+
+
+def install_stop_handlers(stop: Event) -> None:
+    """
+    SIGTERM (docker stop) and SIGINT let the current file finish before the watch loop ends.
+    """
+    def request_stop(signum, frame):
+        info(f"Received signal {signum}, stopping after the current file")
+        stop.set()
+
+    signal(SIGTERM, request_stop)
+    signal(SIGINT, request_stop)
+
+
+def create_watcher(folder: str, stop: Event) -> PollingWatcher:
+    if platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder, stop)
+        except (OSError, AttributeError) as e:
+            warning(f"inotify is not available ({e}), falling back to polling")
+    info("Watching by polling the folder")
+    return PollingWatcher(folder, stop)
+
+
+class Debouncer:
+    """
+    a file counts as settled once its size and modification time did not change for *delay* seconds,
+    so recordings that are still being written get skipped.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.seen = {}
+
+    def is_settled(self, path: str) -> bool:
+        try:
+            stat_result = stat(path)
+        except FileNotFoundError:
+            self.seen.pop(path, None)
+            return False
+        signature = (stat_result.st_size, stat_result.st_mtime)
+        previous = self.seen.get(path)
+        self.seen[path] = signature
+        if time() - stat_result.st_mtime < self.delay:
+            return False
+        return previous is None or previous == signature
+
+    def forget(self, path: str) -> None:
+        self.seen.pop(path, None)
@@ -0,0 +1,155 @@
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from gc import freeze, unfreeze
+from logging import info, warning
+from multiprocessing import get_all_start_methods, get_context
+from os import getpid
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Optional
+from src.abstracts.AudioTextProcessor import AudioTextProcessor
+from src.Metrics import peak_rss_mb, process_memory_mb
+
+# the processor living inside a worker process, set once by init_worker
+_worker_processor: Optional[AudioTextProcessor] = None
+
+
+def init_worker(processor: AudioTextProcessor, threads: int, loaded: bool = False) -> None:
+    """
+    runs once per worker process, so every worker loads its model exactly one time.
+    a loaded processor was forked from the parent and shares its weights.
+    """
+    global _worker_processor
+    if threads:
+        processor.set_threads(threads)
+    if not loaded:
+        processor.init_model()
+    _worker_processor = processor
+
+
+def transcribe_file(audio_file: str) -> str:
+    return _worker_processor.transcribe(audio_file)
+
+
+def transcribe_file_with_stats(audio_file: str) -> Tuple[str, dict]:
+    """
+    transcribe_file plus the stats the worker collected for the file, including the peak rss of the worker.
+    """
+    content = transcribe_file(audio_file)
+    return content, {**_worker_processor.pop_stats(audio_file), "peak_rss_mb": peak_rss_mb(), **process_memory_mb()}
+
+
+def call_processor(method: str, model: Optional[str], *args):
+    return getattr(_worker_processor.get_processor(model), method)(*args)
+
+
+def submit_bounded(submit: Callable[[str], Future], jobs: Iterable[Tuple[str, str]],
+                   max_in_flight: int) -> Iterator[Tuple[str, str, Future]]:
+    """
+    submits the audio file of every (audio_file, out_file) job and yields (audio_file, out_file, future)
+    as soon as its future is done. the next job is only taken once fewer than max_in_flight are running,
+    so taking a job (i.e. claiming it) happens right before it can start.
+    """
+    in_flight = {}
+    jobs = iter(jobs)
+    exhausted = False
+    while True:
+        while not exhausted and len(in_flight) < max_in_flight:
+            job = next(jobs, None)
+            if job is None:
+                exhausted = True
+                break
+            in_flight[submit(job[0])] = job
+        if not in_flight:
+            return
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            audio_file, out_file = in_flight.pop(future)
+            yield audio_file, out_file, future
+
+
+class WorkerPool:
+    """
+    with share_model the model gets loaded once in this process before the workers are forked. the workers
+    only read the weights, so the pages stay shared copy-on-write and another worker costs little memory.
+    """
+
+    def __init__(self, processor: AudioTextProcessor, workers: int, threads: int = 0, share_model: bool = False):
+        self.processor = processor
+        self.workers = workers
+        self.threads = threads
+        self.share_model = share_model
+        self.executor = None
+        self.stats = {}
+
+    def __enter__(self):
+        info(f"Starting {self.workers} workers with {self.threads or 'default'} torch threads each")
+        context = None
+        if self.share_model and "fork" not in get_all_start_methods():
+            warning("Sharing the model needs fork, every worker loads its own model")
+            self.share_model = False
+        if self.share_model:
+            self.processor.init_model()
+            # the garbage collector of the workers would write to every object it visits, and so copy its page
+            freeze()
+            context = get_context("fork")
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(self.processor, self.threads, self.share_model),
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.report_memory()
+        self.executor.shutdown(wait=True, cancel_futures=exc_type is not None)
+        self.executor = None
+        if self.share_model:
+            unfreeze()
+
+    def memory(self) -> Dict[int, Dict[str, float]]:
+        """
+        rss and pss of this process and every worker by pid, see process_memory_mb.
+        """
+        # the executor keeps no public list of its processes
+        pids = [getpid()] + list(getattr(self.executor, "_processes", None) or {})
+        return {pid: memory for pid in pids if (memory := process_memory_mb(pid))}
+
+    def report_memory(self) -> None:
+        memory = self.memory()
+        for pid, values in memory.items():
+            role = "main" if pid == getpid() else "worker"
+            info(f"{role} {pid}: rss {values.get('rss_mb', 0):.0f} MB, pss {values.get('pss_mb', 0):.0f} MB")
+        if memory:
+            info(f"all processes: pss {sum(values.get('pss_mb', 0) for values in memory.values()):.0f} MB")
+
+    def imap_unordered(self, jobs: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str, str, Optional[Exception]]]:
+        """
+        transcribes (audio_file, out_file) jobs and yields (audio_file, out_file, content, exception)
+        as soon as a job finishes. only a bounded number of jobs is in flight at any time.
+        """
+        for audio_file, out_file, future in submit_bounded(self.submit, jobs, self.workers * 2):
+            exception = future.exception()
+            content = None
+            if not exception:
+                content, self.stats[audio_file] = future.result()
+            yield audio_file, out_file, content, exception
+
+    def submit(self, audio_file: str) -> Future:
+        """
+        transcribes a single file, the future's result is (content, stats).
+        """
+        return self.executor.submit(transcribe_file_with_stats, audio_file)
+
+    def pop_stats(self, audio_file: str) -> dict:
+        """
+        the stats the worker collected while transcribing the file, see AudioTextProcessor.pop_stats.
+        """
+        return self.stats.pop(audio_file, {})
+
+    def map(self, method: Callable, items: Iterable) -> List:
+        """
+        drop-in for map(processor.method, items) that runs the processor method of the workers instead, in order.
+        """
+        # the model tells tiered processors which of their models the method belongs to
+        model = getattr(getattr(method, "__self__", None), "model", None)
+        futures = [self.executor.submit(call_processor, method.__name__, model, item) for item in items]
+        return [future.result() for future in futures]
@@ -1,9 +1,19 @@
 from abc import ABC, abstractmethod
-from re import sub, IGNORECASE, search, DOTALL, split
+from contextlib import contextmanager
+from re import DOTALL, Match, split, compile
 from logging import info
+from time import perf_counter
+from typing import Callable, Iterator, List, Tuple
+from src.ActionKeywords import ActionKeywords
+
+TAGS_PATTERN = compile(r"#TAGS---(.*?)---TAGS#", DOTALL)
+HASHTAG_PATTERN = compile(r'Hashtag ([^,\.]*)[,.]?')
 
 
 class AudioTextProcessor(ABC):
+    # whether transcribe_to writes the note while the transcript comes in, see Converter.convert_file
+    streams_notes = False
+
     @abstractmethod
     def transcribe(self, audio_file: str):
         pass
@@ -12,14 +22,97 @@ class AudioTextProcessor(ABC):
     def init_model(self) -> None:
         pass
 
+    def load_audio(self, audio_file: str):
+        """
+        decodes the audio file ahead of inference, backends that decode on their own return the path unchanged.
+        """
+        return audio_file
+
+    def get_transcript(self, audio_file: str, map_function: Callable = map, audio=None) -> dict:
+        """
+        the unformatted transcript, format_transcript(get_transcript(audio_file), audio_file) equals transcribe(audio_file).
+        """
+        return {"text": self.transcribe(audio_file), "segments": []}
+
+    def get_transcripts(self, audio_files: List[str], audios: List = None) -> List[dict]:
+        """
+        get_transcript for several recordings at once, backends able to batch inference override it.
+        """
+        audios = audios or [None] * len(audio_files)
+        return [self.get_transcript(audio_file, audio=audio) for audio_file, audio in zip(audio_files, audios)]
+
+    def can_batch(self, audio) -> bool:
+        """
+        whether the decoded recording may share a batch with others, backends without batching say no.
+        """
+        return False
+
+    def transcribe_batch(self, audio_files: List[str]) -> List[str]:
+        transcripts = self.get_transcripts(audio_files)
+        return [self.format_transcript(transcript, audio_file) for audio_file, transcript in zip(audio_files, transcripts)]
+
+    def transcribe_to(self, audio_file: str, writer) -> None:
+        """
+        transcribe() into a NoteWriter, backends with streams_notes write the note part by part.
+        """
+        writer.write(self.transcribe(audio_file))
+
+    def format_transcript(self, transcript: dict, audio_file: str) -> str:
+        return transcript["text"]
+
+    @property
+    def stats(self) -> dict:
+        # created on first use, so subclasses don't have to call an __init__
+        return self.__dict__.setdefault("_stats", {})
+
+    def add_stat(self, audio_file: str, name: str, value: float) -> None:
+        """
+        adds up per file measurements like stage durations, see Metrics.add_file. an empty audio_file
+        is not bound to a file (i.e. the model load) and gets reported with the next file.
+        """
+        file_stats = self.stats.setdefault(audio_file, {})
+        file_stats[name] = file_stats.get(name, 0) + value
+
+    @contextmanager
+    def timed(self, audio_file: str, stage: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stat(audio_file, stage, perf_counter() - start)
+
+    def pop_stats(self, audio_file: str) -> dict:
+        stats = self.stats.pop("", {})
+        for name, value in self.stats.pop(audio_file, {}).items():
+            stats[name] = stats.get(name, 0) + value
+        return stats
+
+    def get_processor(self, model: str) -> "AudioTextProcessor":
+        """
+        the processor running the given model, backends combining several models return the matching one.
+        """
+        return self
+
+    def prepare(self) -> None:
+        """
+        stores the model in a form that loads faster, run once by MODE=prepare. no-op by default.
+        """
+        pass
+
+    def set_threads(self, threads: int) -> None:
+        """
+        limits the number of threads the backend may use for inference, no-op by default.
+        """
+        pass
+
     def format_text(self, text, words, audio_file_name: str) -> str:
         if not words:
             return text
-        for word, format in words.items():
-            text = sub(word, format, text, flags=IGNORECASE)
+        if not isinstance(words, ActionKeywords):
+            words = ActionKeywords(words)
+        text = words.apply(text)
         text = self.format_hashtags(text)
-        tags = self.get_tags_str_for_properties(text)
-        text = self.remove_obsidian_tags_from_text(text)
+        tags, text = self.extract_obsidian_tags(text)
         link_audio = self.has_audiofile_keyword(text, audio_file_name)
         audiolog = self.get_audiofile_keyword_for_properties(link_audio)
         text = self.remove_audiofile_keyword(text)
@@ -41,13 +134,24 @@ class AudioTextProcessor(ABC):
 
         return "".join([header, "\n"])
 
+    def extract_obsidian_tags(self, text: str) -> Tuple[str, str]:
+        """
+        single pass version of get_tags_str_for_properties + remove_obsidian_tags_from_text.
+        """
+        match = TAGS_PATTERN.search(text)
+        if not match:
+            return "", text
+        return self.get_tags_str_from_match(match.group(1)), text.replace(match.group(0), "")
+
     def get_tags_str_for_properties(self, text: str) -> str:
-        pattern = r"#TAGS---(.*?)---TAGS#"
-        match = search(pattern, text, DOTALL)
+        match = TAGS_PATTERN.search(text)
 
         if not match:
             return ""
-        split_list = split(r"[,\.\s]", match.group(1))
+        return self.get_tags_str_from_match(match.group(1))
+
+    def get_tags_str_from_match(self, tags_text: str) -> str:
+        split_list = split(r"[,\.\s]", tags_text)
         tags = [word.capitalize() for word in split_list if word]
         if not tags:
             return ""
@@ -65,8 +169,7 @@ class AudioTextProcessor(ABC):
         return audio_file_name if "#LINK_AUDIO_FILE#" in text else ""
 
     def remove_obsidian_tags_from_text(self, text: str) -> str:
-        pattern = r"#TAGS---(.*?)---TAGS#"
-        match = search(pattern, text, DOTALL)
+        match = TAGS_PATTERN.search(text)
         if not match:
             return text
         return text.replace(match.group(0), "")
@@ -75,8 +178,11 @@ class AudioTextProcessor(ABC):
         return text.replace("#LINK_AUDIO_FILE#", '')
 
     def format_hashtags(self, text: str):
-        pattern = r'Hashtag ([^,\.]*)[,.]?'
-        return sub(pattern, lambda m: '#' + ''.join(word.capitalize() for word in m.group(1).split()), text)
+        return HASHTAG_PATTERN.sub(self.format_hashtag, text)
+
+    @staticmethod
+    def format_hashtag(match: Match) -> str:
+        return '#' + ''.join(word.capitalize() for word in match.group(1).split())
 
     @staticmethod
     def word_counter(text: str) -> int:
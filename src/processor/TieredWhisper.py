@@ -0,0 +1,159 @@
+from src.abstracts.AudioTextProcessor import AudioTextProcessor
+from src.processor.Whisper import Whisper
+from src.Scheduler import probe_duration
+from src.Chunker import SAMPLE_RATE
+from src.VoiceActivity import SilentRecording
+from logging import info, error
+from os.path import basename
+from time import time
+from typing import Callable, List, Optional, Tuple
+from numpy import ndarray
+
+# seconds of inference per second of audio on a cpu, replaced by measurements as soon as a tier ran
+INITIAL_REAL_TIME_FACTORS = {
+    "tiny": 0.05, "base": 0.1, "small": 0.3, "medium": 0.8, "large": 1.6,
+}
+
+
+class TieredWhisper(AudioTextProcessor):
+    """
+    picks the whisper model per recording: short memos get a small model, long recordings a large one.
+    every tier loads its model the first time it is needed and keeps it loaded, with share_model all of them
+    get loaded by init_model, before the workers are forked.
+    with a time budget, tiers that would not finish the recording in the remaining time are skipped in favour
+    of smaller ones. with an escalation threshold, a transcript whose average log probability stays below it
+    is transcribed again by the next larger tier.
+    """
+
+    def __init__(self, language, tiers: List[Tuple[Optional[float], str]], **kwargs):
+        if not tiers:
+            raise ValueError("At least one model tier is needed")
+        self.language = language
+        # (max_seconds, Whisper) sorted from small to large recordings, None means no upper limit
+        self.tiers = [(max_seconds, Whisper(language, model, **kwargs)) for max_seconds, model in tiers]
+        self.time_budget = kwargs.get("time_budget", 0)
+        self.escalate_logprob = kwargs.get("escalate_logprob")
+        self.share_model = kwargs.get("share_model", 0)
+        self.real_time_factors = {
+            whisper.model: INITIAL_REAL_TIME_FACTORS.get(whisper.model.split(".")[0], 1.0)
+            for _, whisper in self.tiers
+        }
+        self.started = None
+        # the audio gets decoded and trimmed by the first tier, every tier has to map the timestamps back
+        for whisper in self.models:
+            whisper.timestamp_maps = self.models[0].timestamp_maps
+            whisper.content_hashes = self.models[0].content_hashes
+
+    @property
+    def models(self) -> List[Whisper]:
+        return [whisper for _, whisper in self.tiers]
+
+    def init_model(self) -> None:
+        if self.share_model:
+            # every worker may need every tier, loaded here they share the weights of all of them
+            for whisper in self.models:
+                whisper.init_model()
+            return
+        info(f"Model tiers {', '.join(whisper.model for whisper in self.models)} get loaded when first needed")
+
+    def prepare(self) -> None:
+        for whisper in self.models:
+            whisper.prepare()
+
+    def transcribe(self, audio_file: str, map_function: Callable = map) -> str:
+        try:
+            transcript = self.get_transcript(audio_file, map_function)
+            result = self.format_transcript(transcript, audio_file)
+        except SilentRecording:
+            raise
+        except Exception as e:
+            error(e)
+            raise Exception(f"Error while converting {audio_file} with message: {e}")
+        return result
+
+    def get_transcript(self, audio_file: str, map_function: Callable = map, audio: ndarray = None) -> dict:
+        if self.started is None:
+            self.started = time()
+        duration = len(audio) / SAMPLE_RATE if audio is not None else probe_duration(audio_file)
+        tier = self.select_tier(duration)
+        transcript = self.run_tier(tier, audio_file, duration, map_function, audio)
+        logprob = self.average_logprob(transcript)
+        while self.should_escalate(tier, logprob, duration):
+            # the words of the rejected transcript don't count
+            self.models[tier].stats.get(audio_file, {}).pop("words", None)
+            tier += 1
+            info(f"Average log probability {logprob:.2f} of '{basename(audio_file)}' is below "
+                 f"{self.escalate_logprob}, escalating to *{self.models[tier].model}*")
+            transcript = self.run_tier(tier, audio_file, duration, map_function, audio)
+            logprob = self.average_logprob(transcript)
+        return transcript
+
+    def run_tier(self, tier: int, audio_file: str, duration: float, map_function: Callable, audio) -> dict:
+        whisper = self.models[tier]
+        info(f"Transcribing '{basename(audio_file)}' ({duration:.0f} seconds) with *{whisper.model}*")
+        transcript = whisper.get_transcript(audio_file, map_function, audio)
+        inference = whisper.stats.get(audio_file, {}).get("inference")
+        if inference and duration:
+            self.real_time_factors[whisper.model] = inference / duration
+        return transcript
+
+    def select_tier(self, duration: float) -> int:
+        """
+        the first tier whose maximum covers the duration, stepped down while it would overrun the time budget.
+        """
+        tier = next(
+            (index for index, (max_seconds, _) in enumerate(self.tiers) if max_seconds is None or duration <= max_seconds),
+            len(self.tiers) - 1,
+        )
+        while tier > 0 and not self.fits_budget(tier, duration):
+            tier -= 1
+        return tier
+
+    def fits_budget(self, tier: int, duration: float) -> bool:
+        if not self.time_budget:
+            return True
+        remaining = self.time_budget - (time() - (self.started or time()))
+        return duration * self.real_time_factors[self.models[tier].model] <= remaining
+
+    def should_escalate(self, tier: int, logprob: Optional[float], duration: float) -> bool:
+        if self.escalate_logprob is None or logprob is None or tier + 1 >= len(self.tiers):
+            return False
+        return logprob < self.escalate_logprob and self.fits_budget(tier + 1, duration)
+
+    @staticmethod
+    def average_logprob(transcript: dict) -> Optional[float]:
+        """
+        the average log probability of the segments, weighted by their duration.
+        """
+        segments = [segment for segment in transcript.get("segments", []) if "avg_logprob" in segment]
+        if not segments:
+            return None
+        weights = [max(segment.get("end", 0) - segment.get("start", 0), 1e-3) for segment in segments]
+        return sum(segment["avg_logprob"] * weight for segment, weight in zip(segments, weights)) / sum(weights)
+
+    def get_processor(self, model: str) -> AudioTextProcessor:
+        return next((whisper for whisper in self.models if whisper.model == model), self)
+
+    def format_transcript(self, transcript: dict, audio_file: str) -> str:
+        return self.models[0].format_transcript(transcript, audio_file)
+
+    def load_audio(self, audio_file: str) -> ndarray:
+        return self.models[0].load_audio(audio_file)
+
+    def reformat(self, audio_file: str) -> Optional[str]:
+        # a file may have been escalated, so the largest tier with a cached transcript wins
+        for whisper in reversed(self.models):
+            content = whisper.reformat(audio_file)
+            if content is not None:
+                return content
+        return None
+
+    def pop_stats(self, audio_file: str) -> dict:
+        stats = super().pop_stats(audio_file)
+        for whisper in self.models:
+            for name, value in whisper.pop_stats(audio_file).items():
+                stats[name] = stats.get(name, 0) + value
+        return stats
+
+    def set_threads(self, threads: int) -> None:
+        self.models[0].set_threads(threads)
@@ -1,10 +1,153 @@
 from src.abstracts.AudioTextProcessor import AudioTextProcessor
-from time import time
-from whisper import load_model
-from logging import info, error
-from os.path import basename
+from src.TranscriptCache import file_hash
+from src.Chunker import split_audio, stitch_segments, own_segments, SAMPLE_RATE
+from src.StreamingFormatter import StreamingFormatter
+from src.VoiceActivity import SilentRecording
+from src.Decoding import DecodingSettings
+from time import time, perf_counter
+from logging import info, error, warning
+from os import getenv, makedirs, replace, stat
+from os.path import basename, exists, expanduser, join
+from typing import Callable, Iterator, List, Optional, Union
+from numpy import ndarray
+
+# whisper decodes 30 second windows, shorter recordings fit into one window and can share a batch
+BATCH_SECONDS = 30
+# the thresholds whisper.transcribe uses to reject a decoding result
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def load_model(name: str, device: str = None):
+    """
+    whisper pulls in torch, which takes seconds to import. it only gets imported once a model is needed.
+    """
+    from whisper import load_model as load_whisper_model
+    return load_whisper_model(name, device=device)
+
+
+def model_root() -> str:
+    # the folder whisper downloads its models to, mounted as ./models in docker
+    return join(getenv("XDG_CACHE_HOME", join(expanduser("~"), ".cache")), "whisper")
+
+
+def quantize_model(model):
+    """
+    dynamic int8 quantization of every linear layer, runs on the cpu only.
+    whisper uses its own Linear subclass, torch only quantizes its plain Linear, so the layers get swapped first.
+    """
+    from torch import nn, qint8
+    from torch.ao.quantization import quantize_dynamic
+    from whisper.model import Linear
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, Linear):
+                linear = nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                linear.weight, linear.bias = child.weight, child.bias
+                setattr(module, name, linear)
+    return quantize_dynamic(model, {nn.Linear}, dtype=qint8)
+
+
+def library_versions() -> dict:
+    import torch
+    import whisper
+    return {"torch": str(torch.__version__), "whisper": whisper.__version__}
+
+
+def load_quantized_model(name: str, root: str = None):
+    """
+    quantizes the model once and keeps the result next to the downloaded models as {name}-int8.pt.
+    the cached model is a pickled module, so it is only used with the torch and whisper versions that created it.
+    """
+    import torch
+    path = join(root or model_root(), f"{name}-int8.pt")
+    versions = library_versions()
+    if exists(path):
+        # the float weights outside the linear layers get memory mapped, the packed int8 ones are copied
+        cached = torch.load(path, mmap=True, weights_only=False)
+        if cached.get("versions") == versions:
+            return cached["model"]
+        warning(f"'{path}' was quantized with {cached.get('versions')}, quantizing again")
+    info(f"Quantizing *{name}* to int8, this happens only once")
+    model = quantize_model(load_model(name, device="cpu"))
+    makedirs(root or model_root(), exist_ok=True)
+    torch.save({"versions": versions, "model": model}, f"{path}.tmp")
+    replace(f"{path}.tmp", path)
+    return model
+
+
+def prepared_path(name: str, root: str = None) -> str:
+    return join(root or model_root(), f"{name}.prepared.pt")
+
+
+def checkpoint_source(name: str, root: str = None) -> dict:
+    """
+    identifies the checkpoint whisper loads for the model: the sha256 of its download url, and the size and
+    modification time of the downloaded file, which are cheap to compare unlike its hash.
+    """
+    from whisper import _MODELS
+    url = _MODELS[name]
+    source = {"file": basename(url), "sha256": url.split("/")[-2]}
+    try:
+        stat_result = stat(join(root or model_root(), source["file"]))
+    except FileNotFoundError:
+        # removed after preparing, only the url is left to compare, see map_prepared_model
+        return source
+    return {**source, "size": stat_result.st_size, "mtime": stat_result.st_mtime}
+
+
+def save_prepared_model(model, path: str, source: dict) -> None:
+    """
+    stores the model with float32 weights, the dtype it runs with on the cpu, while whisper's checkpoints hold
+    float16 ones that get converted on every load. like the int8 cache it is a pickled module, nothing has to be
+    constructed or initialized to load it.
+    """
+    import torch
+    torch.save({"source": source, "versions": library_versions(), "model": model.float()}, f"{path}.tmp")
+    replace(f"{path}.tmp", path)
+
+
+def map_prepared_model(path: str, source: dict = None):
+    """
+    the model stored by save_prepared_model with its weights memory mapped from the file, pages are only read
+    once inference touches them and stay shared between processes. None if it was prepared from another
+    source checkpoint or with other torch or whisper versions. only the fields of source get compared.
+    """
+    import torch
+    checkpoint = torch.load(path, mmap=True, weights_only=False, map_location="cpu")
+    if checkpoint["versions"] != library_versions() or \
+            any(checkpoint["source"].get(key) != value for key, value in (source or {}).items()):
+        warning(f"'{path}' was prepared from {checkpoint['source']['file']} with {checkpoint['versions']}, "
+                f"run MODE=prepare again")
+        return None
+    return checkpoint["model"]
+
+
+def prepare_model(name: str, root: str = None) -> str:
+    """
+    loads the model the usual way, which checks the sha256 of the download, and stores it next to it
+    as {name}.prepared.pt.
+    """
+    path = prepared_path(name, root)
+    info(f"Preparing *{name}* as '{path}'")
+    save_prepared_model(load_model(name, device="cpu"), path, checkpoint_source(name, root))
+    return path
+
+
+def load_prepared_model(name: str, root: str = None):
+    """
+    the prepared model if there is one for the downloaded checkpoint, otherwise None.
+    """
+    path = prepared_path(name, root)
+    if not exists(path):
+        return None
+    info(f"Mapping the prepared model '{path}'")
+    return map_prepared_model(path, checkpoint_source(name, root))
+
 
 class Whisper(AudioTextProcessor):
+    streams_notes = True
     model_sizes = ["tiny.en", "tiny", "base.en", "base", "small.en", "small", "medium.en", "medium", "large"]
 
     def __init__(self, language, model, **kwargs):
@@ -14,29 +157,306 @@ class Whisper(AudioTextProcessor):
         self.model = model
         self.active_model = None
         self.actions = kwargs.get("action_keywords") if kwargs.get("action_keywords", {}) else {}
+        self.cache = kwargs.get("transcript_cache")
+        self.chunk_seconds = kwargs.get("chunk_seconds", 0)
+        self.chunk_overlap = kwargs.get("chunk_overlap", 1.0)
+        self.quantize = kwargs.get("quantize", 0)
+        self.vad = kwargs.get("vad")
+        self.audio_cache = kwargs.get("audio_cache")
+        self.decoding = kwargs.get("decoding") or DecodingSettings()
+        # audio_file => TimestampMap of the recordings the voice activity pre-pass trimmed
+        self.timestamp_maps = {}
+        # audio_file => sha256 of the recordings in flight, shared by the transcript and the audio cache
+        self.content_hashes = {}
 
-    def transcribe(self, audio_file: str) -> str:
-        if self.active_model is None:
-            self.init_model()
+    def transcribe(self, audio_file: str, map_function: Callable = map) -> str:
         try:
-            info("Converting audio transcripts into text ...")
-            start = time()
-            result = self.active_model.transcribe(audio_file, fp16=False, language=self.language)
-            duration = int(time() - start)
-            info("end transscription")
-            result = result['text'].strip()
-            word_count = self.word_counter(result)
-            info(f"transcribed {word_count} words in {duration} seconds")
-            result = super().format_text(result, self.actions, basename(audio_file))
+            transcript = self.get_transcript(audio_file, map_function)
+            result = self.format_transcript(transcript, audio_file)
+        except SilentRecording:
+            raise
         except Exception as e:
             error(e)
             raise Exception(f"Error while converting {audio_file} with message: {e}")
         return result
 
+    def transcribe_to(self, audio_file: str, writer) -> None:
+        """
+        transcribe() into a NoteWriter, every segment gets formatted and written as soon as it is known.
+        """
+        formatter = StreamingFormatter(self, self.actions, basename(audio_file))
+        try:
+            for text in self.iter_texts(audio_file):
+                with self.timed(audio_file, "format"):
+                    body = formatter.feed(text)
+                writer.write(body)
+            with self.timed(audio_file, "format"):
+                writer.header, body = formatter.finish()
+            writer.write(body)
+        except SilentRecording:
+            raise
+        except Exception as e:
+            error(e)
+            raise Exception(f"Error while converting {audio_file} with message: {e}")
+
+    def iter_texts(self, audio_file: str) -> Iterator[str]:
+        """
+        the transcript text segment by segment. whisper returns the segments of a recording all at once,
+        so they only come in as the recording goes with chunking. the cache gets the complete transcript.
+        """
+        content_hash = self.get_content_hash(audio_file) if self.cache else None
+        transcript = self.cache.get(audio_file, self.get_cache_options(), content_hash) if self.cache else None
+        if transcript is None:
+            parts = []
+            for part in self.infer_parts(audio_file):
+                parts.append(part)
+                yield from self.segment_texts(part)
+            transcript = parts[0] if len(parts) == 1 else {
+                "text": "".join(part["text"] for part in parts),
+                "segments": [segment for part in parts for segment in part["segments"]],
+                "fallbacks": sum(part.get("fallbacks", 0) for part in parts),
+            }
+            if self.cache:
+                self.cache.put(audio_file, self.get_cache_options(), transcript, content_hash)
+        else:
+            yield from self.segment_texts(transcript)
+        self.add_transcript_stats(audio_file, transcript)
+
+    def infer_parts(self, audio_file: str) -> Iterator[dict]:
+        """
+        infer() that yields the transcript of every chunk as soon as it is done.
+        """
+        if not self.chunk_seconds:
+            yield self.infer(audio_file)
+            return
+        audio = self.load_audio(audio_file)
+        chunks = split_audio(audio, self.chunk_seconds, self.chunk_overlap)
+        if len(chunks) > 1:
+            info(f"Split '{basename(audio_file)}' into {len(chunks)} chunks")
+        for index, chunk in enumerate(chunks):
+            with self.timed(audio_file, "inference"):
+                result = self.transcribe_raw(chunk.audio)
+            segments = own_segments(chunk, result, index == len(chunks) - 1)
+            yield self.restore_timestamps(audio_file, {
+                "text": "".join(segment["text"] for segment in segments), "segments": segments,
+                "fallbacks": result.get("fallbacks", 0),
+            })
+
+    @staticmethod
+    def segment_texts(transcript: dict) -> List[str]:
+        texts = [segment["text"] for segment in transcript.get("segments", [])]
+        # the text is what gets formatted, segments that don't add up to it are not used
+        return texts if texts and "".join(texts) == transcript["text"] else [transcript["text"]]
+
+    def get_transcript(self, audio_file: str, map_function: Callable = map, audio: ndarray = None) -> dict:
+        if not self.cache:
+            transcript = self.infer(audio_file, map_function, audio)
+        else:
+            content_hash = self.get_content_hash(audio_file)
+            transcript = self.cache.get(audio_file, self.get_cache_options(), content_hash)
+            if transcript is None:
+                transcript = self.infer(audio_file, map_function, audio)
+                self.cache.put(audio_file, self.get_cache_options(), transcript, content_hash)
+        self.add_transcript_stats(audio_file, transcript)
+        return transcript
+
+    def get_transcripts(self, audio_files: List[str], audios: List[ndarray] = None) -> List[dict]:
+        """
+        batched get_transcript for recordings that fit into a single window, cached transcripts are not decoded again.
+        """
+        audios = audios or [None] * len(audio_files)
+        hashes = [self.get_content_hash(audio_file) for audio_file in audio_files] if self.cache else []
+        transcripts = [
+            self.cache.get(audio_file, self.get_cache_options(), content_hash)
+            for audio_file, content_hash in zip(audio_files, hashes)
+        ] if self.cache else [None] * len(audio_files)
+        missing = [index for index, transcript in enumerate(transcripts) if transcript is None]
+        if missing:
+            batch = [self.load_audio(audio_files[i]) if audios[i] is None else audios[i] for i in missing]
+            start = perf_counter()
+            inferred = self.infer_batch(batch)
+            # every recording of the batch gets an equal share of the inference time
+            share = (perf_counter() - start) / len(missing)
+            for index, transcript in zip(missing, inferred):
+                transcript = self.restore_timestamps(audio_files[index], transcript)
+                transcripts[index] = transcript
+                self.add_stat(audio_files[index], "inference", share)
+                if self.cache:
+                    self.cache.put(audio_files[index], self.get_cache_options(), transcript, hashes[index])
+        for audio_file, transcript in zip(audio_files, transcripts):
+            self.add_transcript_stats(audio_file, transcript)
+        return transcripts
+
+    def add_transcript_stats(self, audio_file: str, transcript: dict) -> None:
+        self.add_stat(audio_file, "words", self.word_counter(transcript["text"]))
+        # cached transcripts took no decoding, so no fallbacks either
+        self.add_stat(audio_file, "fallbacks", transcript.get("fallbacks", 0))
+
+    def can_batch(self, audio) -> bool:
+        return isinstance(audio, ndarray) and len(audio) <= BATCH_SECONDS * SAMPLE_RATE
+
+    def infer_batch(self, audios: List[ndarray]) -> List[dict]:
+        """
+        one encoder forward pass and one batched decoding run for all recordings.
+        results whisper.transcribe would have rejected get transcribed again one by one, with temperature fallback,
+        which counts as a fallback of its own.
+        """
+        from torch import stack
+        from whisper import decode, DecodingOptions
+        from whisper.audio import log_mel_spectrogram, pad_or_trim
+        if self.active_model is None:
+            self.init_model()
+        model = self.active_model
+        start = time()
+        mel = stack([log_mel_spectrogram(pad_or_trim(audio), model.dims.n_mels) for audio in audios])
+        options = DecodingOptions(language=self.language, fp16=False, **self.decoding.batch_options())
+        results = decode(model, mel.to(model.device), options)
+        transcripts = []
+        for audio, result in zip(audios, results):
+            is_silent = result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD
+            if is_silent:
+                transcripts.append({"text": "", "segments": []})
+            elif self.decoding.can_fall_back and \
+                    (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD):
+                transcript = self.transcribe_raw(audio)
+                transcripts.append({**transcript, "fallbacks": transcript["fallbacks"] + 1})
+            else:
+                segment = {
+                    "id": 0, "start": 0.0, "end": len(audio) / SAMPLE_RATE, "text": result.text,
+                    "temperature": result.temperature, "avg_logprob": result.avg_logprob,
+                    "compression_ratio": result.compression_ratio, "no_speech_prob": result.no_speech_prob,
+                }
+                transcripts.append({"text": result.text, "segments": [segment]})
+        info(f"transcribed a batch of {len(audios)} recordings in {int(time() - start)} seconds")
+        return transcripts
+
+    def format_transcript(self, transcript: dict, audio_file: str) -> str:
+        with self.timed(audio_file, "format"):
+            return super().format_text(transcript['text'].strip(), self.actions, basename(audio_file))
+
+    def infer(self, audio_file: str, map_function: Callable = map, audio: ndarray = None) -> dict:
+        if audio is None and (self.chunk_seconds or self.vad or self.audio_cache):
+            audio = self.load_audio(audio_file)
+        if self.chunk_seconds:
+            with self.timed(audio_file, "inference"):
+                transcript = self.transcribe_chunked(audio_file, map_function, audio)
+            return self.restore_timestamps(audio_file, transcript)
+        with self.timed(audio_file, "inference"):
+            transcript = self.transcribe_raw(audio_file if audio is None else audio)
+        if audio is None and transcript["segments"]:
+            # whisper decoded the file itself, so the decoding is part of the inference time
+            self.add_stat(audio_file, "audio_seconds", transcript["segments"][-1]["end"])
+        return self.restore_timestamps(audio_file, transcript)
+
+    def restore_timestamps(self, audio_file: str, transcript: dict) -> dict:
+        """
+        segment times of a recording the voice activity pre-pass trimmed, in seconds of the source recording.
+        """
+        timestamp_map = self.timestamp_maps.get(audio_file)
+        return timestamp_map.restore(transcript) if timestamp_map else transcript
+
+    def transcribe_chunked(self, audio_file: str, map_function: Callable = map, audio: ndarray = None) -> dict:
+        """
+        splits long recordings at silences and transcribes the chunks through map_function,
+        which runs them on the worker pool in parallel mode.
+        """
+        if audio is None:
+            audio = self.load_audio(audio_file)
+        chunks = split_audio(audio, self.chunk_seconds, self.chunk_overlap)
+        if len(chunks) > 1:
+            info(f"Split '{basename(audio_file)}' into {len(chunks)} chunks")
+        results = list(map_function(self.transcribe_raw, [chunk.audio for chunk in chunks]))
+        return stitch_segments(chunks, results)
+
+    def load_audio(self, audio_file: str) -> ndarray:
+        from whisper.audio import load_audio
+        with self.timed(audio_file, "decode"):
+            audio = self.audio_cache.load(audio_file, load_audio, self.get_content_hash(audio_file)) \
+                if self.audio_cache else load_audio(audio_file)
+        self.add_stat(audio_file, "audio_seconds", len(audio) / SAMPLE_RATE)
+        if not self.vad:
+            return audio
+        with self.timed(audio_file, "vad"):
+            trimmed, self.timestamp_maps[audio_file] = self.vad.trim(audio, audio_file)
+        self.add_stat(audio_file, "silence_removed", (len(audio) - len(trimmed)) / SAMPLE_RATE)
+        return trimmed
+
+    def transcribe_raw(self, audio_file: Union[str, ndarray]) -> dict:
+        if self.active_model is None:
+            self.init_model()
+        info("Converting audio transcripts into text ...")
+        start = time()
+        result = self.active_model.transcribe(
+            audio_file, fp16=False, language=self.language, **self.decoding.transcribe_options()
+        )
+        duration = time() - start
+        info("end transscription")
+        word_count = self.word_counter(result['text'])
+        segments = result.get('segments', [])
+        fallbacks = self.decoding.count_fallbacks(segments)
+        info(f"transcribed {word_count} words in {duration:.2f} seconds, {fallbacks} fallback(s)")
+        return {"text": result['text'], "segments": segments, "fallbacks": fallbacks}
+
+    def reformat(self, audio_file: str) -> Optional[str]:
+        """
+        formats the cached transcript of the audio file again, without loading the model.
+        """
+        if not self.cache:
+            return None
+        transcript = self.cache.get(audio_file, self.get_cache_options())
+        if transcript is None:
+            return None
+        return self.format_transcript(transcript, audio_file)
+
+    def get_cache_options(self) -> dict:
+        options = {"processor": "whisper", "model": self.model, "language": self.language, "fp16": False}
+        if self.quantize:
+            options["quantize"] = "int8"
+        if self.vad:
+            options["vad"] = self.vad.get_cache_options()
+        if self.decoding.get_cache_options():
+            options["decoding"] = self.decoding.get_cache_options()
+        if self.chunk_seconds:
+            options["chunk_seconds"] = self.chunk_seconds
+            options["chunk_overlap"] = self.chunk_overlap
+        return options
+
+    def get_content_hash(self, audio_file: str) -> str:
+        """
+        the sha256 of the recording, read once per recording, see pop_stats.
+        """
+        if audio_file not in self.content_hashes:
+            self.content_hashes[audio_file] = file_hash(audio_file)
+        return self.content_hashes[audio_file]
+
+    def pop_stats(self, audio_file: str) -> dict:
+        self.timestamp_maps.pop(audio_file, None)
+        self.content_hashes.pop(audio_file, None)
+        return super().pop_stats(audio_file)
+
+    def set_threads(self, threads: int) -> None:
+        from torch import set_num_threads
+        info(f"Limiting torch to {threads} threads")
+        set_num_threads(threads)
+
+    def prepare(self) -> None:
+        """
+        int8 weights are packed by torch and can't be memory mapped, their cache is the prepared form.
+        """
+        if self.quantize:
+            load_quantized_model(self.model)
+        else:
+            prepare_model(self.model)
+
     def init_model(self) -> None:
-        info(f"Loading local *{self.model}* whisper model with language code *{self.language}*")
+        precision = "int8 quantized " if self.quantize else ""
+        info(f"Loading local *{self.model}* {precision}whisper model with language code *{self.language}*")
         try:
-            self.active_model = load_model(self.model)
+            with self.timed("", "model_load"):
+                if self.quantize:
+                    self.active_model = load_quantized_model(self.model)
+                else:
+                    self.active_model = load_prepared_model(self.model) or load_model(self.model)
         except Exception as e:
             error(e)
         info("Loading of whisper model finished")
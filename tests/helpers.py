@@ -0,0 +1,65 @@
+from threading import Event
+from time import sleep
+from types import SimpleNamespace
+from unittest.mock import Mock
+from src.abstracts.AudioTextProcessor import AudioTextProcessor
+from src.VoiceActivity import SilentRecording
+from benchmarks.synthetic import synthetic_config
+
+MEDIA_FILES = [".wav", ".mp3"]
+
+
+class StubAudioTextProcessor(AudioTextProcessor):
+    """
+    transcribes without a model. recordings with "broken" in their name fail, the ones recorded at midnight
+    are silent and "chunked" ones get transcribed as three chunks through the map function.
+    every transcription waits for release and, with a log file, gets appended to it, shared by all processes.
+    """
+
+    def __init__(self, log_file: str = None, latency: float = 0.0):
+        self.log_file = log_file
+        self.latency = latency
+        self.init_calls = 0
+        self.threads = 0
+        self.release = Event()
+        self.release.set()
+
+    def init_model(self):
+        self.init_calls += 1
+
+    def set_threads(self, threads):
+        self.threads = threads
+
+    def transcribe(self, audio_file, map_function=map):
+        self.release.wait()
+        if self.log_file:
+            with open(self.log_file, "a") as f:
+                f.write(f"{audio_file}\n")
+        with self.timed(audio_file, "inference"):
+            sleep(self.latency)
+        if "broken" in audio_file:
+            raise Exception("broken recording")
+        if "00_00_00" in audio_file:
+            raise SilentRecording(audio_file, 4.0)
+        # the state of the process that transcribed it
+        self.add_stat(audio_file, "audio_seconds", 10.0)
+        self.add_stat(audio_file, "init_calls", self.init_calls)
+        self.add_stat(audio_file, "threads", self.threads)
+        if "chunked" in audio_file:
+            return "".join(map_function(self.transcribe_raw, ["chunk 1", "chunk 2", "chunk 3"]))
+        return f"transcribed {audio_file}"
+
+    def transcribe_raw(self, chunk):
+        return f" {chunk}"
+
+
+def fake_config(**overrides) -> SimpleNamespace:
+    """
+    synthetic_config with the file names of the tests and a Mock as model.
+    """
+    converter = Mock()
+    converter.pop_stats.return_value = {}
+    return synthetic_config(**{
+        "folder": ".", "processor": converter, "media_files": MEDIA_FILES, "source_string": "%Y_%m_%d_%H_%M_%S",
+        "target_string": "%Y-%m-%d-%H-%M-%S", "watch_interval": 0.1, "watch_debounce": 0.1, **overrides,
+    })
@@ -0,0 +1,65 @@
+import unittest
+from re import compile, sub, IGNORECASE
+from src.ActionKeywords import ActionKeywords, required_literals, sub_tracked
+
+WORDS = {
+    "obsidian[-\\s]?link (start|anfang)[\\s.,]?\\s?": "[[",
+    "[.,]?\\sobsidian[-\\s]?link (stop|ende)[.,]?\\s?": "]] ",
+    "(Line Break|Absatz)[.,]?\\s?": "\n",
+    "\\s\\s?(Listen[\\s-]?strich)[\\s.,]?": "\n- ",
+    "(schei(ss|ß)e|mist)": "💩",
+    "[0-9]+": "#",
+}
+
+
+class TestActionKeywords(unittest.TestCase):
+
+    def setUp(self):
+        self.action_keywords = ActionKeywords(WORDS)
+
+    def test_required_literals(self):
+        self.assertEqual(required_literals("obsidian[-\\s]?link (start|anfang)"), ({"obsidian"}, 0))
+        self.assertEqual(required_literals("[.,]?\\sObsidian link"), ({"obsidian link"}, 2))
+        self.assertEqual(required_literals("(Line Break|Absatz)[.,]?"), ({"line break", "absatz"}, 0))
+        self.assertIsNone(required_literals("[0-9]+"))
+        self.assertIsNone(required_literals("(a|[bc])"))
+
+    def test_is_dict(self):
+        self.assertDictEqual(self.action_keywords, WORDS)
+        self.assertFalse(ActionKeywords())
+
+    def test_apply(self):
+        texts = [
+            "Meine Obsidian Link Start Katzen fotos, Obsidian Link Ende herumzeigen. Absatz. Ende",
+            "kein Schlüsselwort in diesem Text",
+            "Listenstrich Banane Listen-Strich Gurke  listenstrich Apfel 12 mist und SCHEISSE",
+            "miſt, lınk und İ werden wie von re behandelt, Obsidian lınk start x",
+        ]
+        for text in texts:
+            expected = text
+            for word, format in WORDS.items():
+                expected = sub(word, format, expected, flags=IGNORECASE)
+            self.assertEqual(self.action_keywords.apply(text), expected)
+
+    def test_sub_at(self):
+        pattern = self.action_keywords.rules[0][0]
+        text = "a obsidian link start b obsidian link anfang c"
+        result = self.action_keywords.sub_at(pattern, "[[", text, [2, 24], 0)
+        self.assertEqual(result, "a [[b [[c")
+
+
+    def test_apply_tracked(self):
+        text = "Meine Obsidian Link Start Katzen fotos, Obsidian Link Ende herumzeigen. Absatz. Ende 12"
+        cuts = [text.index("Katzen"), text.index("Link Ende"), text.index("herumzeigen"), len(text)]
+        result, positions = self.action_keywords.apply_tracked(text, cuts)
+        self.assertEqual(result, self.action_keywords.apply(text))
+        # the cut inside the link stop keyword is gone, the ones at the edge of a match stay
+        self.assertIsNone(positions[1])
+        self.assertEqual(result[:positions[0]], "Meine [[")
+        self.assertEqual(result[positions[2]:], "herumzeigen. \nEnde #")
+        self.assertEqual(positions[3], len(result))
+        self.assertEqual(sub_tracked(compile("x"), "y", "abc", [1]), ("abc", [1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from os import listdir, utime
+from os.path import join
+from pickle import dumps, loads
+from tempfile import TemporaryDirectory
+from unittest.mock import Mock
+import numpy as np
+from src.AudioCache import AudioCache
+from src.TranscriptCache import file_hash
+
+
+class TestAudioCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = TemporaryDirectory()
+        self.recordings = []
+        for index in range(3):
+            audio_file = join(self.folder.name, f"{index}.m4a")
+            with open(audio_file, "wb") as f:
+                f.write(bytes([index]))
+            self.recordings.append(audio_file)
+        self.audio = np.linspace(-1, 1, 16000, dtype=np.float32)
+        self.cache = AudioCache(join(self.folder.name, "audio"), 1024 ** 2)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_load(self):
+        decode = Mock(return_value=self.audio)
+        first = self.cache.load(self.recordings[0], decode)
+        second = self.cache.load(self.recordings[0], decode)
+        decode.assert_called_once_with(self.recordings[0])
+        np.testing.assert_array_equal(second, self.audio)
+        self.assertIsInstance(second, np.memmap)
+        self.assertEqual(second.dtype, np.float32)
+        # whisper may write into the audio, the cached file stays as it is
+        second[0] = 5
+        np.testing.assert_array_equal(self.cache.get(self.recordings[0]), self.audio)
+        self.assertIs(first, self.audio)
+        self.assertListEqual(listdir(self.cache.folder), [f"{file_hash(self.recordings[0])}-16000.npy"])
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get(self.recordings[0]))
+        # an entry that got damaged is decoded again
+        self.cache.put(self.recordings[0], self.audio)
+        with open(self.cache.get_path(file_hash(self.recordings[0])), "wb") as f:
+            f.write(b"broken")
+        self.assertIsNone(self.cache.get(self.recordings[0]))
+
+    def test_evict(self):
+        # every entry is 64 kB, there is room for two of them
+        self.cache.max_bytes = 150 * 1024
+        for index, audio_file in enumerate(self.recordings[:2]):
+            self.cache.put(audio_file, self.audio)
+            utime(self.cache.get_path(file_hash(audio_file)), (index, index))
+        # the older entry gets used, so the other one is the least recently used
+        self.assertIsNotNone(self.cache.get(self.recordings[0]))
+        self.cache.put(self.recordings[2], self.audio)
+        self.assertIsNotNone(self.cache.get(self.recordings[0]))
+        self.assertIsNone(self.cache.get(self.recordings[1]))
+        self.assertIsNotNone(self.cache.get(self.recordings[2]))
+
+    def test_pickle(self):
+        cache = loads(dumps(self.cache))
+        self.assertEqual((cache.folder, cache.max_bytes), (self.cache.folder, self.cache.max_bytes))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from json import dump
+from os.path import join
+from tempfile import TemporaryDirectory
+from benchmarks.synthetic import StubProcessor, synthetic_transcript, synthetic_tree
+from benchmarks.suite import compare, converter_for
+from benchmarks.accuracy import word_error_rate
+from benchmarks.bench_models import is_downloaded, measure_cell, note_body, references, run_cell, spoken_text
+from unittest.mock import patch
+import numpy as np
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_synthetic_transcript(self):
+        text = synthetic_transcript(10_000, seed=1)
+        self.assertEqual(len(text), 10_000)
+        self.assertEqual(text, synthetic_transcript(10_000, seed=1))
+        self.assertIn("Absatz", text)
+
+    def test_synthetic_tree(self):
+        with TemporaryDirectory() as folder:
+            recordings = synthetic_tree(folder, 100)
+            converter = converter_for(folder, StubProcessor(), overwrite_existing=0)
+            self.assertEqual(len(recordings), 95)
+            self.assertEqual(len(converter.plan()), 90)
+
+    def test_word_error_rate(self):
+        self.assertEqual(word_error_rate("Hallo, Welt!", "hallo welt"), 0.0)
+        self.assertEqual(word_error_rate("eins zwei drei vier", "eins zwo drei"), 0.5)
+        self.assertEqual(word_error_rate("", "noise"), 1.0)
+
+    def test_references(self):
+        spoken, formatted = references("recording-without-references.m4a")
+        self.assertTrue(spoken.lstrip().startswith("Überschrift H1   Obsidian"))
+        self.assertTrue(formatted.lstrip().startswith("# Obsidian Speech-to-Text Tool Demonstration"))
+        self.assertEqual(spoken_text('`Listenstrich` "Banane"'), " Listenstrich   Banane ")
+        self.assertEqual(note_body('---\ntags:\n  - Alpha\n---\n![[memo.m4a]]\n# Titel'), "\n# Titel")
+
+    def test_is_downloaded(self):
+        with TemporaryDirectory() as folder:
+            self.assertFalse(is_downloaded("tiny", folder))
+            open(join(folder, "tiny.pt"), "w").close()
+            self.assertTrue(is_downloaded("tiny", folder))
+            self.assertFalse(is_downloaded("huge", folder))
+
+    @patch("benchmarks.bench_models.is_downloaded", return_value=False)
+    def test_measure_cell_skipped(self, is_downloaded_mock):
+        rows = measure_cell("small", "fast", 2, ["a.m4a", "b.m4a"])
+        self.assertListEqual([row["status"] for row in rows], ["skipped: model not downloaded"] * 2)
+        self.assertEqual(rows[0]["threads"], 2)
+
+    @patch("whisper.audio.load_audio", return_value=np.zeros(16000 * 2, dtype=np.float32))
+    @patch("src.processor.Whisper.load_model")
+    def test_run_cell(self, load_model_mock, load_audio_mock):
+        load_model_mock.return_value.transcribe.return_value = {"text": " Überschrift H1 Titel Absatz", "segments": []}
+        with TemporaryDirectory() as folder:
+            recording = join(folder, "memo.m4a")
+            for name, text in [("memo.script.md", "`Überschrift H1` Titel `Absatz`"), ("memo.result.md", "# Titel\n")]:
+                with open(join(folder, name), "w") as f:
+                    f.write(text)
+            with patch("src.processor.Whisper.Whisper.set_threads"):
+                rows = run_cell("tiny", "fast", 1, [recording])
+        self.assertEqual(load_model_mock.return_value.transcribe.call_args[1]["temperature"], (0.0,))
+        self.assertEqual((rows[0]["wer_raw"], rows[0]["wer_formatted"]), (0.0, 0.0))
+        self.assertEqual((rows[0]["audio_seconds"], rows[0]["fallbacks"]), (2.0, 0))
+        self.assertGreater(rows[0]["peak_rss_mb"], 0)
+
+    def test_compare(self):
+        with TemporaryDirectory() as folder:
+            for name, seconds in [("before", 1.0), ("after", 1.5)]:
+                with open(join(folder, f"{name}.json"), "w") as f:
+                    dump({"results": {"format_text/1KB": {"seconds": seconds, "runs": 3}}}, f)
+            self.assertTrue(compare(join(folder, "before.json"), join(folder, "after.json"), 0.2))
+            self.assertFalse(compare(join(folder, "before.json"), join(folder, "after.json"), 0.6))
+            self.assertFalse(compare(join(folder, "after.json"), join(folder, "before.json"), 0.2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from src.Chunker import AudioChunk, find_chunk_bounds, split_audio, stitch_segments, frame_energy
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds: float) -> np.ndarray:
+    return (0.5 * np.sin(np.arange(int(seconds * SAMPLE_RATE)) / 5)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+class TestChunker(unittest.TestCase):
+
+    def test_frame_energy(self):
+        energy = frame_energy(np.concatenate([silence(0.03), tone(0.03)]), 480)
+        self.assertEqual(len(energy), 2)
+        self.assertEqual(energy[0], 0)
+        self.assertGreater(energy[1], 0.3)
+
+    def test_find_chunk_bounds_short(self):
+        self.assertListEqual(find_chunk_bounds(tone(5), 10), [(0, 5 * SAMPLE_RATE)])
+
+    def test_find_chunk_bounds_cuts_at_silence(self):
+        audio = np.concatenate([tone(8), silence(1), tone(8), silence(1), tone(5)])
+        bounds = find_chunk_bounds(audio, 10)
+        self.assertEqual(len(bounds), 3)
+        self.assertEqual(bounds[0][0], 0)
+        self.assertEqual(bounds[-1][1], len(audio))
+        for (start, end), (next_start, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(end, next_start)
+            self.assertLessEqual(end - start, 10 * SAMPLE_RATE)
+        # the cuts are inside the silences
+        self.assertTrue(8 * SAMPLE_RATE <= bounds[0][1] <= 9 * SAMPLE_RATE)
+        self.assertTrue(17 * SAMPLE_RATE <= bounds[1][1] <= 18 * SAMPLE_RATE)
+
+    def test_split_audio(self):
+        audio = np.concatenate([tone(8), silence(1), tone(8)])
+        chunks = split_audio(audio, 10, overlap_seconds=0.5)
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[0].offset, 0)
+        self.assertAlmostEqual(chunks[1].offset, chunks[1].own_start - 0.5)
+        self.assertEqual(chunks[0].own_end, chunks[1].own_start)
+        self.assertEqual(len(chunks[1].audio), len(audio) - int(chunks[1].offset * SAMPLE_RATE))
+
+    def test_stitch_segments(self):
+        chunks = [AudioChunk(0.0, 0.0, 10.0, None), AudioChunk(9.0, 10.0, 18.0, None)]
+        results = [
+            {"segments": [{"start": 0.0, "end": 4.0, "text": " Obsidian Link Start"},
+                          {"start": 4.0, "end": 9.6, "text": " Katzen"},
+                          {"start": 9.6, "end": 10.0, "text": " fotos"}]},
+            {"segments": [{"start": 0.2, "end": 1.0, "text": " fotos"},
+                          {"start": 1.0, "end": 5.0, "text": " Obsidian Link Ende"}]},
+        ]
+        stitched = stitch_segments(chunks, results)
+        self.assertEqual(stitched["text"], " Obsidian Link Start Katzen fotos Obsidian Link Ende")
+        self.assertListEqual([segment["start"] for segment in stitched["segments"]], [0.0, 4.0, 9.6, 10.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
 import unittest
+from os.path import dirname, abspath
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory
 from unittest.mock import patch
 from src.Config import Config
+from src.Governor import ResourceGovernor
 
 
 class TestConfig(unittest.TestCase):
@@ -19,6 +24,13 @@ class TestConfig(unittest.TestCase):
             # Check result
             self.assertDictEqual(result, {'key1': 'value1', 'key2': 'value2'})
 
+    def test_get_mode(self):
+        with patch.dict('os.environ', {'OSTTC_MODE': 'reformat'}):
+            self.assertEqual(self.config.get_mode(), 'reformat')
+        with patch.dict('os.environ', {'OSTTC_MODE': 'unknown'}):
+            with self.assertRaises(ValueError):
+                self.config.get_mode()
+
     def test_get_language(self):
         with patch.dict('os.environ', {'OSTTC_LANGUAGE': 'fr'}):
             # Call method under test
@@ -83,6 +95,169 @@ class TestConfig(unittest.TestCase):
             # Check result
             self.assertListEqual(result, ['.flac', '.ogg'])
 
+    def test_get_workers(self):
+        with patch.dict('os.environ', {'OSTTC_WORKERS': '4'}):
+            # Call method under test
+            result = self.config.get_workers()
+
+            # Check result
+            self.assertEqual(result, 4)
+
+    def test_get_threads(self):
+        with patch.dict('os.environ', {'OSTTC_WORKERS': '4', 'OSTTC_THREADS': '2'}):
+            self.assertEqual(self.config.get_threads(), 2)
+        with patch.dict('os.environ', {'OSTTC_WORKERS': '1', 'OSTTC_THREADS': '0'}):
+            self.assertEqual(self.config.get_threads(), 0)
+        with patch.dict('os.environ', {'OSTTC_WORKERS': '2', 'OSTTC_THREADS': '0'}), \
+                patch('src.Config.cpu_count', return_value=8):
+            self.assertEqual(self.config.get_threads(), 4)
+
+    def test_get_prefetch(self):
+        with patch.dict('os.environ', {'OSTTC_PREFETCH': '3'}):
+            self.assertEqual(self.config.get_prefetch(), 3)
+
+    def test_get_quantize(self):
+        with patch.dict('os.environ', {'OSTTC_QUANTIZE': '1'}):
+            self.assertEqual(self.config.get_quantize(), 1)
+        self.assertEqual(self.config.get_converter().quantize, self.config.quantize)
+
+    def test_get_scheduler(self):
+        with patch.dict('os.environ', {'OSTTC_SCHEDULE': 'longest'}):
+            self.assertEqual(self.config.get_scheduler().policy, 'longest')
+        with patch.dict('os.environ', {'OSTTC_SCHEDULE': 'random'}):
+            with self.assertRaises(ValueError):
+                self.config.get_scheduler()
+
+    def test_get_model_tiers(self):
+        with patch.dict('os.environ', {'OSTTC_MODEL_TIERS': 'medium, 60:tiny,600:small'}):
+            self.assertListEqual(self.config.get_model_tiers(), [(60.0, 'tiny'), (600.0, 'small'), (None, 'medium')])
+        with patch.dict('os.environ', {'OSTTC_ESCALATE_LOGPROB': '-0.8', 'OSTTC_TIME_BUDGET': '3600'}):
+            self.assertEqual(self.config.get_escalate_logprob(), -0.8)
+            self.assertEqual(self.config.get_time_budget(), 3600.0)
+        self.config.model_tiers = [(60.0, 'tiny'), (None, 'base')]
+        converter = self.config.get_converter()
+        self.assertListEqual([whisper.model for whisper in converter.models], ['tiny', 'base'])
+
+    def test_get_batch_size(self):
+        with patch.dict('os.environ', {'OSTTC_BATCH_SIZE': '0'}):
+            self.assertEqual(self.config.get_batch_size(), 1)
+        with patch.dict('os.environ', {'OSTTC_BATCH_SIZE': '8'}):
+            self.assertEqual(self.config.get_batch_size(), 8)
+
+    def test_get_share_model(self):
+        with patch.dict('os.environ', {'OSTTC_SHARE_MODEL': '1'}):
+            self.assertEqual(self.config.get_share_model(), 1)
+
+    def test_get_governor(self):
+        with patch.dict('os.environ', {'OSTTC_MAX_THREADS': '4', 'OSTTC_MAX_RSS': '3000', 'OSTTC_MAX_LOAD': '6'}):
+            governor = self.config.get_governor()
+        self.assertEqual((governor.max_threads, governor.max_rss_mb, governor.max_load), (4, 3000.0, 6.0))
+
+    def test_apply_governor(self):
+        self.config.governor = ResourceGovernor(max_threads=4, max_rss_mb=3000)
+        self.config.model_tiers = [(60.0, 'small'), (None, 'medium')]
+        self.config.workers, self.config.threads, self.config.quantize, self.config.share_model = 2, 0, 0, 0
+        self.config.apply_governor()
+        # medium does not fit next to small, both tiers end up with small
+        self.assertListEqual(self.config.model_tiers, [(None, 'small')])
+        self.assertEqual((self.config.workers, self.config.threads), (1, 4))
+
+    def test_apply_governor_serve(self):
+        self.config.mode, self.config.serve_concurrency, self.config.workers = "serve", 4, 1
+        self.config.model_size, self.config.model_tiers = 'base', []
+        self.config.threads, self.config.quantize, self.config.share_model = 0, 0, 0
+        self.config.governor = ResourceGovernor(max_threads=2)
+        self.config.apply_governor()
+        # the jobs served at once are the worker processes of serve mode
+        self.assertEqual((self.config.serve_concurrency, self.config.threads), (2, 1))
+        self.config.serve_concurrency = 4
+        self.config.governor = ResourceGovernor(max_rss_mb=2500)
+        self.config.apply_governor()
+        self.assertEqual((self.config.serve_concurrency, self.config.model_size), (2, 'base'))
+        self.assertEqual(self.config.workers, 1)
+
+    def test_get_serve(self):
+        with patch.dict('os.environ', {'OSTTC_SERVE_ADDRESS': 'unix:/tmp/osttc.sock', 'OSTTC_SERVE_QUEUE': '0',
+                                       'OSTTC_SERVE_CONCURRENCY': '2'}):
+            self.assertEqual(self.config.get_serve_address(), "unix:/tmp/osttc.sock")
+            self.assertEqual(self.config.get_serve_queue(), 1)
+            self.assertEqual(self.config.get_serve_concurrency(), 2)
+
+    def test_get_audio_cache(self):
+        with patch.dict('os.environ', {'OSTTC_AUDIO_CACHE': ''}):
+            self.assertIsNone(self.config.get_audio_cache())
+        with patch.dict('os.environ', {'OSTTC_AUDIO_CACHE': '/tmp/audio', 'OSTTC_AUDIO_CACHE_SIZE': '1.5'}):
+            audio_cache = self.config.get_audio_cache()
+            self.assertEqual(audio_cache.folder, '/tmp/audio')
+            self.assertEqual(audio_cache.max_bytes, 1536 * 1024)
+
+    def test_get_discovery(self):
+        with patch.dict('os.environ', {'OSTTC_INCLUDE': 'Daily/*, Inbox/*', 'OSTTC_EXCLUDE': ''}):
+            discovery = self.config.get_discovery()
+            self.assertListEqual(discovery.include, ['Daily/*', 'Inbox/*'])
+            self.assertListEqual(discovery.exclude, [])
+        with patch.dict('os.environ', {'OSTTC_INCLUDE': ''}):
+            self.assertListEqual(self.config.get_discovery().exclude, ['.obsidian', '.git', '.trash'])
+
+    def test_get_decoding(self):
+        with patch.dict('os.environ', {'OSTTC_DECODING': 'fast', 'OSTTC_BEAM_SIZE': '', 'OSTTC_TEMPERATURES': '0,0.5',
+                                       'OSTTC_CONDITION_ON_PREVIOUS_TEXT': '1'}):
+            decoding = self.config.get_decoding()
+            self.assertEqual(decoding.name, 'fast*')
+            self.assertDictEqual(decoding.options, {'beam_size': None, 'best_of': None, 'temperature': (0.0, 0.5),
+                                                    'condition_on_previous_text': True})
+        with patch.dict('os.environ', {'OSTTC_DECODING': 'slow'}):
+            with self.assertRaises(ValueError):
+                self.config.get_decoding()
+
+    def test_get_vad(self):
+        with patch.dict('os.environ', {'OSTTC_VAD': '0'}):
+            self.assertIsNone(self.config.get_vad())
+        with patch.dict('os.environ', {'OSTTC_VAD': '1', 'OSTTC_VAD_THRESHOLD': '-50', 'OSTTC_VAD_MIN_SILENCE': '2'}):
+            vad = self.config.get_vad()
+            self.assertEqual(vad.threshold_db, -50.0)
+            self.assertEqual(vad.min_silence, 2.0)
+
+    def test_get_chunk_seconds(self):
+        with patch.dict('os.environ', {'OSTTC_CHUNK_SECONDS': '300'}):
+            self.assertEqual(self.config.get_chunk_seconds(), 300)
+
+    def test_get_chunk_overlap(self):
+        with patch.dict('os.environ', {'OSTTC_CHUNK_OVERLAP': '0.5'}):
+            self.assertEqual(self.config.get_chunk_overlap(), 0.5)
+
+    def test_get_cache_path(self):
+        with patch.dict('os.environ', {'OSTTC_CACHE': ''}):
+            self.assertEqual(self.config.get_cache_path(), '')
+            self.config.cache_path = self.config.get_cache_path()
+            self.assertIsNone(self.config.get_transcript_cache())
+        with patch.dict('os.environ', {'OSTTC_CACHE': './cache.sqlite'}):
+            self.assertEqual(self.config.get_cache_path(), './cache.sqlite')
+            self.config.cache_path = self.config.get_cache_path()
+            self.assertEqual(self.config.get_transcript_cache().path, './cache.sqlite')
+
+    def test_get_manifest(self):
+        with patch.dict('os.environ', {'OSTTC_MANIFEST': ''}):
+            self.assertIsNone(self.config.get_manifest())
+        with patch.dict('os.environ', {'OSTTC_MANIFEST': './manifest.sqlite'}):
+            self.assertEqual(self.config.get_manifest().path, './manifest.sqlite')
+
+    def test_get_leases(self):
+        with patch.dict('os.environ', {'OSTTC_LEASES': ''}):
+            self.assertIsNone(self.config.get_leases())
+        with patch.dict('os.environ', {'OSTTC_LEASES': '/data/.osttc-leases', 'OSTTC_LEASE_SECONDS': '60'}):
+            leases = self.config.get_leases()
+            self.assertEqual(leases.folder, '/data/.osttc-leases')
+            self.assertEqual(leases.seconds, 60.0)
+
+    def test_get_watch_interval(self):
+        with patch.dict('os.environ', {'OSTTC_WATCH_INTERVAL': '2.5'}):
+            self.assertEqual(self.config.get_watch_interval(), 2.5)
+
+    def test_get_watch_debounce(self):
+        with patch.dict('os.environ', {'OSTTC_WATCH_DEBOUNCE': '4'}):
+            self.assertEqual(self.config.get_watch_debounce(), 4.0)
+
     def test_get_converter(self):
         # Call method under test
         result = self.config.get_converter()
@@ -93,6 +268,17 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(result.model, self.config.model_size)
         self.assertDictEqual(result.actions, self.config.action_keywords)
 
+    def test_nothing_to_do_imports_no_torch(self):
+        script = "\n".join([
+            "import sys, runpy",
+            "runpy.run_path('main.py', run_name='__main__')",
+            "print(','.join(sorted({m.split('.')[0] for m in sys.modules} & {'torch', 'whisper'})))",
+        ])
+        with TemporaryDirectory() as folder:
+            result = run([executable, "-c", script, "--kwargs", f"PATH={folder}", "CACHE=", "MANIFEST="],
+                         cwd=dirname(dirname(abspath(__file__))), capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "")
+
 
 if __name__ == '__main__':
     unittest.main()
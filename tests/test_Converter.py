@@ -1,17 +1,24 @@
 import unittest
-from unittest.mock import Mock, patch
+from os import listdir, utime
+from os.path import join, exists, basename
+from json import loads
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from time import sleep, time
+from unittest.mock import patch
 from src.Converter import ObsidianSpeechToTextConverter
+from src.Manifest import Manifest, ManifestEntry, STATUS_DONE, STATUS_FAILED, STATUS_IN_PROGRESS, STATUS_PENDING, \
+    STATUS_SILENT
+from src.Lease import Leases
+from src.Metrics import Metrics
+from src.Scheduler import Scheduler
+from src.Discovery import Discovery
+from tests.helpers import StubAudioTextProcessor, fake_config
 
 
 class TestObsidianSpeechToTextConverter(unittest.TestCase):
     def setUp(self):
-        self.mock_config = Mock()
-        self.mock_config.path = "/test/path"
-        self.mock_config.overwrite_existing = False
-        self.mock_config.media_files = [".wav", ".mp3"]
-        self.mock_config.source_string = "%Y_%m_%d_%H_%M_%S"
-        self.mock_config.target_string = "%Y-%m-%d-%H-%M-%S"
-        self.mock_config.converter = Mock()
+        self.mock_config = fake_config(path="/test/path")
 
         self.converter = ObsidianSpeechToTextConverter(self.mock_config)
 
@@ -28,6 +35,349 @@ class TestObsidianSpeechToTextConverter(unittest.TestCase):
         with self.assertRaises(Exception):
             self.converter.convert()
 
+    def test_get_pending_files(self):
+        with TemporaryDirectory() as folder:
+            for name in ["2020_01_01_10_00_00.wav", "2020_01_01_11_00_00.mp3", "notes.txt"]:
+                open(join(folder, name), "w").close()
+            open(join(folder, "2020-01-01-11-00-00"), "w").close()
+            self.converter.input_folder = folder
+            result = sorted(self.converter.get_pending_files())
+        self.assertListEqual(result, [(join(folder, "2020_01_01_10_00_00.wav"), join(folder, "2020-01-01-10-00-00"))])
+
+    def test_convert_parallel(self):
+        with TemporaryDirectory() as folder:
+            for name in ["2020_01_01_10_00_00.wav", "broken.wav", "2020_01_01_12_00_00.mp3"]:
+                open(join(folder, name), "w").close()
+            self.converter.input_folder = folder
+            self.converter.active_model = StubAudioTextProcessor()
+            self.converter.workers = 2
+            self.converter.metrics = Metrics(join(folder, "metrics.jsonl"), join(folder, "osttc.prom"))
+            self.converter.convert()
+            with open(join(folder, "2020-01-01-10-00-00")) as f:
+                self.assertEqual(f.read(), f"transcribed {join(folder, '2020_01_01_10_00_00.wav')}")
+            self.assertTrue(exists(join(folder, "2020-01-01-12-00-00")))
+            self.assertFalse(exists(join(folder, "broken.md")))
+
+            with open(join(folder, "metrics.jsonl")) as f:
+                records = {basename(record["file"]): record for record in map(loads, f)}
+            self.assertEqual(records["broken.wav"]["status"], STATUS_FAILED)
+            # measured in the worker processes
+            self.assertEqual(records["2020_01_01_10_00_00.wav"]["audio_seconds"], 10.0)
+            self.assertGreater(records["2020_01_01_10_00_00.wav"]["peak_rss_mb"], 0)
+            self.assertIn("write", records["2020_01_01_10_00_00.wav"])
+            with open(join(folder, "osttc.prom")) as f:
+                prometheus = f.read()
+            self.assertIn('osttc_files{status="done"} 2', prometheus)
+            self.assertIn('osttc_stage_seconds_count{stage="discovery"} 1', prometheus)
+
+    def test_convert_parallel_chunked(self):
+        with TemporaryDirectory() as folder:
+            for name in ["chunked.wav", "broken.wav", "2020_01_01_12_00_00.mp3"]:
+                open(join(folder, name), "w").close()
+            self.converter.input_folder = folder
+            self.converter.active_model = StubAudioTextProcessor()
+            self.converter.workers = 2
+            self.converter.chunk_seconds = 30
+            self.converter.convert()
+            with open(join(folder, "chunked.md")) as f:
+                self.assertEqual(f.read(), " chunk 1 chunk 2 chunk 3")
+            self.assertTrue(exists(join(folder, "2020-01-01-12-00-00")))
+            self.assertFalse(exists(join(folder, "broken.md")))
+
+    def test_convert_scheduled(self):
+        with TemporaryDirectory() as folder:
+            sizes = {"2020_01_01_10_00_00.wav": 10, "2020_01_01_11_00_00.wav": 30, "2020_01_01_12_00_00.wav": 20}
+            for name, size in sizes.items():
+                with open(join(folder, name), "w") as f:
+                    f.write("x" * size)
+            self.converter.input_folder = folder
+            self.converter.scheduler = Scheduler("longest", lambda audio_file: float(sizes[basename(audio_file)]))
+            self.mock_config.converter.transcribe.return_value = "text"
+            self.converter.convert()
+            transcribed = [basename(call.args[0]) for call in self.mock_config.converter.transcribe.call_args_list]
+            self.assertListEqual(transcribed, ["2020_01_01_11_00_00.wav", "2020_01_01_12_00_00.wav",
+                                               "2020_01_01_10_00_00.wav"])
+            self.assertDictEqual(self.converter.scheduler.remaining, {})
+
+    def test_convert_pipelined(self):
+        with TemporaryDirectory() as folder:
+            for name in ["2020_01_01_10_00_00.wav", "2020_01_01_11_00_00.wav", "2020_01_01_12_00_00.wav"]:
+                open(join(folder, name), "w").close()
+            self.converter.input_folder = folder
+            self.converter.prefetch = 2
+            model = self.mock_config.converter
+            model.load_audio.side_effect = lambda audio_file: f"pcm {audio_file[-12:]}"
+            model.get_transcript.side_effect = lambda audio_file, audio: {"text": audio}
+            model.format_transcript.side_effect = lambda transcript, audio_file: transcript["text"].upper()
+            self.converter.convert()
+            with open(join(folder, "2020-01-01-11-00-00")) as f:
+                self.assertEqual(f.read(), "PCM 11_00_00.WAV")
+            self.assertEqual(model.load_audio.call_count, 3)
+            model.transcribe.assert_not_called()
+
+            model.load_audio.side_effect = Exception("ffmpeg failed")
+            self.converter.overwrite_existing = True
+            with self.assertRaises(Exception):
+                self.converter.convert()
+
+    def test_convert_pipelined_write_fails(self):
+        with TemporaryDirectory() as folder:
+            for hour in range(10, 15):
+                open(join(folder, f"2020_01_01_{hour}_00_00.wav"), "w").close()
+            manifest = Manifest(join(folder, "manifest.sqlite"))
+            self.converter.input_folder = folder
+            self.converter.manifest = manifest
+            self.converter.prefetch = 1
+            model = self.mock_config.converter
+            model.load_audio.side_effect = lambda audio_file: audio_file
+            # slower than writing, the writer fails before the next transcript is done
+            model.get_transcript.side_effect = lambda audio_file, audio: sleep(0.05) or {"text": audio}
+            model.format_transcript.side_effect = lambda transcript, audio_file: transcript["text"]
+            with patch.object(self.converter, "create_transcription_file", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    self.converter.convert()
+            # the run stopped at the failed write instead of transcribing everything else first
+            self.assertLess(model.get_transcript.call_count, 5)
+            statuses = [entry.status for entry in manifest.load().values()]
+            self.assertIn(STATUS_FAILED, statuses)
+            self.assertNotIn(STATUS_DONE, statuses)
+            self.assertNotIn(STATUS_IN_PROGRESS, statuses)
+            manifest.close()
+
+    def test_convert_batched(self):
+        with TemporaryDirectory() as folder:
+            names = ["2020_01_01_10_00_00.wav", "2020_01_01_11_00_00.wav", "2020_01_01_12_00_00.wav",
+                     "2020_01_01_13_00_00.wav"]
+            for name in names:
+                open(join(folder, name), "w").close()
+            self.converter.input_folder = folder
+            self.converter.batch_size = 2
+            model = self.mock_config.converter
+            model.load_audio.side_effect = lambda audio_file: audio_file[-12:-4]
+            # the 12 o'clock recording is too long for a batch
+            model.can_batch.side_effect = lambda audio: audio != "12_00_00"
+            model.get_transcripts.side_effect = lambda audio_files, audios: [{"text": audio} for audio in audios]
+            model.get_transcript.side_effect = lambda audio_file, audio: {"text": audio}
+            model.format_transcript.side_effect = lambda transcript, audio_file: transcript["text"]
+            self.converter.convert()
+            for name, expected in [("2020-01-01-10-00-00", "10_00_00"), ("2020-01-01-12-00-00", "12_00_00"),
+                                   ("2020-01-01-13-00-00", "13_00_00")]:
+                with open(join(folder, name)) as f:
+                    self.assertEqual(f.read(), expected)
+            batches = sorted(len(call.args[0]) for call in model.get_transcripts.call_args_list)
+            self.assertListEqual(batches, [2])
+            self.assertEqual(model.get_transcript.call_count, 2)
+            model.transcribe.assert_not_called()
+
+    def test_convert_batched_decode_fails(self):
+        with TemporaryDirectory() as folder:
+            names = [f"2020_01_01_{hour}_00_00.wav" for hour in range(10, 16)]
+            for name in names:
+                open(join(folder, name), "w").close()
+            manifest = Manifest(join(folder, "manifest.sqlite"))
+            leases = Leases(join(folder, "leases"), folder)
+            self.converter.input_folder = folder
+            self.converter.manifest = manifest
+            self.converter.leases = leases
+            self.converter.batch_size = 3
+
+            def load_audio(audio_file):
+                if "11_00_00" in audio_file:
+                    raise Exception("ffmpeg failed")
+                return audio_file
+
+            model = self.mock_config.converter
+            model.load_audio.side_effect = load_audio
+            model.can_batch.return_value = True
+            with patch.object(leases, "release", wraps=leases.release) as release_mock:
+                with self.assertRaises(Exception):
+                    self.converter.convert()
+            statuses = {basename(path): entry.status for path, entry in manifest.load().items()}
+            self.assertEqual(statuses.pop(names[1]), STATUS_FAILED)
+            # the one waiting in the batch and the ones decoded ahead are left for the next run
+            self.assertEqual(statuses[names[0]], STATUS_PENDING)
+            self.assertNotIn(STATUS_IN_PROGRESS, statuses.values())
+            released = {basename(call.args[0]) for call in release_mock.call_args_list}
+            self.assertLessEqual({names[0], names[1]}, released)
+            model.get_transcripts.assert_not_called()
+            manifest.close()
+
+    def test_convert_parallel_chunked_throttles(self):
+        with TemporaryDirectory() as folder:
+            for hour in range(10, 15):
+                open(join(folder, f"2020_01_01_{hour}_00_00.wav"), "w").close()
+            processor = StubAudioTextProcessor()
+            processor.release.clear()
+            self.converter.input_folder = folder
+            self.converter.active_model = processor
+            self.converter.workers = 2
+            self.converter.chunk_seconds = 30
+            waits = []
+            with patch.object(self.converter.governor, "wait", side_effect=lambda stop=None: waits.append(stop) or 0.0):
+                thread = Thread(target=self.converter.convert)
+                thread.start()
+                try:
+                    sleep(0.3)
+                    # the governor is asked before every file, not for the whole backlog up front
+                    self.assertEqual((len(waits), self.converter.started), (2, 2))
+                finally:
+                    processor.release.set()
+                    thread.join()
+            self.assertEqual(len(waits), 5)
+            self.assertEqual(self.converter.metrics.files, {"done": 5})
+
+    def test_convert_streaming(self):
+        class StreamingProcessor(StubAudioTextProcessor):
+            streams_notes = True
+
+            def transcribe_to(self, audio_file, writer):
+                writer.write("Hallo")
+                # the note only shows up once it is complete
+                assert not exists(writer.out_file)
+                if "12_00_00" in audio_file:
+                    raise Exception("broken recording")
+                writer.write(" Welt")
+                writer.header = "---\ntags:\n  - Katzen\n---\n"
+
+        with TemporaryDirectory() as folder:
+            for name in ["2020_01_01_10_00_00.wav", "2020_01_01_12_00_00.wav"]:
+                open(join(folder, name), "w").close()
+            self.converter.input_folder = folder
+            self.converter.active_model = StreamingProcessor()
+            self.converter.scheduler = Scheduler("longest", probe=lambda audio_file: 1 if "12_00_00" in audio_file else 2)
+            with self.assertRaises(Exception):
+                self.converter.convert()
+            with open(join(folder, "2020-01-01-10-00-00")) as f:
+                self.assertEqual(f.read(), "---\ntags:\n  - Katzen\n---\nHallo Welt")
+            # the broken recording left no half written note behind
+            self.assertListEqual(sorted(listdir(folder)), ["2020-01-01-10-00-00", "2020_01_01_10_00_00.wav",
+                                                           "2020_01_01_12_00_00.wav"])
+            self.assertEqual(self.converter.metrics.files, {"done": 1, "failed": 1})
+
+    def test_convert_streams_discovery(self):
+        events = []
+
+        class RecordingDiscovery(Discovery):
+            def walk(self, folder):
+                for audio_file in super().walk(folder):
+                    events.append(f"found {basename(audio_file)}")
+                    yield audio_file
+
+        class RecordingProcessor(StubAudioTextProcessor):
+            def transcribe(self, audio_file, map_function=map):
+                events.append(f"transcribe {basename(audio_file)}")
+                return super().transcribe(audio_file, map_function)
+
+        with TemporaryDirectory() as folder:
+            for name in ["2020_01_01_10_00_00.wav", "2020_01_01_11_00_00.wav", "notes.md"]:
+                open(join(folder, name), "w").close()
+            self.converter.input_folder = folder
+            self.converter.discovery = RecordingDiscovery([".wav"])
+            self.converter.active_model = RecordingProcessor()
+            self.converter.convert()
+        # the first recording got transcribed before the second one was found
+        self.assertListEqual(events, [
+            "found 2020_01_01_10_00_00.wav", "transcribe 2020_01_01_10_00_00.wav",
+            "found 2020_01_01_11_00_00.wav", "transcribe 2020_01_01_11_00_00.wav",
+        ])
+        self.assertEqual(self.converter.started, 2)
+        self.assertEqual(self.converter.metrics.files, {"done": 2})
+
+    def test_convert_with_manifest(self):
+        with TemporaryDirectory() as folder:
+            for name in ["2020_01_01_10_00_00.wav", "2020_01_01_11_00_00.wav"]:
+                open(join(folder, name), "w").close()
+            manifest = Manifest(join(folder, "manifest.sqlite"))
+            self.converter.input_folder = folder
+            self.converter.manifest = manifest
+            self.mock_config.converter.transcribe.side_effect = Exception("broken recording")
+            with self.assertRaises(Exception):
+                self.converter.convert()
+            entries = manifest.load()
+            failed = [entry for entry in entries.values() if entry.status == STATUS_FAILED]
+            self.assertEqual(len(failed), 1)
+            # files are transcribed as they are found, the run stopped before finding the second one
+            pending = join(folder, "2020_01_01_11_00_00.wav")
+            self.assertNotIn(pending, entries)
+
+            # a run that got killed while a file was in progress
+            manifest.update([ManifestEntry(pending, 0, 0.0, join(folder, "2020-01-01-11-00-00"), STATUS_IN_PROGRESS)])
+            self.mock_config.converter.transcribe.reset_mock(side_effect=True)
+            self.mock_config.converter.transcribe.return_value = "transcription"
+            self.converter.convert()
+            self.mock_config.converter.transcribe.assert_called_once_with(pending)
+            self.assertEqual(manifest.load()[pending].status, STATUS_DONE)
+
+            # nothing changed, nothing to plan
+            self.assertListEqual(self.converter.plan(), [])
+            with open(failed[0].path, "w") as f:
+                f.write("fixed")
+            self.assertListEqual(self.converter.plan(), [(failed[0].path, failed[0].out_file)])
+            manifest.close()
+
+    def test_convert_silent(self):
+        with TemporaryDirectory() as folder:
+            for name in ["2020_01_01_00_00_00.wav", "2020_01_01_11_00_00.wav"]:
+                open(join(folder, name), "w").close()
+            manifest = Manifest(join(folder, "manifest.sqlite"))
+            self.converter.input_folder = folder
+            self.converter.manifest = manifest
+            self.converter.active_model = StubAudioTextProcessor()
+            self.converter.convert()
+            silent = join(folder, "2020_01_01_00_00_00.wav")
+            self.assertEqual(manifest.load()[silent].status, STATUS_SILENT)
+            self.assertFalse(exists(join(folder, "2020-01-01-00-00-00")))
+            self.assertTrue(exists(join(folder, "2020-01-01-11-00-00")))
+            self.assertEqual(self.converter.metrics.files, {"done": 1, "silent": 1})
+            self.assertEqual(self.converter.metrics.silence_seconds, 4.0)
+            # silent recordings are not decoded again
+            self.assertListEqual(self.converter.plan(), [])
+            manifest.close()
+
+    def test_watch(self):
+        with TemporaryDirectory() as folder:
+            self.converter.input_folder = folder
+            def transcribe(audio_file):
+                if "11_00" in audio_file:
+                    raise Exception("broken recording")
+                return "transcription"
+
+            self.mock_config.converter.transcribe.side_effect = transcribe
+            stop = Event()
+            thread = Thread(target=self.converter.watch, args=(stop,))
+            thread.start()
+            for name in ["2020_01_01_10_00_00.wav", "2020_01_01_11_00_00.wav"]:
+                with open(join(folder, name), "w") as f:
+                    f.write("audio")
+                utime(join(folder, name), (time() - 5, time() - 5))
+            for _ in range(50):
+                if exists(join(folder, "2020-01-01-10-00-00")):
+                    break
+                sleep(0.1)
+            sleep(0.3)
+            stop.set()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertTrue(exists(join(folder, "2020-01-01-10-00-00")))
+        self.mock_config.converter.init_model.assert_called_once()
+        # the failing recording is not retried until it changes
+        self.assertEqual(self.mock_config.converter.transcribe.call_count, 2)
+
+    def test_reformat(self):
+        with TemporaryDirectory() as folder:
+            for name in ["2020_01_01_10_00_00.wav", "2020_01_01_11_00_00.wav", "2020-01-01-10-00-00"]:
+                open(join(folder, name), "w").close()
+            self.converter.input_folder = folder
+            self.converter.mode = "reformat"
+            self.mock_config.converter.reformat.side_effect = lambda audio_file: (
+                "reformatted" if audio_file.endswith("10_00_00.wav") else None
+            )
+            self.converter.run()
+            with open(join(folder, "2020-01-01-10-00-00")) as f:
+                self.assertEqual(f.read(), "reformatted")
+            self.assertFalse(exists(join(folder, "2020-01-01-11-00-00")))
+        self.mock_config.converter.transcribe.assert_not_called()
+
     def test_transcribe(self):
         test_audio_file = "test_audio_file"
         self.mock_config.converter.transcribe.return_value = "transcription"
@@ -0,0 +1,41 @@
+import unittest
+from src.Decoding import DecodingSettings, DEFAULT_TEMPERATURES
+
+
+class TestDecodingSettings(unittest.TestCase):
+
+    def test_presets(self):
+        self.assertEqual(DecodingSettings().options["temperature"], DEFAULT_TEMPERATURES)
+        self.assertFalse(DecodingSettings("fast").can_fall_back)
+        self.assertEqual(DecodingSettings("accurate").batch_options(), {"beam_size": 5})
+        with self.assertRaises(ValueError):
+            DecodingSettings("fastest")
+
+    def test_overrides(self):
+        decoding = DecodingSettings("accurate", beam_size=0, best_of=5, condition_on_previous_text=False)
+        # options equal to the preset are no change
+        self.assertDictEqual(decoding.overrides, {"beam_size": None, "condition_on_previous_text": False})
+        self.assertEqual(decoding.name, "accurate*")
+        self.assertEqual(DecodingSettings("accurate", best_of=5).name, "accurate")
+
+    def test_get_cache_options(self):
+        # transcripts cached before there were presets used the balanced options
+        self.assertDictEqual(DecodingSettings().get_cache_options(), {})
+        self.assertDictEqual(DecodingSettings("balanced", temperature=[0, 0.5]).get_cache_options(),
+                             {"temperature": (0.0, 0.5)})
+        self.assertDictEqual(DecodingSettings("accurate").get_cache_options(), {"beam_size": 5, "best_of": 5})
+
+    def test_count_fallbacks(self):
+        segments = [
+            {"seek": 0, "temperature": 0.0},
+            {"seek": 3000, "temperature": 0.4},
+            {"seek": 3000, "temperature": 0.4},
+            {"seek": 6000, "temperature": 1.0},
+        ]
+        self.assertEqual(DecodingSettings().count_fallbacks(segments), 2 + 5)
+        self.assertEqual(DecodingSettings(temperature=[0.0, 0.5, 1.0]).count_fallbacks(segments), 1 + 2)
+        self.assertEqual(DecodingSettings().count_fallbacks([]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from os import makedirs, symlink
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+from src.Discovery import Discovery
+
+
+class TestDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = TemporaryDirectory()
+        for path in ["memo.m4a", "note.md", "README", "Daily/2020_01_01.m4a", "Daily/2020_01_01.md",
+                     "Daily/Archive/old.m4a", "Attachments/scan.png", "Attachments/voice.m4a",
+                     ".obsidian/plugins/sound.m4a", ".git/objects/ab", ".trash/deleted.m4a"]:
+            makedirs(join(self.folder.name, path.rpartition("/")[0]), exist_ok=True)
+            open(join(self.folder.name, path), "w").close()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def walk(self, discovery):
+        return [path[len(self.folder.name) + 1:] for path in discovery.walk(self.folder.name)]
+
+    def test_walk(self):
+        discovery = Discovery([".m4a", ".wav"])
+        # top down, the files of a folder come before its sub-folders
+        self.assertListEqual(self.walk(discovery), [
+            "memo.m4a", "Attachments/voice.m4a", "Daily/2020_01_01.m4a", "Daily/Archive/old.m4a",
+        ])
+        self.assertDictEqual(dict(discovery.skipped), {".md": 2, "": 1, ".png": 1})
+        self.assertEqual(discovery.excluded_folders, 3)
+
+    def test_exclude(self):
+        discovery = Discovery([".m4a"], exclude=["Attachments", "Daily/Arch*", "memo.*"])
+        # replacing the default patterns enters the folders of obsidian again
+        self.assertListEqual(self.walk(discovery), [".obsidian/plugins/sound.m4a", ".trash/deleted.m4a",
+                                                    "Daily/2020_01_01.m4a"])
+        self.assertEqual((discovery.excluded_files, discovery.excluded_folders), (1, 2))
+
+    def test_include(self):
+        discovery = Discovery([".m4a"], include=["Daily/*"])
+        self.assertListEqual(self.walk(discovery), ["Daily/2020_01_01.m4a", "Daily/Archive/old.m4a"])
+        self.assertEqual(discovery.excluded_files, 2)
+
+    def test_symlink(self):
+        symlink(join(self.folder.name, "Daily"), join(self.folder.name, "Linked"))
+        self.assertNotIn("Linked/2020_01_01.m4a", self.walk(Discovery([".m4a"])))
+
+    @patch("src.Discovery.info")
+    def test_report(self, info_mock):
+        discovery = Discovery([".m4a"], exclude=[])
+        list(discovery.walk(self.folder.name))
+        discovery.report()
+        info_mock.assert_called_once_with("Skipped 5 file(s) without a media extension (no extension 2, .md 2, .png 1)")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from threading import Event
+from unittest.mock import patch
+from src.Governor import ResourceGovernor, smaller_model
+
+
+class TestResourceGovernor(unittest.TestCase):
+
+    def test_smaller_model(self):
+        self.assertEqual(smaller_model("medium"), "small")
+        self.assertEqual(smaller_model("small.en"), "base.en")
+        self.assertEqual(smaller_model("tiny"), "tiny")
+
+    def test_no_limits(self):
+        governor = ResourceGovernor()
+        self.assertFalse(governor.is_limited)
+        self.assertEqual(governor.fit_memory(["large"], 8), (["large"], 8))
+        self.assertEqual(governor.fit_threads(8, 0), (8, 0))
+        self.assertEqual(governor.wait(), 0.0)
+
+    def test_fit_threads(self):
+        governor = ResourceGovernor(max_threads=4)
+        # a single worker gets every allowed thread instead of the torch default of all cores
+        self.assertEqual(governor.fit_threads(1, 0), (1, 4))
+        self.assertEqual(governor.fit_threads(3, 8), (3, 1))
+        self.assertEqual(governor.fit_threads(6, 2), (4, 1))
+
+    def test_estimate_rss(self):
+        governor = ResourceGovernor()
+        self.assertEqual(governor.estimate_rss_mb(["medium"]), 4100)
+        self.assertEqual(governor.estimate_rss_mb(["medium"], workers=2), 8200)
+        # shared weights are paid once
+        self.assertEqual(governor.estimate_rss_mb(["medium"], workers=2, share_model=True), 4100 + 4100 - 3076)
+        # tiers stay loaded side by side, the same model only once
+        self.assertEqual(governor.estimate_rss_mb(["base", "small"]), 1000 + 1800 - 560)
+        self.assertEqual(governor.estimate_rss_mb(["small", "small"]), 1800)
+        self.assertLess(governor.estimate_rss_mb(["medium"], quantize=True), 4100)
+
+    def test_fit_rss(self):
+        governor = ResourceGovernor(max_rss_mb=4500)
+        # workers go first
+        self.assertEqual(governor.fit_memory(["medium"], 4), (["medium"], 1))
+        self.assertEqual(governor.fit_memory(["small"], 4), (["small"], 2))
+        self.assertEqual(governor.fit_memory(["large"], 1), (["medium"], 1))
+        # the largest tier gets smaller until all of them fit
+        self.assertEqual(governor.fit_memory(["base", "medium"], 1)[0], ["base", "small"])
+        with patch("src.Governor.warning") as warning_mock:
+            self.assertEqual(ResourceGovernor(max_rss_mb=100).fit_memory(["small"], 1)[0], ["tiny"])
+        warning_mock.assert_called_once()
+
+    def test_wait(self):
+        governor = ResourceGovernor(max_load=2.0, interval=0.01)
+        loads = iter([3.5, 3.0, 2.5, 1.5])
+        with patch.object(governor, "get_load", side_effect=lambda: next(loads)):
+            self.assertGreater(governor.wait(), 0)
+        self.assertEqual(governor.pauses, 1)
+        with patch.object(governor, "get_load", return_value=1.0):
+            self.assertEqual(governor.wait(), 0.0)
+        stop = Event()
+        stop.set()
+        with patch.object(governor, "get_load", return_value=9.0):
+            governor.wait(stop)
+        self.assertEqual(governor.pauses, 2)
+
+    def test_report(self):
+        governor = ResourceGovernor(max_load=2.0)
+        governor.throttled, governor.pauses = 30.0, 2
+        with patch("src.Governor.info") as info_mock:
+            governor.report(10, 90.0)
+        self.assertIn("Throttled 2 time(s) for 30.0 of 90.0 seconds", info_mock.call_args[0][0])
+        self.assertIn("6.7 files/minute overall, 10.0 files/minute while running", info_mock.call_args[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from collections import Counter
+from multiprocessing import Process
+from os import listdir, rename, stat, utime
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import sleep, time
+from unittest.mock import patch
+from src.Converter import ObsidianSpeechToTextConverter
+from src.Lease import Leases
+from tests.helpers import StubAudioTextProcessor, fake_config
+
+
+def run_instance(folder: str, leases_folder: str, log_file: str, workers: int = 1, chunk_seconds: int = 0) -> None:
+    config = fake_config(path=folder, media_files=[".wav"], target_string="%Y-%m-%d-%H-%M-%S.md",
+                         leases=Leases(leases_folder, folder, 10), workers=workers, chunk_seconds=chunk_seconds,
+                         converter=StubAudioTextProcessor(log_file, latency=0.05))
+    ObsidianSpeechToTextConverter(config).convert()
+
+
+class TestLeases(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = TemporaryDirectory()
+        self.leases_folder = join(self.folder.name, "leases")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_claim_and_release(self):
+        first = Leases(self.leases_folder, self.folder.name, owner="first")
+        second = Leases(self.leases_folder, self.folder.name, owner="second")
+        audio_file = join(self.folder.name, "a.wav")
+        self.assertTrue(first.claim(audio_file))
+        self.assertFalse(second.claim(audio_file))
+        self.assertEqual(first.read(first.get_path(audio_file))["owner"], "first")
+        first.release(audio_file)
+        self.assertTrue(second.claim(audio_file))
+        second.close()
+        first.close()
+        self.assertListEqual(listdir(self.leases_folder), [])
+        self.assertEqual((second.claimed, first.busy), (1, 0))
+
+    def test_take_over_expired(self):
+        crashed = Leases(self.leases_folder, self.folder.name, seconds=60, owner="crashed")
+        other = Leases(self.leases_folder, self.folder.name, owner="other")
+        audio_file = join(self.folder.name, "a.wav")
+        self.assertTrue(crashed.claim(audio_file))
+        self.assertFalse(other.claim(audio_file))
+        # the lifetime of the holder counts
+        path = crashed.get_path(audio_file)
+        utime(path, (time() - 61, time() - 61))
+        self.assertTrue(other.claim(audio_file))
+        self.assertEqual(other.taken_over, 1)
+        self.assertEqual(other.read(path)["owner"], "other")
+        # the crashed instance coming back does not remove the lease of the other one
+        crashed.close()
+        self.assertEqual(listdir(self.leases_folder), [f"{path.rsplit('/', 1)[1]}"])
+        other.close()
+
+    def test_heartbeat(self):
+        holder = Leases(self.leases_folder, self.folder.name, seconds=0.3, owner="holder")
+        other = Leases(self.leases_folder, self.folder.name, seconds=0.3, owner="other")
+        audio_file = join(self.folder.name, "a.wav")
+        self.assertTrue(holder.claim(audio_file))
+        sleep(0.6)
+        # renewed meanwhile
+        self.assertFalse(other.claim(audio_file))
+        holder.close()
+        self.assertTrue(other.claim(audio_file))
+        other.close()
+
+    def test_renew_lost_meanwhile(self):
+        holder = Leases(self.leases_folder, self.folder.name, seconds=60, owner="holder")
+        other = Leases(self.leases_folder, self.folder.name, seconds=60, owner="other")
+        audio_file = join(self.folder.name, "a.wav")
+        self.assertTrue(holder.claim(audio_file))
+        path = holder.get_path(audio_file)
+        modified = time() - 30
+
+        def take_over(target, *args):
+            # the other instance takes the lease over right after the holder checked it is still its own
+            rename(path, f"{path}.stale")
+            self.assertTrue(other.create(path, audio_file))
+            utime(path, (modified, modified))
+            utime(target, *args)
+
+        with patch("src.Lease.utime", side_effect=take_over):
+            holder.renew()
+        self.assertDictEqual(holder.held, {})
+        self.assertEqual(other.read(path)["owner"], "other")
+        # the lease of the other instance was not refreshed by the holder
+        self.assertAlmostEqual(stat(path).st_mtime, modified, places=3)
+        holder.close()
+        self.assertEqual(other.read(path)["owner"], "other")
+
+    def share_folder(self, workers: int = 1, chunk_seconds: int = 0) -> None:
+        folder = self.folder.name
+        recordings = [f"2020_01_01_10_{minute:02d}_00.wav" for minute in range(12)]
+        for name in recordings:
+            open(join(folder, name), "w").close()
+        log_files = [join(folder, f"transcribed{index}.log") for index in range(3)]
+        instances = [Process(target=run_instance, args=(folder, self.leases_folder, log_file, workers, chunk_seconds))
+                     for log_file in log_files]
+        for instance in instances:
+            instance.start()
+        for instance in instances:
+            instance.join()
+        transcribed = Counter()
+        for log_file in log_files:
+            with open(log_file) as f:
+                files = f.read().split()
+            # no instance claimed everything up front
+            self.assertGreater(len(files), 0)
+            transcribed.update(files)
+        self.assertEqual(sorted(transcribed), [join(folder, name) for name in recordings])
+        self.assertEqual(set(transcribed.values()), {1})
+        notes = [name for name in listdir(folder) if name.endswith(".md")]
+        self.assertEqual(len(notes), len(recordings))
+        self.assertEqual(listdir(self.leases_folder), [])
+
+    def test_instances_share_folder(self):
+        self.share_folder()
+
+    def test_instances_share_folder_chunked(self):
+        self.share_folder(workers=2, chunk_seconds=30)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from src.Manifest import Manifest, ManifestEntry, STATUS_PENDING, STATUS_DONE, STATUS_IN_PROGRESS
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = TemporaryDirectory()
+        self.manifest = Manifest(join(self.folder.name, "manifest.sqlite"))
+
+    def tearDown(self):
+        self.manifest.close()
+        self.folder.cleanup()
+
+    def test_update_and_load(self):
+        self.assertDictEqual(self.manifest.load(), {})
+        entry = ManifestEntry("a.wav", 10, 1.5, "a.md", STATUS_PENDING)
+        self.manifest.update([entry])
+        self.assertDictEqual(self.manifest.load(), {"a.wav": entry})
+
+    def test_set_status(self):
+        self.manifest.update([ManifestEntry("a.wav", 10, 1.5, "a.md", STATUS_PENDING),
+                              ManifestEntry("b.wav", 10, 1.5, "b.md", STATUS_PENDING)])
+        self.manifest.set_status("a.wav", STATUS_IN_PROGRESS)
+        self.manifest.set_status("b.wav", STATUS_DONE)
+        self.assertEqual(self.manifest.load()["a.wav"].status, STATUS_IN_PROGRESS)
+        self.assertDictEqual(self.manifest.get_status_counts(), {STATUS_IN_PROGRESS: 1, STATUS_DONE: 1})
+
+    def test_is_unchanged(self):
+        entry = ManifestEntry("a.wav", 10, 1.5, "a.md", STATUS_DONE)
+        self.assertTrue(entry.is_unchanged(10, 1.5))
+        self.assertFalse(entry.is_unchanged(11, 1.5))
+        self.assertFalse(entry.is_unchanged(10, 2.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
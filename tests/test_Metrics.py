@@ -0,0 +1,64 @@
+import unittest
+from json import loads
+from os.path import exists, join
+from tempfile import TemporaryDirectory
+from src.Metrics import Metrics, percentile, process_memory_mb
+from tests.helpers import StubAudioTextProcessor
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 0.5), 0.0)
+        self.assertEqual(percentile([3.0], 0.95), 3.0)
+        self.assertEqual(percentile([4.0, 1.0, 3.0, 2.0, 5.0], 0.5), 3.0)
+        self.assertAlmostEqual(percentile([float(value) for value in range(1, 101)], 0.95), 95.05)
+
+    def test_process_memory_mb(self):
+        self.assertDictEqual(process_memory_mb(-1), {})
+        if exists("/proc/self/smaps_rollup"):
+            memory = process_memory_mb()
+            self.assertGreater(memory["rss_mb"], 0)
+            self.assertLessEqual(memory["pss_mb"], memory["rss_mb"])
+
+    def test_processor_stats(self):
+        processor = StubAudioTextProcessor()
+        processor.add_stat("", "model_load", 2.0)
+        processor.transcribe("a.wav")
+        processor.transcribe("b.wav")
+        stats = processor.pop_stats("a.wav")
+        self.assertEqual(stats["model_load"], 2.0)
+        self.assertEqual(stats["audio_seconds"], 10.0)
+        self.assertIn("inference", stats)
+        self.assertNotIn("model_load", processor.pop_stats("b.wav"))
+        self.assertDictEqual(processor.pop_stats("a.wav"), {})
+
+    def test_add_file(self):
+        with TemporaryDirectory() as folder:
+            metrics = Metrics(join(folder, "metrics", "run.jsonl"), join(folder, "osttc.prom"), "fast")
+            metrics.add("discovery", 0.5)
+            metrics.add_file("a.wav", {"decode": 1.0, "inference": 30.0, "audio_seconds": 60.0, "words": 150,
+                                       "fallbacks": 3})
+            metrics.add_file("b.wav", {"inference": 10.0, "audio_seconds": 10.0}, "failed")
+            with open(join(folder, "metrics", "run.jsonl")) as f:
+                records = [loads(line) for line in f]
+            self.assertEqual(records[0]["real_time_factor"], 0.5)
+            self.assertEqual(records[0]["words_per_second"], 5.0)
+            self.assertEqual(records[1]["status"], "failed")
+            self.assertEqual((records[0]["fallbacks"], records[0]["decoding"]), (3, "fast"))
+            summary = metrics.summary()
+            self.assertEqual(summary["inference"]["count"], 2)
+            self.assertEqual(summary["inference"]["p50"], 20.0)
+            self.assertEqual(summary["decode"]["total"], 1.0)
+
+            metrics.finish()
+            with open(join(folder, "osttc.prom")) as f:
+                prometheus = f.read()
+            self.assertIn('osttc_stage_seconds{stage="inference",quantile="0.95"} 29.0', prometheus)
+            self.assertIn('osttc_files{status="failed"} 1', prometheus)
+            self.assertIn("osttc_audio_seconds 70.0", prometheus)
+            self.assertIn('osttc_decoding_fallbacks{decoding="fast"} 3', prometheus)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from os import listdir
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from src.NoteWriter import NoteWriter
+
+
+class TestNoteWriter(unittest.TestCase):
+
+    def test_write(self):
+        with TemporaryDirectory() as folder:
+            out_file = join(folder, "note.md")
+            with NoteWriter(out_file) as writer:
+                writer.write("Hallo")
+                self.assertEqual(listdir(folder), ["note.md.part"])
+                writer.write(" Welt")
+                writer.header = "---\ntags:\n  - Katzen\n---\n"
+            self.assertEqual(listdir(folder), ["note.md"])
+            with open(out_file) as f:
+                self.assertEqual(f.read(), "---\ntags:\n  - Katzen\n---\nHallo Welt")
+
+            with NoteWriter(out_file) as writer:
+                writer.write("ohne Kopf")
+            with open(out_file) as f:
+                self.assertEqual(f.read(), "ohne Kopf")
+
+    def test_abort(self):
+        with TemporaryDirectory() as folder:
+            out_file = join(folder, "note.md")
+            with self.assertRaises(ValueError):
+                with NoteWriter(out_file) as writer:
+                    writer.write("Hallo")
+                    raise ValueError("transcription failed")
+            self.assertEqual(listdir(folder), [])
+
+    def test_exclusive(self):
+        with TemporaryDirectory() as folder:
+            out_file = join(folder, "note.md")
+            first, second = NoteWriter(out_file, exclusive=True), NoteWriter(out_file, exclusive=True)
+            self.assertNotEqual(first.part_file, second.part_file)
+            first.open()
+            second.open()
+            first.write("erster")
+            second.write("zweiter")
+            second.header = "---\n---\n"
+            first.close()
+            with self.assertRaises(FileExistsError):
+                second.close()
+            self.assertEqual(listdir(folder), ["note.md"])
+            with open(out_file) as f:
+                self.assertEqual(f.read(), "erster")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from threading import Lock
+from time import sleep
+from src.Pipeline import prefetch, BackgroundWorker
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_prefetch(self):
+        def decode(item):
+            if item == 3:
+                raise ValueError("broken")
+            return item * 10
+
+        results = list(prefetch(range(5), decode, 2))
+        self.assertListEqual([item for item, _, _ in results], [0, 1, 2, 3, 4])
+        self.assertListEqual([result for _, result, _ in results], [0, 10, 20, None, 40])
+        self.assertIsInstance(results[3][2], ValueError)
+
+    def test_prefetch_depth(self):
+        produced = []
+        lock = Lock()
+
+        def decode(item):
+            with lock:
+                produced.append(item)
+            return item
+
+        results = prefetch(range(100), decode, 3)
+        next(results)
+        sleep(0.3)
+        # the consumed item, three waiting ones and the one blocked in put
+        self.assertLessEqual(len(produced), 5)
+        results.close()
+
+    def test_background_worker(self):
+        written = []
+        with BackgroundWorker(written.append, 2) as worker:
+            for item in range(10):
+                worker.put(item)
+        self.assertListEqual(written, list(range(10)))
+
+    def test_background_worker_exception(self):
+        def write(item):
+            raise OSError("disk full")
+
+        failed = []
+        worker = BackgroundWorker(write, 2, lambda item, exception: failed.append(item))
+        with self.assertRaises(OSError):
+            with worker:
+                worker.put(1)
+                worker.thread.join(0.2)
+                # raised as soon as the next item comes
+                worker.put(2)
+        self.assertListEqual(failed, [1])
+
+        # the exception in flight is kept
+        with self.assertRaises(ValueError):
+            with BackgroundWorker(write, 2):
+                raise ValueError("transcription failed")
+
+
+if __name__ == '__main__':
+    unittest.main()
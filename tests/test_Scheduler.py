@@ -0,0 +1,79 @@
+import unittest
+import wave
+from os import utime
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Event
+from unittest.mock import patch
+from src.Scheduler import Scheduler, probe_duration
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_probe_duration(self):
+        with TemporaryDirectory() as folder:
+            wav_file = join(folder, "memo.wav")
+            with wave.open(wav_file, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(16000)
+                f.writeframes(b"\0\0" * 16000 * 3)
+            self.assertEqual(probe_duration(wav_file), 3.0)
+
+            m4a_file = join(folder, "memo.m4a")
+            with open(m4a_file, "wb") as f:
+                f.write(b"\0" * 80000)
+            with patch("src.Scheduler.which", return_value=None):
+                self.assertEqual(probe_duration(m4a_file), 10.0)
+
+    def test_order(self):
+        durations = {"a.wav": 30.0, "b.wav": 600.0, "c.wav": 5.0}
+        jobs = [("a.wav", "a.md"), ("b.wav", "b.md"), ("c.wav", "c.md")]
+        self.assertListEqual(Scheduler("fifo", durations.get).order(jobs), jobs)
+        self.assertListEqual([job[0] for job in Scheduler("longest", durations.get).order(jobs)],
+                             ["b.wav", "a.wav", "c.wav"])
+        self.assertListEqual([job[0] for job in Scheduler("shortest", durations.get).order(jobs)],
+                             ["c.wav", "a.wav", "b.wav"])
+        with self.assertRaises(ValueError):
+            Scheduler("random")
+
+    def test_order_newest(self):
+        with TemporaryDirectory() as folder:
+            jobs = []
+            for index, name in enumerate(["old.wav", "new.wav", "middle.wav"]):
+                open(join(folder, name), "w").close()
+                utime(join(folder, name), (0, [100, 300, 200][index]))
+                jobs.append((join(folder, name), name))
+            ordered = Scheduler("newest", lambda audio_file: 1.0).order(jobs)
+            self.assertListEqual([job[1] for job in ordered], ["new.wav", "middle.wav", "old.wav"])
+
+    def test_stream(self):
+        probed = Event()
+        durations = {"a.wav": 100.0, "b.wav": 200.0, "c.wav": 300.0}
+        scheduler = Scheduler("fifo", lambda audio_file: probed.wait(5) and durations[audio_file])
+        jobs = scheduler.stream((audio_file, "") for audio_file in durations)
+        # handed on before any duration is known
+        self.assertEqual(next(jobs), ("a.wav", ""))
+        self.assertDictEqual(scheduler.durations, {})
+        scheduler.done("a.wav", {"inference": 50.0, "audio_seconds": 100.0})
+        probed.set()
+        self.assertListEqual(list(jobs), [("b.wav", ""), ("c.wav", "")])
+        self.assertDictEqual(scheduler.durations, durations)
+        # done before it was probed, it does not count as remaining
+        self.assertEqual(scheduler.eta(), 250.0)
+
+    def test_eta(self):
+        durations = {"a.wav": 100.0, "b.wav": 200.0, "c.wav": 300.0}
+        scheduler = Scheduler("fifo", durations.get)
+        scheduler.order([(audio_file, "") for audio_file in durations])
+        self.assertIsNone(scheduler.eta())
+        scheduler.done("a.wav", {"inference": 50.0})
+        self.assertEqual(scheduler.real_time_factor, 0.5)
+        self.assertEqual(scheduler.eta(), 250.0)
+        self.assertEqual(scheduler.eta(workers=2), 125.0)
+        scheduler.done("b.wav", {})
+        self.assertEqual(scheduler.eta(), 150.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import unittest
+from http.client import HTTPConnection
+from json import dumps, loads
+from os.path import exists, join
+from socket import AF_UNIX, socket
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from time import sleep, time
+from src.Converter import ObsidianSpeechToTextConverter
+from src.Service import TranscriptionService, ServiceError, create_server, JOB_DONE, JOB_FAILED, JOB_SILENT
+from tests.helpers import StubAudioTextProcessor, fake_config
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket(AF_UNIX)
+        self.sock.connect(self.path)
+
+
+class TestTranscriptionService(unittest.TestCase):
+    def setUp(self):
+        self.folder = TemporaryDirectory()
+        self.mock_config = fake_config(path=self.folder.name, mode="serve", serve_queue=2,
+                                       converter=StubAudioTextProcessor())
+        self.converter = ObsidianSpeechToTextConverter(self.mock_config)
+        self.processor = self.mock_config.converter
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def create_recordings(self, *names):
+        for name in names:
+            open(join(self.folder.name, name), "w").close()
+
+    def wait(self, service, job_id, timeout=5.0):
+        deadline = time() + timeout
+        while service.get(job_id).finished is None:
+            self.assertLess(time(), deadline)
+            sleep(0.01)
+        return service.get(job_id)
+
+    def poll(self, connection, job, timeout=5.0):
+        deadline = time() + timeout
+        while job["status"] not in [JOB_DONE, JOB_FAILED, JOB_SILENT]:
+            self.assertLess(time(), deadline)
+            sleep(0.01)
+            connection.request("GET", f"/jobs/{job['id']}")
+            job = loads(connection.getresponse().read())
+        return job
+
+    def test_submit(self):
+        self.create_recordings("2020_01_01_10_00_00.wav", "2020_01_01_00_00_00.wav", "broken.wav")
+        service = TranscriptionService(self.converter, queue_size=4)
+        service.start()
+        try:
+            jobs = [service.submit(name) for name in ["2020_01_01_10_00_00.wav", "2020_01_01_00_00_00.wav",
+                                                      "broken.wav"]]
+            self.assertListEqual([self.wait(service, job.id).status for job in jobs], [JOB_DONE, JOB_SILENT, JOB_FAILED])
+        finally:
+            service.stop()
+        self.assertEqual(service.result(jobs[0].id), f"transcribed {join(self.folder.name, '2020_01_01_10_00_00.wav')}")
+        self.assertEqual(jobs[2].error, "broken recording")
+        self.assertEqual(self.converter.metrics.files, {"done": 1, "silent": 1, "failed": 1})
+        with self.assertRaises(ServiceError) as context:
+            service.result(jobs[1].id)
+        self.assertEqual(context.exception.status, 409)
+
+    def test_check_path(self):
+        self.create_recordings("2020_01_01_10_00_00.wav")
+        service = TranscriptionService(self.converter)
+        for path, status in [("../outside.wav", 400), ("/etc/passwd", 400), ("notes.txt", 400), ("missing.wav", 404)]:
+            with self.assertRaises(ServiceError) as context:
+                service.submit(path)
+            self.assertEqual(context.exception.status, status, path)
+        service.submit(join(self.folder.name, "2020_01_01_10_00_00.wav"))
+        with self.assertRaises(ServiceError) as context:
+            service.submit("2020_01_01_10_00_00.wav")
+        self.assertEqual(context.exception.status, 409)
+
+    def test_backpressure(self):
+        names = [f"2020_01_01_1{index}_00_00.wav" for index in range(5)]
+        self.create_recordings(*names)
+        self.processor.release.clear()
+        service = TranscriptionService(self.converter, queue_size=2)
+        service.start()
+        try:
+            running = service.submit(names[0])
+            while service.get(running.id).status != "running":
+                sleep(0.01)
+            waiting = [service.submit(name) for name in names[1:3]]
+            with self.assertRaises(ServiceError) as context:
+                service.submit(names[3])
+            self.assertEqual(context.exception.status, 429)
+            self.assertEqual(service.health(), {"queued": 2, "running": 1, "queue_size": 2, "concurrency": 1})
+            self.processor.release.set()
+            for job in [running] + waiting:
+                self.assertEqual(self.wait(service, job.id).status, JOB_DONE)
+            # there is room again
+            self.assertEqual(self.wait(service, service.submit(names[3]).id).status, JOB_DONE)
+        finally:
+            self.processor.release.set()
+            service.stop()
+
+    def test_serve(self):
+        self.create_recordings("2020_01_01_10_00_00.wav")
+        stop, ready = Event(), Event()
+        thread = Thread(target=self.converter.serve, args=(stop, ready))
+        thread.start()
+        try:
+            self.assertTrue(ready.wait(5))
+            host, port = self.converter.serve_address.split(":")
+            connection = HTTPConnection(host, int(port))
+
+            connection.request("POST", "/jobs", dumps({"path": "2020_01_01_10_00_00.wav"}))
+            response = connection.getresponse()
+            self.assertEqual(response.status, 202)
+            job = self.poll(connection, loads(response.read()))
+            self.assertEqual(job["status"], JOB_DONE)
+            connection.request("GET", f"/jobs/{job['id']}/result")
+            response = connection.getresponse()
+            self.assertEqual(response.getheader("Content-Type"), "text/markdown; charset=utf-8")
+            self.assertTrue(response.read().decode().startswith("transcribed"))
+
+            connection.request("POST", "/jobs?name=2020_01_01_11_00_00.mp3", b"audio")
+            response = connection.getresponse()
+            self.assertEqual(response.status, 202)
+            upload = self.poll(connection, loads(response.read()))
+            self.assertEqual(upload["status"], JOB_DONE)
+            self.assertEqual(upload["audio_file"], join(self.folder.name, "2020_01_01_11_00_00.mp3"))
+
+            for method, path, body, status in [("GET", "/jobs/unknown", None, 404),
+                                               ("POST", "/jobs", dumps({"path": "../x.wav"}), 400),
+                                               ("POST", "/jobs", "no json", 400),
+                                               ("GET", "/nothing", None, 404)]:
+                connection.request(method, path, body)
+                response = connection.getresponse()
+                self.assertEqual(response.status, status, path)
+                self.assertIn("error", loads(response.read()))
+            connection.close()
+        finally:
+            stop.set()
+            thread.join()
+        self.assertTrue(exists(join(self.folder.name, "2020-01-01-10-00-00")))
+
+    def test_unix_socket(self):
+        path = join(self.folder.name, "osttc.sock")
+        # a socket file left behind by a killed service
+        open(path, "w").close()
+        service = TranscriptionService(self.converter)
+        server = create_server(f"unix:{path}", service)
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            connection = UnixHTTPConnection(path)
+            connection.request("GET", "/health")
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(loads(response.read())["queue_size"], 16)
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from random import Random
+
+from benchmarks.synthetic import spoken_script
+from src.Config import Config
+from src.ActionKeywords import ActionKeywords
+from src.StreamingFormatter import StreamingFormatter
+from tests.test_AudioTextProcessor import MockAudioTextProcessor
+
+
+class TestStreamingFormatter(unittest.TestCase):
+
+    def setUp(self):
+        self.processor = MockAudioTextProcessor()
+        self.words = ActionKeywords(Config.ACTION_KEYWORDS)
+
+    def stream(self, segments, words, margin=256):
+        formatter = StreamingFormatter(self.processor, words, "audio.webm", margin)
+        bodies = [formatter.feed(segment) for segment in segments]
+        header, rest = formatter.finish()
+        return header, bodies + [rest]
+
+    def test_equals_format_text(self):
+        talk = spoken_script()
+        for seed in range(20):
+            random = Random(seed)
+            # whisper segments are a few words, each starting with a space
+            words = talk.split(" ")
+            segments = []
+            while words:
+                size = random.randint(1, 12)
+                segments.append(" " + " ".join(words[:size]))
+                words = words[size:]
+            for margin in [64, 256]:
+                header, bodies = self.stream(segments, self.words, margin)
+                self.assertEqual(header + "".join(bodies), self.processor.format_text(talk, self.words, "audio.webm"))
+                # the note gets written while the talk goes on
+                self.assertTrue(any(bodies[:-1]))
+
+    def test_tags_across_segments(self):
+        words = {"tag start": "#TAGS---", "tag stop": "---TAGS#", "link audio": "#LINK_AUDIO_FILE#"}
+        segments = [" Hallo tag start", " Katzen", " Hunde tag stop", " Welt link audio"]
+        header, bodies = self.stream(segments, words, margin=0)
+        self.assertEqual(header, '---\ntags:\n  - Katzen\n  - Hunde\naudiolog: "[[audio.webm]]"\n---\n![[audio.webm]]\n')
+        self.assertEqual("".join(bodies), "Hallo  Welt ")
+        # the open tags block kept the first segment back
+        self.assertEqual(bodies[0], "")
+
+    def test_without_words(self):
+        header, bodies = self.stream([" Hallo", " Welt "], {}, margin=0)
+        self.assertEqual(header, "")
+        self.assertEqual(bodies, ["", "Hallo", " Welt"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+from src.processor.TieredWhisper import TieredWhisper
+
+
+def transcript(text, avg_logprob):
+    return {"text": text, "segments": [{"start": 0.0, "end": 5.0, "text": text, "avg_logprob": avg_logprob}]}
+
+
+class TestTieredWhisper(unittest.TestCase):
+
+    def setUp(self):
+        self.tiered = TieredWhisper("de", [(60, "tiny"), (600, "base"), (None, "small")],
+                                    action_keywords={"Absatz": "\n"})
+
+    def test_select_tier(self):
+        self.assertEqual(self.tiered.select_tier(5), 0)
+        self.assertEqual(self.tiered.select_tier(60), 0)
+        self.assertEqual(self.tiered.select_tier(300), 1)
+        self.assertEqual(self.tiered.select_tier(5400), 2)
+
+    def test_select_tier_time_budget(self):
+        self.tiered.time_budget = 1000
+        self.tiered.started = 0
+        with patch("src.processor.TieredWhisper.time", return_value=200):
+            # small needs 5400 * 0.3 seconds, base 5400 * 0.1 fit into the remaining 800
+            self.assertEqual(self.tiered.select_tier(5400), 1)
+            self.tiered.real_time_factors["base"] = 0.5
+            self.assertEqual(self.tiered.select_tier(5400), 0)
+
+    def test_get_transcript(self):
+        tiny, base, small = self.tiered.models
+        audio = np.zeros(16000 * 10, dtype=np.float32)
+        with patch.object(tiny, "get_transcript", return_value=transcript("Milch kaufen", -0.3)) as tiny_mock:
+            result = self.tiered.get_transcript("memo.wav", audio=audio)
+        self.assertEqual(self.tiered.format_transcript(result, "memo.wav"), "Milch kaufen")
+        tiny_mock.assert_called_once_with("memo.wav", map, audio)
+
+    def test_escalation(self):
+        self.tiered.escalate_logprob = -1.0
+        tiny, base, small = self.tiered.models
+        audio = np.zeros(16000 * 10, dtype=np.float32)
+        with patch.object(tiny, "get_transcript", return_value=transcript("Milch tauschen", -1.4)), \
+                patch.object(base, "get_transcript", return_value=transcript("Milch kaufen", -0.4)) as base_mock, \
+                patch.object(small, "get_transcript") as small_mock:
+            self.assertEqual(self.tiered.get_transcript("memo.wav", audio=audio)["text"], "Milch kaufen")
+        base_mock.assert_called_once()
+        small_mock.assert_not_called()
+
+        self.tiered.escalate_logprob = None
+        with patch.object(tiny, "get_transcript", return_value=transcript("Milch tauschen", -1.4)):
+            self.assertEqual(self.tiered.get_transcript("memo.wav", audio=audio)["text"], "Milch tauschen")
+
+    def test_average_logprob(self):
+        self.assertIsNone(TieredWhisper.average_logprob({"text": "", "segments": []}))
+        segments = [{"start": 0.0, "end": 1.0, "avg_logprob": -2.0}, {"start": 1.0, "end": 4.0, "avg_logprob": -0.4}]
+        self.assertAlmostEqual(TieredWhisper.average_logprob({"segments": segments}), -0.8)
+
+    def test_get_processor_and_reformat(self):
+        tiny, base, small = self.tiered.models
+        self.assertIs(self.tiered.get_processor("base"), base)
+        self.assertIs(self.tiered.get_processor(None), self.tiered)
+        with patch.object(small, "reformat", return_value=None), \
+                patch.object(base, "reformat", return_value="escalated"), \
+                patch.object(tiny, "reformat", return_value="first try"):
+            self.assertEqual(self.tiered.reformat("memo.wav"), "escalated")
+
+    def test_init_model(self):
+        with patch("src.processor.TieredWhisper.Whisper.init_model") as init_model_mock:
+            self.tiered.init_model()
+            init_model_mock.assert_not_called()
+            # shared tiers have to be loaded before the workers are forked
+            self.tiered.share_model = 1
+            self.tiered.init_model()
+        self.assertEqual(init_model_mock.call_count, 3)
+
+    def test_pop_stats(self):
+        tiny, base, _ = self.tiered.models
+        tiny.add_stat("memo.wav", "inference", 1.0)
+        base.add_stat("memo.wav", "inference", 2.0)
+        self.assertEqual(self.tiered.pop_stats("memo.wav")["inference"], 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
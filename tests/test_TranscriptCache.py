@@ -0,0 +1,50 @@
+import unittest
+from os.path import join
+from pickle import dumps, loads
+from tempfile import TemporaryDirectory
+from src.TranscriptCache import TranscriptCache, file_hash
+
+
+class TestTranscriptCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = TemporaryDirectory()
+        self.audio_file = join(self.folder.name, "audio.wav")
+        with open(self.audio_file, "wb") as f:
+            f.write(b"audio data")
+        self.cache = TranscriptCache(join(self.folder.name, "cache", "transcripts.sqlite"))
+        self.options = {"model": "tiny", "language": "de"}
+
+    def tearDown(self):
+        self.cache.close()
+        self.folder.cleanup()
+
+    def test_file_hash(self):
+        self.assertEqual(file_hash(self.audio_file, block_size=3), file_hash(self.audio_file))
+        self.assertEqual(len(file_hash(self.audio_file)), 64)
+
+    def test_get_key(self):
+        key = self.cache.get_key("hash", {"a": 1, "b": 2})
+        self.assertEqual(key, self.cache.get_key("hash", {"b": 2, "a": 1}))
+        self.assertNotEqual(key, self.cache.get_key("hash", {"a": 1, "b": 3}))
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get(self.audio_file, self.options))
+        transcript = {"text": " Hallo Welt", "segments": [{"start": 0.0, "end": 1.5, "text": " Hallo Welt"}]}
+        self.cache.put(self.audio_file, self.options, transcript)
+        self.assertDictEqual(self.cache.get(self.audio_file, self.options), transcript)
+        self.assertIsNone(self.cache.get(self.audio_file, {"model": "medium", "language": "de"}))
+
+        with open(self.audio_file, "ab") as f:
+            f.write(b"changed")
+        self.assertIsNone(self.cache.get(self.audio_file, self.options))
+
+    def test_pickle(self):
+        self.cache.connect()
+        copy = loads(dumps(self.cache))
+        self.assertEqual(copy.path, self.cache.path)
+        self.assertIsNone(copy.connection)
+
+
+if __name__ == '__main__':
+    unittest.main()
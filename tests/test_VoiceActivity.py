@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+
+from src.VoiceActivity import VoiceActivityFilter, SilentRecording, TimestampMap, find_speech
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds: float) -> np.ndarray:
+    return (0.1 * np.sin(np.arange(int(seconds * SAMPLE_RATE)) * 0.05)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+class TestVoiceActivity(unittest.TestCase):
+
+    def test_find_speech(self):
+        audio = np.concatenate([silence(3), tone(2), silence(0.5), tone(1), silence(5), tone(2), silence(0.3)])
+        bounds = [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in find_speech(audio, -45, 1.0)]
+        self.assertEqual(len(bounds), 2)
+        # the short pause stays, the long ones go, apart from the padding around the speech
+        self.assertAlmostEqual(bounds[0][0], 2.8, delta=0.05)
+        self.assertAlmostEqual(bounds[0][1], 6.7, delta=0.05)
+        self.assertAlmostEqual(bounds[1][0], 11.3, delta=0.05)
+        self.assertEqual(bounds[1][1], len(audio) / SAMPLE_RATE)
+        self.assertListEqual(find_speech(silence(10), -45, 1.0), [])
+        self.assertListEqual(find_speech(np.concatenate([silence(5), tone(0.1)]), -45, 1.0), [])
+
+    def test_trim(self):
+        vad = VoiceActivityFilter(-45, 1.0)
+        audio = np.concatenate([silence(3), tone(2), silence(5), tone(2)])
+        trimmed, timestamp_map = vad.trim(audio, "memo.wav")
+        self.assertAlmostEqual(len(trimmed) / SAMPLE_RATE, 4.65, delta=0.05)
+        transcript = {"text": " a b", "segments": [{"start": 0.2, "end": 2.2, "text": " a"},
+                                                  {"start": 2.6, "end": 4.4, "text": " b"}]}
+        restored = timestamp_map.restore(transcript)
+        self.assertAlmostEqual(restored["segments"][0]["start"], 3.0, delta=0.05)
+        self.assertAlmostEqual(restored["segments"][1]["start"], 9.95, delta=0.05)
+        self.assertEqual(restored["text"], " a b")
+
+        unchanged = tone(3)
+        self.assertIs(vad.trim(unchanged)[0], unchanged)
+        with self.assertRaises(SilentRecording) as context:
+            vad.trim(silence(4), "tap.wav")
+        self.assertEqual(context.exception.seconds, 4.0)
+        self.assertIn("tap.wav", str(context.exception))
+
+    def test_timestamp_map(self):
+        timestamp_map = TimestampMap([0.0, 2.0], [1.0, 10.0])
+        self.assertEqual(timestamp_map.to_source(0.5), 1.5)
+        self.assertEqual(timestamp_map.to_source(2.0), 10.0)
+        self.assertEqual(timestamp_map.to_source(2.0, is_end=True), 3.0)
+        self.assertEqual(timestamp_map.to_source(3.0), 11.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
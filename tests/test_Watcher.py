@@ -0,0 +1,89 @@
+import unittest
+from errno import ENOSPC
+from os import utime, makedirs, rmdir
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Event
+from time import time
+from unittest.mock import patch
+from src.Watcher import Debouncer, InotifyWatcher, PollingWatcher, create_watcher
+
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = TemporaryDirectory()
+        self.stop = Event()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_debouncer(self):
+        path = join(self.folder.name, "audio.webm")
+        debouncer = Debouncer(2)
+        self.assertFalse(debouncer.is_settled(path))
+
+        with open(path, "wb") as f:
+            f.write(b"half")
+        self.assertFalse(debouncer.is_settled(path))
+
+        utime(path, (time() - 5, time() - 5))
+        self.assertFalse(debouncer.is_settled(path))
+        self.assertTrue(debouncer.is_settled(path))
+        self.assertTrue(Debouncer(2).is_settled(path))
+
+        with open(path, "ab") as f:
+            f.write(b" written")
+        utime(path, (time() - 5, time() - 5))
+        self.assertFalse(debouncer.is_settled(path))
+        self.assertTrue(debouncer.is_settled(path))
+
+    def test_polling_watcher(self):
+        watcher = PollingWatcher(self.folder.name, self.stop)
+        self.assertTrue(watcher.wait(0.01))
+
+    def test_inotify_watcher(self):
+        watcher = create_watcher(self.folder.name, self.stop)
+        if not isinstance(watcher, InotifyWatcher):
+            self.skipTest("inotify is not available")
+        self.assertFalse(watcher.wait(0.01))
+
+        makedirs(join(self.folder.name, "sub"))
+        self.assertTrue(watcher.wait(1))
+        with open(join(self.folder.name, "sub", "audio.webm"), "wb") as f:
+            f.write(b"audio")
+        self.assertTrue(watcher.wait(1))
+
+        self.stop.set()
+        self.assertFalse(watcher.wait(1))
+        watcher.close()
+
+    def test_inotify_watcher_failed_watch(self):
+        watcher = create_watcher(self.folder.name, self.stop)
+        if not isinstance(watcher, InotifyWatcher):
+            self.skipTest("inotify is not available")
+        add_watch = watcher.add_watch
+
+        def remove_first(path):
+            rmdir(path)
+            add_watch(path)
+
+        # the folder is gone by the time its watch gets added
+        with patch.object(watcher, "add_watch", side_effect=remove_first):
+            makedirs(join(self.folder.name, "removed"))
+            self.assertTrue(watcher.wait(1))
+        self.assertFalse(watcher.polling)
+        self.assertFalse(watcher.wait(0.01))
+
+        with patch.object(watcher, "add_watch", side_effect=OSError(ENOSPC, "Can't watch")), \
+                patch("src.Watcher.warning") as warning_mock:
+            makedirs(join(self.folder.name, "unwatched"))
+            self.assertTrue(watcher.wait(1))
+        warning_mock.assert_called_once()
+        # changes in the folder without a watch are found by rescanning after every timeout
+        self.assertTrue(watcher.wait(0.01))
+        watcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
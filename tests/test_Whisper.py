@@ -1,6 +1,14 @@
 import unittest
+from os import listdir, remove
+from os.path import join
+from tempfile import TemporaryDirectory
 from unittest.mock import patch, Mock
-from src.processor.Whisper import Whisper
+import numpy as np
+from src.processor.Whisper import Whisper, quantize_model, load_quantized_model, prepare_model, load_prepared_model
+from src.TranscriptCache import TranscriptCache, file_hash
+from src.AudioCache import AudioCache
+from src.Decoding import DecodingSettings
+from src.VoiceActivity import VoiceActivityFilter, SilentRecording
 
 
 class TestWhisper(unittest.TestCase):
@@ -21,7 +29,10 @@ class TestWhisper(unittest.TestCase):
         load_model_mock.return_value = mocked_model
         self.whisper.active_model = mocked_model
         transcribed_text = self.whisper.transcribe(audio_file)
-        mocked_model.transcribe.assert_called_once_with(audio_file, fp16=False, language='en')
+        mocked_model.transcribe.assert_called_once_with(
+            audio_file, fp16=False, language='en', beam_size=None, best_of=None,
+            temperature=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0), condition_on_previous_text=True,
+        )
         self.assertEqual(transcribed_text.strip(), result_text)
 
     @patch('src.processor.Whisper.load_model', side_effect=Exception('Error occurred while loading model'))
@@ -33,6 +44,268 @@ class TestWhisper(unittest.TestCase):
             self.whisper.transcribe(audio_file)
         self.assertTrue('Error while converting' in str(context.exception))
 
+    @patch('src.processor.Whisper.load_model')
+    def test_transcribe_cached(self, load_model_mock):
+        with TemporaryDirectory() as folder:
+            audio_file = join(folder, 'test.mp3')
+            with open(audio_file, 'wb') as f:
+                f.write(b'audio')
+            cache = TranscriptCache(join(folder, 'transcripts.sqlite'))
+            mocked_model = Mock()
+            mocked_model.transcribe.return_value = {'text': ' Test text Absatz', 'segments': []}
+            load_model_mock.return_value = mocked_model
+            whisper = Whisper('en', 'tiny', transcript_cache=cache, action_keywords={'Absatz': '#'})
+
+            self.assertIsNone(whisper.reformat(audio_file))
+            self.assertEqual(whisper.transcribe(audio_file), 'Test text #')
+            self.assertEqual(whisper.transcribe(audio_file), 'Test text #')
+            mocked_model.transcribe.assert_called_once()
+
+            whisper = Whisper('en', 'tiny', transcript_cache=cache, action_keywords={'Absatz': '+'})
+            self.assertEqual(whisper.reformat(audio_file), 'Test text +')
+            self.assertIsNone(Whisper('de', 'tiny', transcript_cache=cache).reformat(audio_file))
+            self.assertEqual(load_model_mock.call_count, 1)
+            cache.close()
+
+    def test_transcribe_chunked(self):
+        audio = np.concatenate([np.ones(16000 * 8, dtype=np.float32), np.zeros(16000, dtype=np.float32),
+                                np.ones(16000 * 8, dtype=np.float32)])
+        whisper = Whisper('en', 'tiny', chunk_seconds=10, chunk_overlap=0.5,
+                          action_keywords={'Obsidian link start ': '[[', ' Obsidian link stop': ']]'})
+        whisper.active_model = Mock()
+        whisper.active_model.transcribe.side_effect = [
+            {'text': ' Obsidian link start Katzen', 'segments': [{'start': 0.0, 'end': 8.0, 'text': ' Obsidian link start Katzen'}]},
+            {'text': ' Obsidian link stop', 'segments': [{'start': 0.5, 'end': 8.0, 'text': ' Obsidian link stop'}]},
+        ]
+        with patch.object(whisper, 'load_audio', return_value=audio):
+            self.assertEqual(whisper.transcribe('test.mp3'), '[[Katzen]]')
+        self.assertEqual(whisper.active_model.transcribe.call_count, 2)
+        self.assertIsInstance(whisper.active_model.transcribe.call_args[0][0], np.ndarray)
+        self.assertEqual(whisper.get_cache_options()['chunk_seconds'], 10)
+
+    def test_transcribe_to(self):
+        audio = np.concatenate([np.ones(16000 * 8, dtype=np.float32), np.zeros(16000, dtype=np.float32),
+                                np.ones(16000 * 8, dtype=np.float32)])
+        with TemporaryDirectory() as folder:
+            audio_file = join(folder, 'test.mp3')
+            with open(audio_file, 'wb') as f:
+                f.write(b'audio')
+            cache = TranscriptCache(join(folder, 'transcripts.sqlite'))
+            words = {'Obsidian link start ': '[[', ' Obsidian link stop': ']]', '#LINK': '#LINK_AUDIO_FILE#'}
+            whisper = Whisper('en', 'tiny', chunk_seconds=10, chunk_overlap=0.5, action_keywords=words,
+                              transcript_cache=cache)
+            whisper.active_model = Mock()
+            whisper.active_model.transcribe.side_effect = [
+                {'text': ' Obsidian link start Katzen', 'segments': [{'start': 0.0, 'end': 8.0, 'text': ' Obsidian link start Katzen'}]},
+                {'text': ' Obsidian link stop #LINK', 'segments': [{'start': 0.5, 'end': 8.0, 'text': ' Obsidian link stop #LINK'}]},
+            ]
+            writer = Mock(header='')
+            with patch.object(whisper, 'load_audio', return_value=audio):
+                whisper.transcribe_to(audio_file, writer)
+            content = writer.header + ''.join(call.args[0] for call in writer.write.call_args_list)
+            self.assertEqual(content, '---\n\naudiolog: "[[test.mp3]]"\n---\n![[test.mp3]]\n[[Katzen]] ')
+            self.assertEqual(whisper.stats[audio_file]['words'], 8)
+            # the complete transcript was cached, reformatting gives the same note
+            self.assertEqual(whisper.reformat(audio_file), content)
+            cache.close()
+
+    @patch('whisper.audio.load_audio')
+    def test_transcribe_vad(self, load_audio_mock):
+        speech = (0.1 * np.sin(np.arange(16000 * 2) * 0.05)).astype(np.float32)
+        load_audio_mock.return_value = np.concatenate([np.zeros(16000 * 5, dtype=np.float32), speech])
+        whisper = Whisper('en', 'tiny', vad=VoiceActivityFilter(-45, 1.0))
+        whisper.active_model = Mock()
+        whisper.active_model.transcribe.return_value = {'text': ' Hallo', 'segments': [{'start': 0.2, 'end': 2.2, 'text': ' Hallo'}]}
+        transcript = whisper.get_transcript('memo.wav')
+        # whisper only heard the speech, the segment times are the ones of the recording
+        self.assertAlmostEqual(len(whisper.active_model.transcribe.call_args[0][0]) / 16000, 2.2, delta=0.05)
+        self.assertAlmostEqual(transcript['segments'][0]['start'], 5.0, delta=0.05)
+        stats = whisper.pop_stats('memo.wav')
+        self.assertEqual(stats['audio_seconds'], 7.0)
+        self.assertAlmostEqual(stats['silence_removed'], 4.8, delta=0.05)
+        self.assertDictEqual(whisper.timestamp_maps, {})
+        self.assertEqual(whisper.get_cache_options()['vad'], '-45:1.0')
+
+        load_audio_mock.return_value = np.zeros(16000 * 5, dtype=np.float32)
+        with self.assertRaises(SilentRecording):
+            whisper.transcribe('tap.wav')
+
+    def test_transcribe_decoding(self):
+        whisper = Whisper('en', 'tiny', decoding=DecodingSettings('fast', beam_size=3))
+        whisper.active_model = Mock()
+        whisper.active_model.transcribe.return_value = {'text': ' Hallo Welt', 'segments': [
+            {'seek': 0, 'start': 0.0, 'end': 1.0, 'text': ' Hallo', 'temperature': 0.0},
+            {'seek': 3000, 'start': 30.0, 'end': 31.0, 'text': ' Welt', 'temperature': 0.0},
+        ]}
+        whisper.get_transcript('memo.wav')
+        options = whisper.active_model.transcribe.call_args[1]
+        self.assertEqual((options['beam_size'], options['temperature']), (3, (0.0,)))
+        self.assertFalse(options['condition_on_previous_text'])
+        self.assertDictEqual(whisper.get_cache_options()['decoding'], {
+            'beam_size': 3, 'temperature': (0.0,), 'condition_on_previous_text': False,
+        })
+        self.assertNotIn('decoding', self.whisper.get_cache_options())
+
+        # the second window was decoded again at 0.2 and 0.4
+        whisper = Whisper('en', 'tiny')
+        whisper.active_model = Mock()
+        whisper.active_model.transcribe.return_value = {'text': ' Hallo Welt', 'segments': [
+            {'seek': 0, 'start': 0.0, 'end': 1.0, 'text': ' Hallo', 'temperature': 0.0},
+            {'seek': 3000, 'start': 30.0, 'end': 31.0, 'text': ' Welt', 'temperature': 0.4},
+            {'seek': 3000, 'start': 31.0, 'end': 32.0, 'text': '', 'temperature': 0.4},
+        ]}
+        self.assertEqual(whisper.get_transcript('memo.wav')['fallbacks'], 2)
+        self.assertEqual(whisper.pop_stats('memo.wav')['fallbacks'], 2)
+
+    @patch('whisper.audio.load_audio')
+    def test_transcribe_audio_cache(self, load_audio_mock):
+        load_audio_mock.return_value = np.zeros(16000 * 2, dtype=np.float32)
+        with TemporaryDirectory() as folder:
+            audio_file = join(folder, 'memo.m4a')
+            with open(audio_file, 'wb') as f:
+                f.write(b'audio')
+            whisper = Whisper('en', 'tiny', audio_cache=AudioCache(join(folder, 'audio'), 1024 ** 2))
+            whisper.active_model = Mock()
+            whisper.active_model.transcribe.return_value = {'text': ' Hallo', 'segments': []}
+            for _ in range(2):
+                self.assertEqual(whisper.get_transcript(audio_file)['text'], ' Hallo')
+                self.assertEqual(whisper.pop_stats(audio_file)['audio_seconds'], 2.0)
+            # decoded once, the second run got the cached audio
+            load_audio_mock.assert_called_once_with(audio_file)
+            self.assertIsInstance(whisper.active_model.transcribe.call_args[0][0], np.memmap)
+
+    @patch('whisper.audio.load_audio')
+    def test_transcribe_both_caches(self, load_audio_mock):
+        load_audio_mock.return_value = np.zeros(16000 * 2, dtype=np.float32)
+        with TemporaryDirectory() as folder:
+            audio_file = join(folder, 'memo.m4a')
+            with open(audio_file, 'wb') as f:
+                f.write(b'audio')
+            whisper = Whisper('en', 'tiny', transcript_cache=TranscriptCache(join(folder, 'transcripts.sqlite')),
+                              audio_cache=AudioCache(join(folder, 'audio'), 1024 ** 2))
+            whisper.active_model = Mock()
+            whisper.active_model.transcribe.return_value = {'text': ' Hallo', 'segments': []}
+            with patch('src.processor.Whisper.file_hash', wraps=file_hash) as file_hash_mock, \
+                    patch('src.AudioCache.file_hash', wraps=file_hash) as audio_cache_hash_mock:
+                self.assertEqual(whisper.get_transcript(audio_file)['text'], ' Hallo')
+                whisper.pop_stats(audio_file)
+                self.assertEqual(whisper.get_transcript(audio_file)['text'], ' Hallo')
+            # read once per recording by both caches together
+            self.assertEqual(file_hash_mock.call_count, 2)
+            audio_cache_hash_mock.assert_not_called()
+            self.assertEqual(whisper.active_model.transcribe.call_count, 1)
+            self.assertEqual(len(listdir(join(folder, 'audio'))), 1)
+
+    @patch('whisper.decode')
+    def test_transcribe_batch(self, decode_mock):
+        with TemporaryDirectory() as folder:
+            audio_files = [join(folder, f'{index}.mp3') for index in range(3)]
+            for index, audio_file in enumerate(audio_files):
+                with open(audio_file, 'wb') as f:
+                    f.write(bytes([index]))
+            cache = TranscriptCache(join(folder, 'transcripts.sqlite'))
+            whisper = Whisper('en', 'tiny', transcript_cache=cache, action_keywords={'Absatz': '#'})
+            whisper.active_model = Mock(device='cpu')
+            whisper.active_model.dims.n_mels = 80
+            whisper.active_model.transcribe.return_value = {'text': ' retried', 'segments': []}
+            decode_mock.return_value = [
+                Mock(text='Erstes Absatz', no_speech_prob=0.1, avg_logprob=-0.2, compression_ratio=1.0, temperature=0.0),
+                Mock(text='Zweites', no_speech_prob=0.9, avg_logprob=-1.5, compression_ratio=1.0, temperature=0.0),
+                Mock(text='la la la', no_speech_prob=0.1, avg_logprob=-0.2, compression_ratio=3.0, temperature=0.0),
+            ]
+            audio = np.zeros(16000 * 5, dtype=np.float32)
+            self.assertTrue(whisper.can_batch(audio))
+            self.assertFalse(whisper.can_batch(np.zeros(16000 * 31, dtype=np.float32)))
+            with patch.object(whisper, 'load_audio', return_value=audio):
+                self.assertListEqual(whisper.transcribe_batch(audio_files), ['Erstes #', '', 'retried'])
+                self.assertListEqual(whisper.transcribe_batch(audio_files), ['Erstes #', '', 'retried'])
+            decode_mock.assert_called_once()
+            self.assertEqual(tuple(decode_mock.call_args[0][1].shape), (3, 80, 3000))
+            whisper.active_model.transcribe.assert_called_once()
+            # transcribing the rejected result again is a fallback, the cached run took none
+            self.assertEqual(whisper.pop_stats(audio_files[2])['fallbacks'], 1)
+            self.assertEqual(whisper.get_transcripts(audio_files[:1])[0]['segments'][0]['end'], 5.0)
+            cache.close()
+
+    @staticmethod
+    def small_model():
+        from whisper.model import Whisper as WhisperModel, ModelDimensions
+        dims = ModelDimensions(n_mels=80, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2, n_audio_layer=1,
+                               n_vocab=51865, n_text_ctx=448, n_text_state=64, n_text_head=2, n_text_layer=1)
+        from torch import manual_seed
+        from torch.nn.init import normal_
+        manual_seed(0)
+        model = WhisperModel(dims).eval()
+        # some weights are only allocated, not initialized
+        for parameter in model.parameters():
+            normal_(parameter, std=0.02)
+        return model
+
+    def test_quantize_model(self):
+        from torch.ao.nn.quantized.dynamic import Linear as QuantizedLinear
+        model = quantize_model(self.small_model())
+        self.assertIsInstance(model.decoder.blocks[0].attn.key, QuantizedLinear)
+        self.assertIsInstance(model.encoder.blocks[0].mlp[0], QuantizedLinear)
+        from torch import randn, tensor, isfinite
+        features = model.embed_audio(randn(1, 80, 3000))
+        logits = model.logits(tensor([[50258, 50261]]), features)
+        self.assertEqual(tuple(logits.shape), (1, 2, 51865))
+        self.assertTrue(isfinite(logits).all())
+
+    def test_load_quantized_model(self):
+        with TemporaryDirectory() as folder:
+            with patch('src.processor.Whisper.load_model', return_value=self.small_model()) as load_model_mock:
+                load_quantized_model('tiny', folder)
+                model = load_quantized_model('tiny', folder)
+            load_model_mock.assert_called_once_with('tiny', device='cpu')
+            from torch.ao.nn.quantized.dynamic import Linear as QuantizedLinear
+            self.assertIsInstance(model.decoder.blocks[0].mlp[0], QuantizedLinear)
+
+        whisper = Whisper('en', 'tiny', quantize=1)
+        self.assertEqual(whisper.get_cache_options()['quantize'], 'int8')
+        with patch('src.processor.Whisper.load_quantized_model', return_value='quantized') as quantized_mock:
+            whisper.init_model()
+        quantized_mock.assert_called_once_with('tiny')
+        self.assertEqual(whisper.active_model, 'quantized')
+
+    def test_prepare_model(self):
+        from torch import equal, no_grad, randn
+        from whisper import _MODELS
+        with TemporaryDirectory() as folder:
+            self.assertIsNone(load_prepared_model('tiny', folder))
+            source = join(folder, _MODELS['tiny'].split('/')[-1])
+            with open(source, 'wb') as f:
+                f.write(b'checkpoint')
+            model = self.small_model()
+            with patch('src.processor.Whisper.load_model', return_value=model) as load_model_mock:
+                prepare_model('tiny', folder)
+            load_model_mock.assert_called_once_with('tiny', device='cpu')
+
+            prepared = load_prepared_model('tiny', folder)
+            self.assertIsNot(prepared, model)
+            self.assertTrue(equal(prepared.alignment_heads.to_dense(), model.alignment_heads.to_dense()))
+            mel = randn(1, 80, 3000)
+            with no_grad():
+                self.assertTrue(equal(prepared.embed_audio(mel), model.embed_audio(mel)))
+
+            # the checkpoint is not needed anymore once it is prepared
+            remove(source)
+            with patch('src.processor.Whisper.warning') as warning_mock:
+                self.assertIsNotNone(load_prepared_model('tiny', folder))
+            warning_mock.assert_not_called()
+
+            # a different download of the checkpoint makes the prepared model stale
+            with open(source, 'wb') as f:
+                f.write(b'another checkpoint')
+            self.assertIsNone(load_prepared_model('tiny', folder))
+
+        whisper = Whisper('en', 'tiny')
+        with patch('src.processor.Whisper.load_prepared_model', return_value='prepared'), \
+                patch('src.processor.Whisper.load_model') as load_model_mock:
+            whisper.init_model()
+        load_model_mock.assert_not_called()
+        self.assertEqual(whisper.active_model, 'prepared')
+
     @patch('src.processor.Whisper.info', side_effect=print)
     @patch('src.processor.Whisper.load_model', return_value='mocked_model')
     def test_init_model(self, load_model_mock, info_mock):
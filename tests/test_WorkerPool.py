@@ -0,0 +1,51 @@
+import unittest
+from os.path import exists
+from src.WorkerPool import WorkerPool, init_worker, transcribe_file
+from tests.helpers import StubAudioTextProcessor
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def test_init_worker(self):
+        processor = StubAudioTextProcessor()
+        init_worker(processor, 3)
+        self.assertEqual(transcribe_file("a.wav"), "transcribed a.wav")
+        stats = processor.pop_stats("a.wav")
+        self.assertEqual((stats["init_calls"], stats["threads"]), (1, 3))
+
+    def test_imap_unordered(self):
+        jobs = [("a.wav", "a.md"), ("broken.wav", "broken.md"), ("b.wav", "b.md")]
+        with WorkerPool(StubAudioTextProcessor(), workers=2, threads=1) as pool:
+            results = {audio_file: (out_file, content, exception)
+                       for audio_file, out_file, content, exception in pool.imap_unordered(jobs)}
+        self.assertEqual(results["a.wav"][:2], ("a.md", "transcribed a.wav"))
+        self.assertEqual(results["b.wav"][:2], ("b.md", "transcribed b.wav"))
+        # every worker loaded its model once and got its threads
+        stats = pool.pop_stats("a.wav")
+        self.assertEqual((stats["init_calls"], stats["threads"]), (1, 1))
+        self.assertIsNone(results["broken.wav"][1])
+        self.assertIsInstance(results["broken.wav"][2], Exception)
+
+    def test_map(self):
+        processor = StubAudioTextProcessor()
+        with WorkerPool(processor, workers=2) as pool:
+            self.assertListEqual(pool.map(processor.transcribe, ["a.wav", "b.wav"]), ["transcribed a.wav", "transcribed b.wav"])
+
+    def test_share_model(self):
+        processor = StubAudioTextProcessor()
+        jobs = [("a.wav", "a.md"), ("b.wav", "b.md")]
+        with WorkerPool(processor, workers=2, share_model=True) as pool:
+            contents = sorted(content for _, _, content, _ in pool.imap_unordered(jobs))
+            memory = pool.memory()
+        # loaded once before forking, the workers did not load again
+        self.assertEqual(processor.init_calls, 1)
+        self.assertListEqual(contents, ["transcribed a.wav", "transcribed b.wav"])
+        self.assertEqual(pool.pop_stats("a.wav")["init_calls"], 1)
+        if exists("/proc/self/smaps_rollup"):
+            self.assertEqual(len(memory), 3)
+            for values in memory.values():
+                self.assertLessEqual(values["pss_mb"], values["rss_mb"])
+
+
+if __name__ == '__main__':
+    unittest.main()